@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from itertools import combinations
+from normalizer import parse_price
+
+# ---------------- Store Fees ----------------
+# Rupees; override per request ("stores") or with BASKET_STORE_FEES (JSON)
+DEFAULT_STORE_FEES = {
+    "Bigbasket": {"delivery_fee": 50, "min_order": 200, "small_order_fee": None},
+    "Blinkit": {"delivery_fee": 30, "min_order": 0, "small_order_fee": 20},
+    "Swiggyinsta": {"delivery_fee": 35, "min_order": 99, "small_order_fee": 25},
+    "Zepto": {"delivery_fee": 30, "min_order": 99, "small_order_fee": 25},
+}
+
+# Baskets up to this many items are solved exactly (within the deadline)
+EXACT_MAX_ITEMS = int(os.getenv("BASKET_EXACT_MAX_ITEMS", 20))
+DEFAULT_DEADLINE_MS = int(os.getenv("BASKET_DEADLINE_MS", 250))
+
+
+def load_store_fees(overrides=None):
+    fees = {store: dict(cfg) for store, cfg in DEFAULT_STORE_FEES.items()}
+    env_fees = os.getenv("BASKET_STORE_FEES")
+    for source in (json.loads(env_fees) if env_fees else None, overrides):
+        for store, cfg in (source or {}).items():
+            fees.setdefault(store, {"delivery_fee": 0, "min_order": 0, "small_order_fee": None}).update(cfg)
+    return fees
+
+
+def _paise(rupees):
+    return None if rupees is None else int(round(float(rupees) * 100))
+
+
+# ---------------- Problem ----------------
+class Basket:
+    """
+    prices[i][s]: cheapest price (paise) of item i at store s, or None when unavailable.
+    """
+    def __init__(self, names, stores, prices, fees):
+        self.names = names
+        self.stores = stores
+        self.prices = prices
+        self.delivery = [_paise(fees[s].get("delivery_fee", 0)) or 0 for s in stores]
+        self.min_order = [_paise(fees[s].get("min_order", 0)) or 0 for s in stores]
+        self.small_fee = [_paise(fees[s].get("small_order_fee")) for s in stores]
+
+    def store_cost(self, s, subtotal):
+        """
+        Fees for using store s with this subtotal; None when the minimum order makes it infeasible.
+        """
+        if subtotal == 0:
+            return 0
+        if subtotal < self.min_order[s]:
+            if self.small_fee[s] is None:
+                return None
+            return self.delivery[s] + self.small_fee[s]
+        return self.delivery[s]
+
+    def total(self, assignment):
+        subtotals = [0] * len(self.stores)
+        for i, s in enumerate(assignment):
+            subtotals[s] += self.prices[i][s]
+        cost = sum(subtotals)
+        for s, subtotal in enumerate(subtotals):
+            fee = self.store_cost(s, subtotal)
+            if fee is None:
+                return None
+            cost += fee
+        return cost
+
+
+def build_basket(items, store_fees):
+    """
+    Turn comparator outputs (one per item) into a price matrix.
+    Each item is a process_product_comparison result, optionally wrapped as {"data": ..., "quantity": n}.
+    """
+    stores = list(store_fees)
+    names, prices, picks, unavailable = [], [], [], []
+
+    for item in items:
+        table = item.get("data", item)
+        quantity = int(item.get("quantity", 1) or 1)
+        name = item.get("query") or table.get("user_input", "")
+        best = {}
+        for row in table.get("rows", []):
+            store = row.get("store")
+            if store not in store_fees:
+                continue
+            paise = row.get("price_paise")
+            if paise is None:
+                paise = parse_price(row.get("price"))
+            if paise is None:
+                continue
+            if store not in best or paise < best[store][0]:
+                best[store] = (paise, row)
+
+        if not best:
+            unavailable.append(name)
+            continue
+        names.append(name)
+        prices.append([best[s][0] * quantity if s in best else None for s in stores])
+        picks.append({s: best[s][1] for s in best})
+
+    return Basket(names, stores, prices, store_fees), picks, unavailable
+
+
+# ---------------- Heuristic ----------------
+def _greedy_for_subset(basket, subset, max_passes=3):
+    """
+    Cheapest-store assignment within a store subset, then repair minimum orders and improve by single moves.
+    """
+    assignment = []
+    for row in basket.prices:
+        options = [s for s in subset if row[s] is not None]
+        if not options:
+            return None
+        assignment.append(min(options, key=lambda s: row[s]))
+
+    best_cost = basket.total(assignment)
+    # Repair: pull the cheapest extra items into stores below their hard minimum
+    for s in subset:
+        while basket.total(assignment) is None:
+            subtotal = sum(basket.prices[i][s] for i, a in enumerate(assignment) if a == s)
+            if subtotal == 0 or basket.store_cost(s, subtotal) is not None:
+                break
+            moves = [
+                (basket.prices[i][s] - basket.prices[i][a], i)
+                for i, a in enumerate(assignment)
+                if a != s and basket.prices[i][s] is not None
+            ]
+            if not moves:
+                return None
+            _, i = min(moves)
+            assignment[i] = s
+        best_cost = basket.total(assignment)
+
+    # Improve: single-item moves until no move lowers the total (bounded passes)
+    improved, passes = True, 0
+    while improved and best_cost is not None and passes < max_passes:
+        improved, passes = False, passes + 1
+        for i in range(len(assignment)):
+            current = assignment[i]
+            for s in subset:
+                if s == current or basket.prices[i][s] is None:
+                    continue
+                assignment[i] = s
+                cost = basket.total(assignment)
+                if cost is not None and cost < best_cost:
+                    best_cost, current, improved = cost, s, True
+                else:
+                    assignment[i] = current
+
+    if best_cost is None:
+        return None
+    return best_cost, list(assignment)
+
+
+def solve_heuristic(basket):
+    best = None
+    n_stores = len(basket.stores)
+    for size in range(1, n_stores + 1):
+        for subset in combinations(range(n_stores), size):
+            result = _greedy_for_subset(basket, subset)
+            if result and (best is None or result[0] < best[0]):
+                best = result
+    return best
+
+
+# ---------------- Exact ----------------
+class _Deadline(Exception):
+    pass
+
+
+def solve_exact(basket, deadline, upper_bound=None):
+    """
+    Branch and bound over item assignments. Items with the largest price spread are branched first.
+    Raises _Deadline when the time budget runs out.
+    """
+    n_items, n_stores = len(basket.prices), len(basket.stores)
+    order = sorted(
+        range(n_items),
+        key=lambda i: -(max(p for p in basket.prices[i] if p is not None) -
+                        min(p for p in basket.prices[i] if p is not None))
+    )
+    cheapest = [min(p for p in basket.prices[i] if p is not None) for i in order]
+    # suffix[k]: lower bound on item cost for order[k:]
+    suffix = [0] * (n_items + 1)
+    for k in range(n_items - 1, -1, -1):
+        suffix[k] = suffix[k + 1] + cheapest[k]
+
+    best = list(upper_bound) if upper_bound else [None, None]
+    assignment = [None] * n_items
+    subtotals = [0] * n_stores
+    steps = [0]
+
+    def fees_lower_bound():
+        return sum(basket.delivery[s] for s in range(n_stores) if subtotals[s] > 0)
+
+    def visit(k, item_cost):
+        steps[0] += 1
+        if steps[0] % 2048 == 0 and time.perf_counter() > deadline:
+            raise _Deadline()
+        if best[0] is not None and item_cost + suffix[k] + fees_lower_bound() >= best[0]:
+            return
+        if k == n_items:
+            cost = basket.total(assignment)
+            if cost is not None and (best[0] is None or cost < best[0]):
+                best[0], best[1] = cost, list(assignment)
+            return
+        i = order[k]
+        row = basket.prices[i]
+        for s in sorted((s for s in range(n_stores) if row[s] is not None), key=lambda s: row[s]):
+            assignment[i] = s
+            subtotals[s] += row[s]
+            visit(k + 1, item_cost + row[s])
+            subtotals[s] -= row[s]
+        assignment[i] = None
+
+    visit(0, 0)
+    return (best[0], best[1]) if best[0] is not None else None
+
+
+# ---------------- Optimizer ----------------
+def optimize_basket(items, store_overrides=None, deadline_ms=DEFAULT_DEADLINE_MS):
+    """
+    Cheapest split of a basket across stores, including delivery fees and minimum order values.
+    """
+    started = time.perf_counter()
+    deadline = started + deadline_ms / 1000
+    basket, picks, unavailable = build_basket(items, load_store_fees(store_overrides))
+
+    result = solve_heuristic(basket) if basket.prices else (0, [])
+    method, optimal = "heuristic", False
+
+    if basket.prices and len(basket.prices) <= EXACT_MAX_ITEMS:
+        try:
+            exact = solve_exact(basket, deadline, upper_bound=result)
+            if exact:
+                result = exact
+            method, optimal = "exact", True
+        except _Deadline:
+            logging.warning(f"Exact basket search hit the {deadline_ms} ms budget; using heuristic result")
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    if result is None:
+        return {"error": "No feasible split satisfies the stores' minimum order values",
+                "unavailable": unavailable, "method": method, "elapsed_ms": elapsed_ms}
+
+    total, assignment = result
+    per_store = {}
+    assignments = []
+    for i, s in enumerate(assignment):
+        store = basket.stores[s]
+        row = picks[i][store]
+        assignments.append({"item": basket.names[i], "store": store, "price_paise": basket.prices[i][s],
+                            "row": row})
+        per_store.setdefault(store, {"subtotal_paise": 0, "items": 0})
+        per_store[store]["subtotal_paise"] += basket.prices[i][s]
+        per_store[store]["items"] += 1
+    for store, summary in per_store.items():
+        s = basket.stores.index(store)
+        summary["fees_paise"] = basket.store_cost(s, summary["subtotal_paise"])
+
+    return {
+        "total_paise": total,
+        "total": round(total / 100, 2),
+        "stores": per_store,
+        "assignments": assignments,
+        "unavailable": unavailable,
+        "method": method,
+        "optimal": optimal,
+        "elapsed_ms": elapsed_ms,
+    }
+
+
+# ---------------- Benchmark ----------------
+def random_items(n_items, stores, rng):
+    items = []
+    for i in range(n_items):
+        base = rng.randint(20, 600)
+        rows = [
+            {"store": s, "price": f"₹{base * rng.uniform(0.8, 1.25):.2f}"}
+            for s in stores if rng.random() > 0.15
+        ] or [{"store": stores[0], "price": f"₹{base}"}]
+        items.append({"query": f"item {i}", "data": {"user_input": f"item {i}", "rows": rows}})
+    return items
+
+
+def run_benchmark(sizes, trials, deadline_ms, seed=7):
+    rng = random.Random(seed)
+    stores = list(DEFAULT_STORE_FEES)
+    print(f"{'items':>6} {'method':>9} {'optimal':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for size in sizes:
+        timings, methods, optimal = [], set(), 0
+        for _ in range(trials):
+            result = optimize_basket(random_items(size, stores, rng), deadline_ms=deadline_ms)
+            timings.append(result["elapsed_ms"])
+            methods.add(result["method"])
+            optimal += 1 if result.get("optimal") else 0
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+        print(f"{size:>6} {'/'.join(sorted(methods)):>9} {optimal:>4}/{trials:<3} {p50:>8.2f} {p95:>8.2f} {timings[-1]:>8.2f}")
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Cheapest multi-store split of a shopping basket")
+    parser.add_argument("--bench", action="store_true", help="Run the latency benchmark on random baskets")
+    parser.add_argument("--sizes", type=str, default="5,8,12,20,25,50,100,200")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--deadline-ms", type=int, default=DEFAULT_DEADLINE_MS)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark([int(s) for s in args.sizes.split(",")], args.trials, args.deadline_ms)
+        sys.exit(0)
+
+    # Request JSON on stdin: {"items": [...], "stores": {...}, "deadline_ms": 250}
+    request = json.load(sys.stdin)
+    result = optimize_basket(
+        request.get("items", []),
+        store_overrides=request.get("stores"),
+        deadline_ms=int(request.get("deadline_ms", args.deadline_ms)),
+    )
+    print(json.dumps(result, ensure_ascii=False))
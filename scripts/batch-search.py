@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import logging
+import argparse
+import tempfile
+from multiprocessing import Process, Queue
+from catalog import Catalog, DEFAULT_MAX_AGE, STORES, record_scrape
+from ranking import tag_products, build_comparison
+from scutils import canonical_query
+from locations import resolve_location, location_key
+from stores import StoreSession
+from drivers import reap_orphans
+from logsetup import setup_logging
+
+# ---------------- Logging Setup ----------------
+# stdout carries the NDJSON stream; all logs go to stderr
+setup_logging()
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def dedupe_queries(raw_queries):
+    """
+    Group raw shopping-list entries by canonical query, keeping first-seen order.
+    """
+    groups = {}
+    for raw in raw_queries:
+        if not isinstance(raw, str):
+            continue
+        query = canonical_query(raw)
+        if query:
+            groups.setdefault(query, []).append(raw)
+    return groups
+
+
+# ---------------- Store Worker ----------------
+def store_worker(store, queries, headless, results, location=None):
+    """
+    Run every query for one store through a single browser session.
+    """
+    # Scrapers print JSON dumps to stdout; keep them out of the NDJSON stream
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    # Each store writes its results_*.json into its own scratch directory
+    workdir = tempfile.mkdtemp(prefix=f"smartcart-batch-{store.lower()}-")
+    os.chdir(workdir)
+
+    session = StoreSession(store, headless=headless, logger=logging.getLogger(), location=location)
+    try:
+        for query in queries:
+            products = session.search(query)
+            # A store that never opened, failed extraction or was skipped by its breaker must not be cached as "no products"
+            if session.last_search_ran:
+                record_scrape(store, query, products, logger=logging.getLogger(), location=location)
+            results.put((query, store, products))
+    except Exception:
+        logging.exception(f"{store} batch worker failed")
+    finally:
+        session.close()
+        results.put((None, store, None))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------- Batch ----------------
+def run_batch(groups, headless=True, sort_by="relevance", max_age=DEFAULT_MAX_AGE,
+              min_relevance=20, refresh=False, location=None):
+    with Catalog() as catalog:
+        stale = {q: (list(STORES) if refresh else catalog.stale_stores(q, max_age=max_age, location=location))
+                 for q in groups}
+
+    pending = {q: set(stores) for q, stores in stale.items()}
+    collected = {q: [] for q in groups}
+    emitted = set()
+
+    def finish(query):
+        fresh_stores = set(STORES) - set(stale[query])
+        products = list(collected[query])
+        if fresh_stores:
+            with Catalog() as catalog:
+                products += [p for p in catalog.lookup(query, max_age=max_age, min_relevance=min_relevance,
+                                                       location=location)
+                             if p["store"] in fresh_stores]
+        emit({
+            "type": "item",
+            "query": query,
+            "inputs": groups[query],
+            "data": build_comparison(query, products, sort_by=sort_by,
+                                     source="catalog" if not stale[query] else "scrape",
+                                     location=location_key(location)),
+        })
+        emitted.add(query)
+
+    # Fully cached items stream back before any browser starts
+    for query in groups:
+        if not pending[query]:
+            finish(query)
+
+    results = Queue()
+    workers = []
+    for store in STORES:
+        store_queries = [q for q in groups if store in pending[q]]
+        if store_queries:
+            worker = Process(target=store_worker, args=(store, store_queries, headless, results, location))
+            worker.start()
+            workers.append(worker)
+            logging.info(f"{store}: {len(store_queries)} queries in one session")
+
+    running = len(workers)
+    while running and len(emitted) < len(groups):
+        try:
+            query, store, products = results.get(timeout=1)
+        except queue.Empty:
+            if not any(w.is_alive() for w in workers) and results.empty():
+                break
+            continue
+
+        if query is None:
+            # Store session ended; items still waiting on it complete without it
+            running -= 1
+            for q in pending:
+                pending[q].discard(store)
+        else:
+            collected[query].extend(tag_products(store, products, min_relevance=min_relevance))
+            pending[query].discard(store)
+
+        for q in groups:
+            if q not in emitted and not pending[q]:
+                finish(q)
+
+    for q in groups:
+        if q not in emitted:
+            finish(q)
+
+    for worker in workers:
+        worker.join(timeout=10)
+
+    emit({"type": "done", "count": len(groups)})
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search a whole shopping list with one browser per store")
+    parser.add_argument("--queries", type=str, help="JSON array of queries (default: read from stdin)")
+    parser.add_argument("--headless", action="store_true", help="Run Chrome in headless mode")
+    parser.add_argument("--sort-by", choices=["relevance", "unit_price"], default="relevance")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help="Serve items from the catalog when rows are younger than this many seconds")
+    parser.add_argument("--min-relevance", type=float, default=20)
+    parser.add_argument("--refresh", action="store_true", help="Ignore the catalog and scrape every item")
+    parser.add_argument("--location", type=str, default=None, help="Delivery pincode or 'lat,lon'")
+    args = parser.parse_args()
+    try:
+        resolve_location(args.location)
+    except ValueError as e:
+        parser.error(str(e))
+
+    raw = json.loads(args.queries) if args.queries else json.load(sys.stdin)
+    if isinstance(raw, dict):
+        raw = raw.get("queries", [])
+
+    reap_orphans()
+    groups = dedupe_queries(raw)
+    logging.info(f"Batch of {len(raw)} entries -> {len(groups)} unique queries")
+
+    run_batch(groups, headless=args.headless, sort_by=args.sort_by, max_age=args.max_age,
+              min_relevance=args.min_relevance, refresh=args.refresh, location=args.location)
@@ -8,25 +8,28 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException, NoSuchElementException, TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from scutils import compute_relevance
+from scutils import compute_relevance, StoreScrapper
+from hydration import hydrated_products
+from scanning import CardScanner
 import time
 import json
 import random
+from urllib.parse import urlsplit
 
 
-class BBScrapper:
-    def __init__(self, logger, driver):
-        self.logger = logger or logging.getLogger(__name__)
-        self.driver = driver
+class BBScrapper(StoreScrapper):
+    store = "Bigbasket"
+
+    def __init__(self, logger, driver, selectors=None):
+        super().__init__(logger, driver, selectors)
         self.max_scrap = 5
         
 
     # ---------------- Open BigBasket ----------------
     # ---------------- Open BigBasket with Enhanced Anti-Detection ----------------
-    def open_bigbasket(self, url="https://www.bigbasket.com/"):
-        max_retries = 3
+    def open_bigbasket(self, url="https://www.bigbasket.com/", max_retries=3):
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 self.logger.debug(f"Attempt {attempt}: Opening {url}")
                 
@@ -45,7 +48,7 @@ class BBScrapper:
                 
                 # Check if we're on the correct page (not blocked/redirected)
                 current_url = self.driver.current_url
-                if "bigbasket.com" in current_url.lower():
+                if urlsplit(url).netloc.lower().removeprefix("www.") in current_url.lower():
                     self.logger.debug("Page loaded successfully.")
                     return True
                 else:
@@ -70,11 +73,7 @@ class BBScrapper:
         try:
             self.logger.debug(f"BB Searching for product: {search_inp}")
             #self.driver.save_screenshot("bigbasket-ss.png")
-            search_box = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, "input[placeholder='Search for Products...']")
-                )
-            )
+            search_box = self.selectors.wait(self.driver, "search_box", 10)
             #search_box = self.driver.find_element(By.CSS_SELECTOR, "input[placeholder='Search for Products...']")
             search_box.clear()
             #time.sleep(random.uniform(0.5, 1.5))
@@ -115,7 +114,6 @@ class BBScrapper:
             result_text = result_text_elem.text.strip()
 
             self.logger.info(f"BB Search Results: {count_text} {result_text}")
-            print(f"\nTotal Products Found: {count_text} {result_text}\n")
 
         except TimeoutException:
             self.logger.error("BB Timed out waiting for search results.")
@@ -123,149 +121,147 @@ class BBScrapper:
     # ---------------- Extract Products ----------------
     def extract_products(self):
         products = []
+        self.last_failed = False
+        self.last_complete = False
+        # Only a DOM scan that saw every card without dropping any can vouch for what is missing
+        scan_complete = False
         try:
             self.logger.debug("BB Extracting product details...")
 
-            first_card = WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "li[class*='PaginateItems']"))
-            )
-
-            container = first_card.find_element(By.XPATH, "..")
-            children = container.find_elements(By.XPATH, "./*")
-
-            for i, child in enumerate(children):
-                if i >= self.max_scrap:
-                    break
-                child_class = child.get_attribute("class") or ""
-
-                if "PaginateItems" in child_class:
-                    card = child
-                    spans = card.find_elements(By.TAG_NAME, "span")
-                    unavailable = any(
-                        sp.text.strip() == "Currently unavailable" and "Tags___StyledLabel2" in (sp.get_attribute("outerHTML") or "")
-                        for sp in spans
-                    )
-                    if unavailable:
-                        continue
+            # Embedded page state has every pack variant and price without clicking PackChangers
+            hydrated = hydrated_products(self.driver, self.search_inp, logger=self.logger)
+            if hydrated is not None:
+                products = [dict(p, relevance=compute_relevance(self.search_inp, p["brand"], p["item_name"], '', logger=self.logger))
+                            for p in hydrated]
+                products = [p for p in products if p["relevance"] >= 30]
+                if not products:
+                    self.logger.debug("No hydrated product is relevant; using DOM extraction")
+            if not products:
+                first_card = self.selectors.wait(self.driver, "card", 15)
+
+                container = first_card.find_element(By.XPATH, "..")
+                # Cards are scored as they load (scrolling for more); scanning stops once the top results settle
+                scanner = CardScanner(self.driver, lambda: container.find_elements(By.XPATH, "./*"),
+                                      max_cards=self.max_scrap, logger=self.logger)
+
+                scan_complete = True
+                for child in scanner.cards():
+                    child_class = child.get_attribute("class") or ""
+
+                    if "PaginateItems" in child_class:
+                        card = child
+                        spans = card.find_elements(By.TAG_NAME, "span")
+                        unavailable = any(
+                            sp.text.strip() == "Currently unavailable" and "Tags___StyledLabel2" in (sp.get_attribute("outerHTML") or "")
+                            for sp in spans
+                        )
+                        if unavailable:
+                            continue
 
-                    try:
-                        brand = card.find_element(By.CSS_SELECTOR, "span[class*='BrandName___StyledLabel2']").text.strip()
-                    except:
-                        brand = ""
-                    try:
-                        item_name = card.find_element(By.CSS_SELECTOR, "h3.block.m-0.line-clamp-2").text.strip()
-                    except:
-                        item_name = ""
+                        try:
+                            brand = self.selectors.find(card, "brand").text.strip()
+                        except:
+                            brand = ""
+                        try:
+                            item_name = self.selectors.find(card, "title").text.strip()
+                        except:
+                            item_name = ""
 
 
-                    # Calculate relevance (brand + item only)
-                    relevance = compute_relevance(self.search_inp, brand, item_name, '',logger=self.logger)
+                        # Calculate relevance (brand + item only)
+                        relevance = compute_relevance(self.search_inp, brand, item_name, '',logger=self.logger)
+                        scanner.score(relevance)
 
-                    if relevance >= 30:
+                        if relevance >= 30:
 
-                        # --- Updated Packing Logic ---
+                            # --- Updated Packing Logic ---
 
-                        # --- If PackSelector dropdown exists, click and fetch PackChanger options ---
+                            # --- If PackSelector dropdown exists, click and fetch PackChanger options ---
                         
-                        try:
-                            pack_button = card.find_element(By.CSS_SELECTOR, "button[class*='Button'][class*='PackChanger']")
-                            self.driver.execute_script("arguments[0].click();", pack_button)  # safer than .click()
-                            time.sleep(1)  # wait for popup to appear
-                            print(f"PackChanger button found for {item_name} and clicked.")
                             try:
-                                popup_ul = self.driver.find_element(By.CSS_SELECTOR, '[id*="headlessui-listbox-options"]')
-                                print("Popup UL found ✅")
-                                # Get all LI children havinf div as child of that UL 
-                                li_elements = popup_ul.find_elements(By.CSS_SELECTOR, 'li > div')
-                            except NoSuchElementException:
-                                print("Popup UL not found ❌")
+                                pack_button = card.find_element(By.CSS_SELECTOR, "button[class*='Button'][class*='PackChanger']")
+                                self.driver.execute_script("arguments[0].click();", pack_button)  # safer than .click()
+                                time.sleep(1)  # wait for popup to appear
+                                self.logger.debug("PackChanger button found for %s and clicked.", item_name, extra={"sampled": True})
+                                try:
+                                    popup_ul = self.driver.find_element(By.CSS_SELECTOR, '[id*="headlessui-listbox-options"]')
+                                    # Get all LI children havinf div as child of that UL 
+                                    li_elements = popup_ul.find_elements(By.CSS_SELECTOR, 'li > div')
+                                except NoSuchElementException:
+                                    self.logger.debug("Popup UL not found", extra={"sampled": True})
                             
 
-                            print(f"Found {len(li_elements)} li children (packing) for {item_name}")
-                            for li in li_elements:
-                                try:
-                                    # Find first div child with class 'packChanger' inside li
-                                    parent_div = li.find_element(By.CSS_SELECTOR, "div:first-child")
+                                self.logger.debug("Found %d li children (packing) for %s", len(li_elements), item_name, extra={"sampled": True})
+                                for li in li_elements:
+                                    try:
+                                        # Find first div child with class 'packChanger' inside li
+                                        parent_div = li.find_element(By.CSS_SELECTOR, "div:first-child")
                                 
-                                    packing_div = parent_div.find_element(By.CSS_SELECTOR, "div:first-child")
+                                        packing_div = parent_div.find_element(By.CSS_SELECTOR, "div:first-child")
                                     
-                                    print("Packing : ", packing_div.get_attribute("innerHTML"))
-                                    packing = packing_div.get_attribute("innerHTML")
+                                        packing = packing_div.get_attribute("innerHTML")
 
-                                    price_div = li.find_element(By.CSS_SELECTOR, "div:nth-child(2)")
-                                    '''print("Tag:", price_div.tag_name)
-                                    print("Class:", price_div.get_attribute('class'))
-                                    print("Outer HTML:", price_div.get_attribute('outerHTML'))
-                                    print("Inner HTML:", price_div.get_attribute('innerHTML'))
-                                    print("Text:", price_div.text)'''
-
-
-                                    price_span = price_div.find_element(By.CSS_SELECTOR, "div span:nth-of-type(2)")
+                                        price_div = li.find_element(By.CSS_SELECTOR, "div:nth-child(2)")
+                                        price_span = price_div.find_element(By.CSS_SELECTOR, "div span:nth-of-type(2)")
                                     
-                                    print("Price : ", price_span.get_attribute("innerHTML"))
-                                    price = price_span.get_attribute("innerHTML")
+                                        price = price_span.get_attribute("innerHTML")
+                                        self.logger.debug("Variant packing=%s price=%s", packing, price, extra={"sampled": True})
 
-                                    products.append({
-                                        "brand": brand,
-                                        "item_name": item_name,
-                                        "packing": packing,
-                                        "price": price,
-                                        "relevance": relevance
-                                    })
+                                        products.append({
+                                            "brand": brand,
+                                            "item_name": item_name,
+                                            "packing": packing,
+                                            "price": price,
+                                            "relevance": relevance
+                                        })
 
                                     
-                                except:
-                                    print("packing/price details div not found ❌")
-                                    # skip if structure not found
-                                    continue
-                        except NoSuchElementException:
-                            print("PackChanger button not found")
-                            try:
-                                # Try PackChanger first
-                                packing = card.find_element(
-                                    By.CSS_SELECTOR,
-                                    "span.PackChanger___StyledLabel-sc-newjpv-1"
-                                ).text.strip()
+                                    except:
+                                        self.logger.debug("packing/price details div not found", extra={"sampled": True})
+                                        # skip if structure not found
+                                        continue
                             except NoSuchElementException:
-                                # Fallback to PackSelector
-                                packing = card.find_element(
-                                    By.CSS_SELECTOR,
-                                    "span.PackSelector___StyledLabel-sc-1lmu4hv-0 span.Label-sc-15v1nk5-0.gJxZPQ"
-                                ).text.strip()
-                                print("Packing from PackSelector could not be extracted: ")
+                                self.logger.debug("PackChanger button not found", extra={"sampled": True})
+                                # PackChanger label first, PackSelector as fallback (see selectorhealth.SELECTORS)
+                                packing = self.selectors.find(card, "pack_label").text.strip()
                                 
 
-                        try:
-                            price_container = card.find_element(By.CSS_SELECTOR, "div.Pricing___StyledDiv-sc-pldi2d-0")
-                            price = price_container.find_element(By.CSS_SELECTOR, "span:first-child").text.strip()
-                        except:
-                            price = ""
+                            try:
+                                price_container = self.selectors.find(card, "price")
+                                price = price_container.find_element(By.CSS_SELECTOR, "span:first-child").text.strip()
+                            except:
+                                price = ""
 
-                        if not price or price.lower() in ["null", "undefined"]:
-                            self.logger.info(f"BB Skipping '{item_name}' because price is missing or invalid.")
-                            continue
+                            if not price or price.lower() in ["null", "undefined"]:
+                                scan_complete = False
+                                self.logger.info(f"BB Skipping '{item_name}' because price is missing or invalid.")
+                                continue
 
                         
 
-                        products.append({
-                            "brand": brand,
-                            "item_name": item_name,
-                            "packing": packing,
-                            "price": price,
-                            "relevance": relevance
-                        })
-                    else:
-                        self.logger.info(f"BB Skipping '{item_name}' due to low relevance ({relevance}%)")
+                            products.append({
+                                "brand": brand,
+                                "item_name": item_name,
+                                "packing": packing,
+                                "price": price,
+                                "relevance": relevance
+                            })
+                        else:
+                            scan_complete = False
+                            self.logger.debug("BB Skipping '%s' due to low relevance (%s%%)", item_name, relevance, extra={"sampled": True})
 
 
 
                     
 
+                    else:
+                        p_elements = child.find_elements(By.TAG_NAME, "p")
+                        if any("more items from" in (p.text or "").lower() or "more items from" in (p.get_attribute("outerHTML") or "").lower() for p in p_elements):
+                            self.logger.info("Encountered 'More items from' separator. Stopping scraping further items.")
+                            break
                 else:
-                    p_elements = child.find_elements(By.TAG_NAME, "p")
-                    if any("more items from" in (p.text or "").lower() or "more items from" in (p.get_attribute("outerHTML") or "").lower() for p in p_elements):
-                        self.logger.info("Encountered 'More items from' separator. Stopping scraping further items.")
-                        break
+                    scan_complete = scan_complete and scanner.complete
+                self.logger.info(f"BB {scanner.summary()}")
 
             # --- Relevance filtering ---
             filtered_products = [p for p in products if p["relevance"] >= 50]
@@ -273,6 +269,7 @@ class BBScrapper:
             if not filtered_products:
                 filtered_products = sorted(products, key=lambda x: x["relevance"], reverse=True)[:5]
                 self.logger.info("BB No products above 50% relevance. Using top 5 fallback.")
+            self.last_complete = scan_complete and len(filtered_products) == len(products)
 
             
 
@@ -297,7 +294,9 @@ class BBScrapper:
 
         except TimeoutException:
             self.logger.error("Timed out waiting for product cards.")
+            self.last_failed = True
         except Exception:
             self.logger.exception("exception in extracting bigbasket for product cards." )
+            self.last_failed = True
         logging.info(f"Scraped {len(products)} products on bigbasket.")
         return products
\ No newline at end of file
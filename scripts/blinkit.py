@@ -10,17 +10,15 @@ from selenium.common.exceptions import (
 )
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from scutils import compute_relevance
+from scutils import compute_relevance, StoreScrapper
+from scanning import CardScanner
 import time
 import json
 import re
 
 
-class BlinkItScrapper:
-    def __init__(self, logger, driver):
-        self.logger = logger or logging.getLogger(__name__)
-        self.driver = driver
+class BlinkItScrapper(StoreScrapper):
+    store = "Blinkit"
 
 
    # ---------------- Close any popup ----------------
@@ -39,16 +37,21 @@ class BlinkItScrapper:
             logging.debug(f"No popup detected: {e}")
 
     # ---------------- Open Blinkit ----------------
-    def open_blinkit(self, url="https://blinkit.com/s/"):
-        max_retries = 3
+    def open_blinkit(self, url="https://blinkit.com/s/", max_retries=3):
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 logging.debug(f"Attempt {attempt}: Opening {url}")
                 self.driver.get(url)
-                # Detect location button
-                WebDriverWait(self.driver, 5).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button.btn.location-box.mask-button"))
-                ).click()
+                # A snapshot profile already has a location, so the search box may show up instead
+                found = WebDriverWait(self.driver, 5).until(EC.any_of(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, self.selectors.css("location_button"))),
+                    EC.presence_of_element_located((By.CSS_SELECTOR, self.selectors.css("search_box")))
+                ))
+                if found.tag_name == "input":
+                    logging.info("Location already set. Search box is ready.")
+                    return True
+                found.click()
                 logging.info("Clicked Detect My Location button")
                 time.sleep(2)
                 return True
@@ -66,11 +69,7 @@ class BlinkItScrapper:
         self.user_input = product_name
         try:
             logging.debug(f"Searching for product: {product_name}")
-            search_box = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, "input.SearchBarContainer__Input-sc-hl8pft-3")
-                )
-            )
+            search_box = self.selectors.wait(self.driver, "search_box", 5)
             search_box.clear()
             search_box.send_keys(product_name)
             time.sleep(2)
@@ -83,28 +82,28 @@ class BlinkItScrapper:
 
 
     # ---------------- Extract Products ----------------
-    def extract_products(self):
-        max_retries = 3
+    def extract_products(self, max_retries=3):
+        self.last_failed = False
+        self.last_complete = False
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 all_products = []
                 filtered_products = []
 
-                wait = WebDriverWait(self.driver, 15)
-                products = wait.until(
-                    EC.presence_of_all_elements_located(
-                        (By.CSS_SELECTOR, "div[role='button'][tabindex='0']")
-                    )
-                )
+                products = self.selectors.wait(self.driver, "card", 15, condition=EC.presence_of_all_elements_located)
                 logging.info(f"Total products found: {len(products)}")
 
-                for idx, prod in enumerate(products, start=1):
+                # Score cards as they load and stop once the top results are settled
+                scanner = CardScanner(
+                    self.driver,
+                    lambda: self.driver.find_elements(By.CSS_SELECTOR, self.selectors.css("card")),
+                    logger=self.logger
+                )
+                for idx, prod in enumerate(scanner.cards(), start=1):
                     # --- Brand & Item Name ---
                     try:
-                        title_elem = prod.find_element(
-                            By.CSS_SELECTOR,
-                            "div.tw-text-300.tw-font-semibold.tw-line-clamp-2"
-                        )
+                        title_elem = self.selectors.find(prod, "title")
                         title_text = title_elem.text.strip() or title_elem.get_attribute("outerHTML")
                         if title_text:
                             parts = title_text.split()
@@ -119,7 +118,7 @@ class BlinkItScrapper:
 
                     # --- Packing ---
                     try:
-                        packing_elem = prod.find_element(By.CSS_SELECTOR, "div.tw-text-200.tw-font-medium.tw-line-clamp-1")
+                        packing_elem = self.selectors.find(prod, "packing")
                         packing = packing_elem.text.strip() or packing_elem.get_attribute("outerHTML")
                     except:
                         packing = "N/A"
@@ -127,7 +126,7 @@ class BlinkItScrapper:
                     # --- Price ---
                     price = "N/A"
                     try:
-                        price_candidates = prod.find_elements(By.CSS_SELECTOR, "div.tw-text-200.tw-font-semibold")
+                        price_candidates = self.selectors.find_all(prod, "price")
                         for elem in price_candidates:
                             text_val = elem.text.strip()
                             if text_val.startswith("₹"):
@@ -143,7 +142,8 @@ class BlinkItScrapper:
 
                     # --- Relevance ---
                     relevance = compute_relevance(self.user_input, brand, item_name,packing, logger=self.logger)
-                    logging.debug(f"Product {idx} relevance: {relevance}%")
+                    logging.debug("Product %d relevance: %s%%", idx, relevance, extra={"sampled": True})
+                    scanner.score(relevance)
 
                     product_data = {
                         "brand": brand,
@@ -156,6 +156,8 @@ class BlinkItScrapper:
                     if relevance >= 50:
                         filtered_products.append(product_data)
 
+                logging.info(f"Blinkit {scanner.summary()}")
+
                 # If no product has relevance >=50, take top 5
                 if not filtered_products:
                     filtered_products = sorted(all_products, key=lambda x: x["relevance"], reverse=True)[:5]
@@ -163,6 +165,9 @@ class BlinkItScrapper:
                 else:
                     filtered_products.sort(key=lambda x: x["relevance"], reverse=True)
 
+                # Nothing trimmed by relevance: a product missing from these results is not listed at all
+                self.last_complete = scanner.complete and len(filtered_products) == len(all_products)
+
                 # If price missing, refresh search and retry
                 missing_price = any(p["price"] == "N/A" for p in filtered_products)
                 if missing_price and attempt < max_retries:
@@ -177,8 +182,7 @@ class BlinkItScrapper:
                     json.dump(filtered_products, f, indent=4, ensure_ascii=False)
 
                 logging.info("Filtered products saved to results_blinkit.json")
-                print("\nFiltered products JSON array (sorted by relevance):")
-                print(json.dumps(filtered_products, indent=4, ensure_ascii=False))
+                self.logger.debug(f"Filtered products (sorted by relevance): {len(filtered_products)}")
                 
                 return filtered_products  # Return for headless mode handling
 
@@ -188,9 +192,10 @@ class BlinkItScrapper:
                     logging.info("Refreshing page and retrying...")
                     self.driver.refresh()
                     time.sleep(5)
-                    self.search_product( self.user_input)
+                    self.search_product(self.user_input)
                 else:
                     logging.critical("Max retries reached. Could not load products.")
+                    self.last_failed = True
                     return []  # Return empty list on failure
 
    
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import logging
+import argparse
+from catalog import BASE_DIR
+
+# Shared by every search, batch worker and queue worker on the host
+BREAKER_PATH = os.getenv("BREAKER_PATH", os.path.join(BASE_DIR, "breakers.db"))
+
+# Outcomes older than this no longer count towards failure rates or retry budgets
+WINDOW_SECONDS = int(os.getenv("BREAKER_WINDOW", 15 * 60))
+MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", 5))
+FAILURE_THRESHOLD = float(os.getenv("BREAKER_FAILURE_THRESHOLD", 0.6))
+# Open for COOLDOWN, doubled after every failed half-open probe, up to MAX_COOLDOWN
+COOLDOWN_SECONDS = int(os.getenv("BREAKER_COOLDOWN", 60))
+MAX_COOLDOWN_SECONDS = int(os.getenv("BREAKER_MAX_COOLDOWN", 30 * 60))
+# A half-open probe that never reports back is given up after this long
+PROBE_TIMEOUT_SECONDS = 5 * 60
+# Retry budgets aim for this chance that a retry rescues a failed first attempt
+TARGET_SUCCESS = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    store TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'closed',
+    open_until REAL,
+    cooldown REAL,
+    probe_started REAL,
+    updated_at REAL NOT NULL
+);
+-- op is 'request' for whole searches, or 'open'/'extract' for single attempts (attempt = 1, 2, ...)
+CREATE TABLE IF NOT EXISTS outcomes (
+    store TEXT NOT NULL,
+    op TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outcomes ON outcomes(store, op, ts);
+"""
+
+
+class CircuitBreaker:
+    """
+    Per-store breaker: closed -> open when recent searches mostly fail, then one half-open probe decides.
+    """
+    def __init__(self, store, path=None, logger=None):
+        self.store = store
+        self.logger = logger or logging.getLogger(__name__)
+        self.conn = sqlite3.connect(path or BREAKER_PATH, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO breakers (store, cooldown, updated_at) VALUES (?, ?, ?)",
+            (store, COOLDOWN_SECONDS, time.time())
+        )
+        self.probing = False
+
+    def close(self):
+        self.conn.close()
+
+    def _row(self):
+        return self.conn.execute("SELECT * FROM breakers WHERE store = ?", (self.store,)).fetchone()
+
+    # ---------------- Gate ----------------
+    def allow(self):
+        """
+        True when a search may run. Once the cooldown is over, exactly one caller wins the half-open probe.
+        """
+        now = time.time()
+        row = self._row()
+        if row["state"] == "closed":
+            return True
+
+        cur = self.conn.execute(
+            """
+            UPDATE breakers SET state = 'half_open', probe_started = ?, updated_at = ?
+            WHERE store = ? AND ((state = 'open' AND open_until <= ?)
+                                 OR (state = 'half_open' AND probe_started < ?))
+            """,
+            (now, now, self.store, now, now - PROBE_TIMEOUT_SECONDS)
+        )
+        if cur.rowcount == 1:
+            self.probing = True
+            self.logger.info(f"{self.store} circuit half-open: probing with this search")
+            return True
+
+        self.logger.warning(f"{self.store} circuit {row['state']}: skipping store")
+        return False
+
+    # ---------------- Outcomes ----------------
+    def record_attempts(self, op, attempts, succeeded):
+        """
+        Log the attempts of one retry loop: attempts - 1 failures, then a success or a final failure.
+        """
+        now = time.time()
+        attempts = max(int(attempts or 0), 1)
+        rows = [(self.store, op, 0, n, now) for n in range(1, attempts)]
+        rows.append((self.store, op, 1 if succeeded else 0, attempts, now))
+        self.conn.executemany("INSERT INTO outcomes (store, op, ok, attempt, ts) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def record(self, success):
+        """
+        Log a whole search and move the breaker: a probe closes or re-opens it, a bad failure rate opens it.
+        """
+        now = time.time()
+        self.conn.execute("INSERT INTO outcomes (store, op, ok, ts) VALUES (?, 'request', ?, ?)",
+                          (self.store, 1 if success else 0, now))
+        self.conn.execute("DELETE FROM outcomes WHERE store = ? AND ts < ?", (self.store, now - WINDOW_SECONDS))
+        row = self._row()
+
+        if self.probing or row["state"] == "half_open":
+            self.probing = False
+            if success:
+                self._set_state("closed", cooldown=COOLDOWN_SECONDS)
+                self.logger.info(f"{self.store} circuit closed: probe succeeded")
+            else:
+                cooldown = min((row["cooldown"] or COOLDOWN_SECONDS) * 2, MAX_COOLDOWN_SECONDS)
+                self._set_state("open", open_until=now + cooldown, cooldown=cooldown)
+                self.logger.warning(f"{self.store} circuit re-opened for {cooldown:.0f}s: probe failed")
+            return
+
+        if row["state"] == "closed" and not success:
+            total, failures = self.failure_counts("request")
+            if total >= MIN_REQUESTS and failures / total >= FAILURE_THRESHOLD:
+                self._set_state("open", open_until=now + COOLDOWN_SECONDS, cooldown=COOLDOWN_SECONDS)
+                self.logger.warning(f"{self.store} circuit opened: {failures}/{total} recent searches failed")
+
+    def _set_state(self, state, open_until=None, cooldown=None):
+        self.conn.execute(
+            "UPDATE breakers SET state = ?, open_until = ?, cooldown = ?, probe_started = NULL, updated_at = ? "
+            "WHERE store = ?",
+            (state, open_until, cooldown, time.time(), self.store)
+        )
+
+    def failure_counts(self, op):
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS total, SUM(1 - ok) AS failures FROM outcomes WHERE store = ? AND op = ? AND ts >= ?",
+            (self.store, op, time.time() - WINDOW_SECONDS)
+        ).fetchone()
+        return row["total"], row["failures"] or 0
+
+    # ---------------- Retry Budgets ----------------
+    def retry_budget(self, op, default, min_samples=MIN_REQUESTS):
+        """
+        Attempts worth making, from how often recent retries (attempt 2+) actually succeeded.
+        Retries that keep failing (store down, markup changed) are dropped; ones that rescue loops are kept.
+        Never more than the scraper's fixed default.
+        """
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS retries, SUM(ok) AS rescued FROM outcomes "
+            "WHERE store = ? AND op = ? AND attempt > 1 AND ts >= ?",
+            (self.store, op, time.time() - WINDOW_SECONDS)
+        ).fetchone()
+        retries, rescued = row["retries"], row["rescued"] or 0
+        if retries < min_samples:
+            return default
+        rescue_rate = rescued / retries
+        if rescue_rate <= 0.05:
+            return 1
+        if rescue_rate >= 1:
+            return min(2, default)
+        needed = math.ceil(math.log(1 - TARGET_SUCCESS) / math.log(1 - rescue_rate))
+        return max(1, min(1 + needed, default))
+
+
+def breaker_states(path=None):
+    conn = sqlite3.connect(path or BREAKER_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    now = time.time()
+    states = []
+    for row in conn.execute("SELECT * FROM breakers ORDER BY store"):
+        counts = {}
+        for r in conn.execute(
+            "SELECT op, COUNT(*) AS total, SUM(1 - ok) AS failures FROM outcomes "
+            "WHERE store = ? AND ts >= ? GROUP BY op", (row["store"], now - WINDOW_SECONDS)
+        ):
+            counts[r["op"]] = {"total": r["total"], "failures": r["failures"] or 0}
+        states.append({
+            "store": row["store"],
+            "state": row["state"],
+            "retry_in_seconds": round(row["open_until"] - now, 1) if row["state"] == "open" else None,
+            "window": counts,
+        })
+    conn.close()
+    return states
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-store circuit breakers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Print every store's breaker state")
+    reset_parser = sub.add_parser("reset", help="Close a store's breaker and forget its history")
+    reset_parser.add_argument("store")
+    args = parser.parse_args()
+
+    if args.command == "reset":
+        breaker = CircuitBreaker(args.store)
+        breaker._set_state("closed", cooldown=COOLDOWN_SECONDS)
+        breaker.conn.execute("DELETE FROM outcomes WHERE store = ?", (args.store,))
+        breaker.close()
+    print(json.dumps(breaker_states()))
+    sys.exit(0)
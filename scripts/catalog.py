@@ -0,0 +1,370 @@
+import os
+import re
+import json
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from normalizer import clean_text, parse_packing, parse_price
+from scutils import canonical_query, compute_relevances
+from locations import location_key
+from pricehistory import PriceHistory, record_prices, RETENTION_DAYS as HISTORY_RETENTION_DAYS
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(BASE_DIR, "catalog.db"))
+
+# Rows younger than this are served without scraping again
+DEFAULT_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 6 * 60 * 60))
+DEFAULT_RETENTION_DAYS = int(os.getenv("CATALOG_RETENTION_DAYS", 30))
+
+# Store names as they appear in comparison rows (results_<store>.json)
+STORES = ["Bigbasket", "Blinkit", "Swiggyinsta"]
+
+# Bumped whenever the tables change; see MIGRATIONS
+SCHEMA_VERSION = 1
+
+# Prices depend on the delivery location, so it is part of every key ('' = whatever the store detected)
+PRODUCTS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY,
+    store TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    brand TEXT NOT NULL DEFAULT '',
+    item_name TEXT NOT NULL DEFAULT '',
+    packing TEXT NOT NULL DEFAULT '',
+    price TEXT,
+    price_paise INTEGER,
+    quantity REAL,
+    unit TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    UNIQUE (store, location, brand, item_name, packing)
+);
+"""
+
+# One row per (query, store, location): when that store was last scraped for the query
+SCRAPES_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    query TEXT NOT NULL,
+    store TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    scraped_at REAL NOT NULL,
+    product_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (query, store, location)
+);
+"""
+
+# Relevance of each product for the query that found it
+HITS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    query TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    relevance REAL NOT NULL,
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (query, location, product_id)
+);
+"""
+
+SCHEMA = PRODUCTS_TABLE.format(name="products") + SCRAPES_TABLE.format(name="scrapes") + HITS_TABLE.format(name="hits") + """
+CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products(last_seen);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    brand, item_name, packing, content='products', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, brand, item_name, packing)
+    VALUES (new.id, new.brand, new.item_name, new.packing);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, brand, item_name, packing)
+    VALUES ('delete', old.id, old.brand, old.item_name, old.packing);
+END;
+"""
+
+# version -> script upgrading from version - 1; ids are kept so the FTS index stays valid
+MIGRATIONS = {
+    1: PRODUCTS_TABLE.format(name="products_v1") + """
+INSERT INTO products_v1 (id, store, location, brand, item_name, packing, price, price_paise, quantity, unit,
+                         first_seen, last_seen)
+SELECT id, store, '', brand, item_name, packing, price, price_paise, quantity, unit, first_seen, last_seen
+FROM products;
+DROP TABLE products;
+ALTER TABLE products_v1 RENAME TO products;
+""" + SCRAPES_TABLE.format(name="scrapes_v1") + """
+INSERT INTO scrapes_v1 (query, store, location, scraped_at, product_count)
+SELECT query, store, '', scraped_at, product_count FROM scrapes;
+DROP TABLE scrapes;
+ALTER TABLE scrapes_v1 RENAME TO scrapes;
+""" + HITS_TABLE.format(name="hits_v1") + """
+INSERT INTO hits_v1 (query, location, product_id, relevance, scraped_at)
+SELECT query, '', product_id, relevance, scraped_at FROM hits;
+DROP TABLE hits;
+ALTER TABLE hits_v1 RENAME TO hits;
+""",
+}
+
+UPSERT_PRODUCT = """
+INSERT INTO products (store, location, brand, item_name, packing, price, price_paise, quantity, unit,
+                      first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (store, location, brand, item_name, packing) DO UPDATE SET
+    price = excluded.price,
+    price_paise = excluded.price_paise,
+    quantity = excluded.quantity,
+    unit = excluded.unit,
+    last_seen = excluded.last_seen
+RETURNING id
+"""
+
+
+class Catalog:
+    def __init__(self, path=None, logger=None):
+        self.path = path or CATALOG_PATH
+        self.logger = logger or logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+    def migrate(self):
+        """
+        Bring an older catalog file up to SCHEMA_VERSION (PRAGMA user_version), then create anything missing.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        has_tables = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products'"
+        ).fetchone()
+        if has_tables and version < SCHEMA_VERSION:
+            self.conn.execute("PRAGMA foreign_keys=OFF")
+            for target in range(version + 1, SCHEMA_VERSION + 1):
+                self.logger.info(f"Migrating catalog {self.path} to schema version {target}")
+                self.conn.executescript(f"BEGIN;\n{MIGRATIONS[target]}\nPRAGMA user_version = {target};\nCOMMIT;")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- Writes ----------------
+    def record_scrape(self, store, search_input, products, scraped_at=None, location=None):
+        """
+        Upsert every product of one store scrape (at one delivery location) in a single transaction.
+        Returns the catalog ids in the same order as products.
+        """
+        query = canonical_query(search_input)
+        loc = location_key(location)
+        scraped_at = scraped_at or time.time()
+        ids = []
+        observed = []
+
+        with self.conn:
+            # Products missing from this scrape should no longer answer the query
+            self.conn.execute(
+                "DELETE FROM hits WHERE query = ? AND location = ? "
+                "AND product_id IN (SELECT id FROM products WHERE store = ?)",
+                (query, loc, store)
+            )
+            for product in products or []:
+                packing = clean_text(product.get("packing"))
+                price = clean_text(product.get("price"))
+                quantity, unit = parse_packing(packing)
+                price_paise = parse_price(price)
+                row = self.conn.execute(UPSERT_PRODUCT, (
+                    store,
+                    loc,
+                    clean_text(product.get("brand")),
+                    clean_text(product.get("item_name")),
+                    packing,
+                    price,
+                    price_paise,
+                    quantity,
+                    unit,
+                    scraped_at,
+                    scraped_at,
+                )).fetchone()
+                ids.append(row["id"])
+                observed.append((row["id"], price_paise))
+
+                relevance = product.get("relevance", product.get("relevance_score", 0))
+                try:
+                    relevance = float(relevance or 0)
+                except (TypeError, ValueError):
+                    relevance = 0.0
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO hits (query, location, product_id, relevance, scraped_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (query, loc, row["id"], relevance, scraped_at)
+                )
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scrapes (query, store, location, scraped_at, product_count) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (query, store, loc, scraped_at, len(ids))
+            )
+
+        self.logger.info(f"Catalog: upserted {len(ids)} {store} products for '{query}'" + (f" at {loc}" if loc else ""))
+        record_prices(store, observed, scraped_at=scraped_at, logger=self.logger)
+        return ids
+
+    # ---------------- Reads ----------------
+    def stale_stores(self, search_input, max_age=DEFAULT_MAX_AGE, stores=STORES, location=None):
+        """
+        Stores whose last scrape for this query (at this location) is missing or older than max_age seconds.
+        """
+        query = canonical_query(search_input)
+        cutoff = time.time() - max_age
+        fresh = {
+            row["store"] for row in self.conn.execute(
+                "SELECT store FROM scrapes WHERE query = ? AND location = ? AND scraped_at >= ?",
+                (query, location_key(location), cutoff)
+            )
+        }
+        return [store for store in stores if store not in fresh]
+
+    def last_scrape(self, search_input, store, location=None):
+        """
+        When this store was last scraped for the query (at this location), or None.
+        """
+        row = self.conn.execute(
+            "SELECT scraped_at FROM scrapes WHERE query = ? AND store = ? AND location = ?",
+            (canonical_query(search_input), store, location_key(location))
+        ).fetchone()
+        return row["scraped_at"] if row else None
+
+    def is_fresh(self, search_input, max_age=DEFAULT_MAX_AGE, stores=STORES, location=None):
+        return not self.stale_stores(search_input, max_age=max_age, stores=stores, location=location)
+
+    def lookup(self, search_input, max_age=DEFAULT_MAX_AGE, min_relevance=0, limit=50, location=None):
+        """
+        Answer a search from the catalog: products found by earlier scrapes of this query,
+        plus fresh full-text matches scraped under other queries.
+        Rows follow the comparator's shape (store, brand, item_name, packing, price, original_relevance).
+        """
+        query = canonical_query(search_input)
+        loc = location_key(location)
+        cutoff = time.time() - max_age
+        products = {}
+
+        for row in self.conn.execute(
+            """SELECT p.*, h.relevance FROM hits h JOIN products p ON p.id = h.product_id
+               WHERE h.query = ? AND h.location = ? AND h.scraped_at >= ?""",
+            (query, loc, cutoff)
+        ):
+            products[row["id"]] = self._to_product(row, row["relevance"])
+
+        match = self._match_expression(query)
+        if match:
+            rows = [row for row in self.conn.execute(
+                """SELECT p.* FROM products_fts f JOIN products p ON p.id = f.rowid
+                   WHERE products_fts MATCH ? AND p.location = ? AND p.last_seen >= ?
+                   ORDER BY bm25(products_fts) LIMIT ?""",
+                (match, loc, cutoff, limit)
+            ) if row["id"] not in products]
+            # One scoring pass for every candidate instead of a fuzzy-matching model per row
+            relevances = compute_relevances(
+                search_input, [f"{row['brand']} {row['item_name']} {row['packing']}".strip() for row in rows],
+                logger=self.logger
+            )
+            for row, relevance in zip(rows, relevances):
+                products[row["id"]] = self._to_product(row, relevance)
+
+        results = [p for p in products.values() if p["original_relevance"] >= min_relevance]
+        self.logger.info(f"Catalog: {len(results)} products for '{query}' (max_age={max_age}s)")
+        return results
+
+    def find_product(self, store, brand, item_name, packing, location=None):
+        """
+        Catalog id of one store's product at a location, or None.
+        """
+        row = self.conn.execute(
+            "SELECT id FROM products WHERE store = ? AND location = ? AND brand = ? AND item_name = ? AND packing = ?",
+            (store, location_key(location), clean_text(brand), clean_text(item_name), clean_text(packing))
+        ).fetchone()
+        return row["id"] if row else None
+
+    def stats(self):
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS products, MIN(last_seen) AS oldest, MAX(last_seen) AS newest FROM products"
+        ).fetchone()
+        queries = self.conn.execute("SELECT COUNT(DISTINCT query) FROM scrapes").fetchone()[0]
+        return {"products": row["products"], "queries": queries, "oldest": row["oldest"], "newest": row["newest"]}
+
+    # ---------------- Maintenance ----------------
+    def compact(self, retention_days=DEFAULT_RETENTION_DAYS):
+        """
+        Drop rows not seen within the retention window, merge FTS segments and reclaim space.
+        """
+        cutoff = time.time() - retention_days * 24 * 60 * 60
+        with self.conn:
+            self.conn.execute("DELETE FROM hits WHERE scraped_at < ?", (cutoff,))
+            self.conn.execute("DELETE FROM scrapes WHERE scraped_at < ?", (cutoff,))
+            removed = self.conn.execute("DELETE FROM products WHERE last_seen < ?", (cutoff,)).rowcount
+            self.conn.execute("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+        self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.logger.info(f"Catalog compacted: removed {removed} products older than {retention_days} days")
+        return removed
+
+    # ---------------- Helpers ----------------
+    @staticmethod
+    def _match_expression(query):
+        tokens = [t for t in re.findall(r"\w+", query) if len(t) > 1]
+        return " AND ".join(f'"{t}"' for t in tokens)
+
+    @staticmethod
+    def _to_product(row, relevance):
+        return {
+            "id": row["id"],
+            "store": row["store"],
+            "location": row["location"],
+            "brand": row["brand"],
+            "item_name": row["item_name"],
+            "packing": row["packing"],
+            "price": row["price"],
+            "relevance": relevance,
+            "original_relevance": relevance,
+            "last_seen": row["last_seen"],
+        }
+
+
+def record_scrape(store, search_input, products, logger=None, location=None):
+    """
+    Best-effort catalog write used by the scrapers; never fails a scrape.
+    """
+    try:
+        with Catalog(logger=logger) as catalog:
+            return catalog.record_scrape(store, search_input, products, location=location)
+    except sqlite3.Error as e:
+        (logger or logging.getLogger(__name__)).error(f"Catalog write failed for {store}: {e}")
+        return []
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="SmartCart product catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact_parser = sub.add_parser("compact", help="Remove old rows and optimize the index")
+    compact_parser.add_argument("--retention-days", type=int, default=DEFAULT_RETENTION_DAYS)
+    compact_parser.add_argument("--history-retention-days", type=int, default=HISTORY_RETENTION_DAYS,
+                                help="Price history kept (longer than catalog rows, for price charts)")
+    sub.add_parser("stats", help="Print catalog statistics")
+    args = parser.parse_args()
+
+    with Catalog() as catalog:
+        if args.command == "compact":
+            catalog.compact(retention_days=args.retention_days)
+            PriceHistory().compact(retention_days=args.history_retention_days)
+        print(json.dumps(catalog.stats()))
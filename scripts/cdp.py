@@ -0,0 +1,602 @@
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import asyncio
+import hashlib
+import logging
+import argparse
+import subprocess
+from urllib.parse import urlsplit
+from drivers import lease_profile, track_pids, teardown, STEALTH_JS, SHARED_BROWSER_ARGS
+from scutils import compute_relevance, keep_relevant
+from hydration import READ_STATE_JS, HYDRATION_ENABLED, is_current, state_products
+from scanning import TOP_K, MAX_IDLE_SCROLLS, SCROLL_WAIT_SECONDS
+from breakers import CircuitBreaker
+
+# Chrome binary for the CDP backend (the image sets CHROME_BIN); the first of these on PATH when unset
+CHROME_PATH = os.getenv("CHROME_PATH") or os.getenv("CHROME_BIN")
+CHROME_CANDIDATES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+# Pages (tabs) searched at once in one browser
+DEFAULT_MAX_PAGES = int(os.getenv("CDP_MAX_PAGES", 8))
+COMMAND_TIMEOUT = 30
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class CDPError(Exception):
+    pass
+
+
+# ---------------- WebSocket ----------------
+class WebSocket:
+    """
+    Minimal RFC 6455 client: text frames out (masked), text/continuation/ping/close frames in.
+    Enough for Chrome's DevTools endpoint, which needs no extensions or subprotocols.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url, timeout=10):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port),
+                                                timeout=timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((f"GET {parts.path} HTTP/1.1\r\nHost: {parts.hostname}:{parts.port}\r\n"
+                      f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                      f"Sec-WebSocket-Version: 13\r\n\r\n").encode())
+        await writer.drain()
+        head = (await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=timeout)).decode("latin-1")
+        expected = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        if " 101 " not in head.split("\r\n", 1)[0] or expected not in head:
+            writer.close()
+            raise CDPError(f"WebSocket handshake with {url} failed: {head.splitlines()[0] if head else 'no reply'}")
+        return cls(reader, writer)
+
+    @staticmethod
+    def _mask(data, key):
+        n = len(data)
+        if not n:
+            return data
+        stream = (key * (n // 4 + 1))[:n]
+        return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(n, "big")
+
+    def _frame(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            header = bytes([0x80 | opcode, 0x80 | n])
+        elif n < 1 << 16:
+            header = bytes([0x80 | opcode, 0x80 | 126]) + n.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 0x80 | 127]) + n.to_bytes(8, "big")
+        key = os.urandom(4)
+        return header + key + self._mask(payload, key)
+
+    async def send(self, text):
+        self.writer.write(self._frame(0x1, text.encode("utf-8")))
+        await self.writer.drain()
+
+    async def recv(self):
+        """
+        Next complete text message. Raises ConnectionError when the peer closes.
+        """
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length = int.from_bytes(await self.reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await self.reader.readexactly(8), "big")
+            key = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if key:
+                payload = self._mask(payload, key)
+
+            if opcode == 0x8:
+                raise ConnectionError("DevTools closed the connection")
+            if opcode == 0x9:
+                self.writer.write(self._frame(0xA, payload))
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message.decode("utf-8")
+
+    def close(self):
+        try:
+            self.writer.write(self._frame(0x8, b""))
+            self.writer.close()
+        except Exception:
+            pass
+
+
+# ---------------- Connection ----------------
+class Connection:
+    """
+    One browser-level DevTools connection. Pages are flattened target sessions on it, so every tab
+    shares the socket and commands from many coroutines are in flight at once.
+    """
+    def __init__(self, socket, logger=None):
+        self.socket = socket
+        self.logger = logger or logging.getLogger(__name__)
+        self.next_id = 0
+        self.pending = {}
+        self.waiters = []
+        # Set once the read loop has stopped; later commands fail with it instead of timing out
+        self.error = None
+        self.reader = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            while True:
+                message = json.loads(await self.socket.recv())
+                if "id" in message:
+                    future = self.pending.pop(message["id"], None)
+                    if future and not future.done():
+                        if "error" in message:
+                            future.set_exception(CDPError(f"{message['error'].get('message')} "
+                                                          f"({message['error'].get('code')})"))
+                        else:
+                            future.set_result(message.get("result", {}))
+                    continue
+                # Waiters that timed out were cancelled; drop them with the ones this event resolves
+                remaining = []
+                for method, session_id, future in self.waiters:
+                    if future.done():
+                        continue
+                    if message.get("method") == method and message.get("sessionId") == session_id:
+                        future.set_result(message.get("params", {}))
+                    else:
+                        remaining.append((method, session_id, future))
+                self.waiters = remaining
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self._fail_all(CDPError(f"DevTools connection lost: {e}"))
+        except Exception as e:
+            # A frame we cannot parse ends the loop too; nothing would ever answer the commands in flight
+            self.logger.error(f"DevTools read loop failed: {e!r}")
+            self._fail_all(CDPError(f"DevTools read loop failed: {e!r}"))
+
+    def _fail_all(self, error):
+        self.error = error
+        for future in list(self.pending.values()) + [w[2] for w in self.waiters]:
+            if not future.done():
+                future.set_exception(error)
+        self.waiters = []
+
+    async def send(self, method, params=None, session_id=None, timeout=COMMAND_TIMEOUT):
+        if self.error:
+            raise self.error
+        self.next_id += 1
+        message = {"id": self.next_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        await self.socket.send(json.dumps(message))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message["id"], None)
+
+    def expect(self, method, session_id=None):
+        """
+        Future for the next `method` event; register it before triggering the event.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.error:
+            future.set_exception(self.error)
+        else:
+            self.waiters.append((method, session_id, future))
+        return future
+
+    def close(self):
+        self.reader.cancel()
+        self.socket.close()
+
+
+# ---------------- Browser ----------------
+def find_chrome():
+    if CHROME_PATH:
+        return CHROME_PATH
+    for name in CHROME_CANDIDATES:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise CDPError("No Chrome binary found; set CHROME_PATH")
+
+
+class Browser:
+    """
+    Chrome launched with a DevTools port (no chromedriver), registered with drivers.py so it is reaped like the rest.
+    """
+    def __init__(self, headless=True, logger=None):
+        self.headless = headless
+        self.logger = logger or logging.getLogger(__name__)
+        self.process = None
+        self.entry = None
+        self.connection = None
+
+    async def start(self, timeout=30):
+        """
+        Launch Chrome and connect to it. On failure nothing is left behind: __aexit__ does not run
+        when __aenter__ raises, so the process and profile lease are torn down here.
+        """
+        try:
+            return await self._start(timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _start(self, timeout):
+        self.entry = lease_profile()
+        profile_dir = self.entry["profile_dir"]
+        args = [find_chrome(), f"--user-data-dir={profile_dir}", "--remote-debugging-port=0",
+                "--no-first-run", "--no-default-browser-check", "--password-store=basic",
+                "--disable-blink-features=AutomationControlled", *SHARED_BROWSER_ARGS, "about:blank"]
+        if self.headless:
+            args[1:1] = ["--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu",
+                         "--window-size=1920,1080"]
+        self.process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+        track_pids(self.entry, self.process.pid)
+
+        # Chrome writes the port it picked and the browser endpoint path once DevTools is listening
+        port_file = os.path.join(profile_dir, "DevToolsActivePort")
+        deadline = time.time() + timeout
+        while not os.path.exists(port_file) or os.path.getsize(port_file) == 0:
+            if self.process.poll() is not None:
+                raise CDPError(f"Chrome exited with code {self.process.returncode} before DevTools was ready")
+            if time.time() > deadline:
+                raise CDPError("Chrome did not open its DevTools port in time")
+            await asyncio.sleep(0.1)
+        with open(port_file, "r") as f:
+            port, path = f.read().split()[:2]
+        socket = await WebSocket.connect(f"ws://127.0.0.1:{port}{path}")
+        self.connection = Connection(socket, logger=self.logger)
+        self.logger.info(f"CDP browser ready on port {port} (pid {self.process.pid})")
+        return self
+
+    async def new_page(self, location=None):
+        target = await self.connection.send("Target.createTarget", {"url": "about:blank"})
+        attached = await self.connection.send("Target.attachToTarget",
+                                              {"targetId": target["targetId"], "flatten": True})
+        page = Page(self.connection, target["targetId"], attached["sessionId"], logger=self.logger)
+        await page.send("Page.enable")
+        if self.headless:
+            await page.send("Page.addScriptToEvaluateOnNewDocument", {"source": STEALTH_JS})
+        if location:
+            await page.send("Emulation.setGeolocationOverride",
+                            {"latitude": location["lat"], "longitude": location["lon"], "accuracy": 50})
+        return page
+
+    async def close(self):
+        if self.connection:
+            try:
+                await self.connection.send("Browser.close", timeout=5)
+            except Exception:
+                pass
+            self.connection.close()
+        if self.entry:
+            teardown(self.entry)
+        self.connection = self.entry = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+# ---------------- Page ----------------
+class Page:
+    """
+    The operations the scrapers need, over one tab's session: navigate, wait for a selector,
+    evaluate, click and type.
+    """
+    def __init__(self, connection, target_id, session_id, logger=None):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+        self.logger = logger or logging.getLogger(__name__)
+
+    def send(self, method, params=None, timeout=COMMAND_TIMEOUT):
+        return self.connection.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    async def goto(self, url, timeout=30):
+        """
+        Navigate and wait for DOMContentLoaded (the same point Selenium's "eager" strategy returns at).
+        """
+        loaded = self.connection.expect("Page.domContentEventFired", self.session_id)
+        result = await self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            loaded.cancel()
+            raise CDPError(f"Navigation to {url} failed: {result['errorText']}")
+        try:
+            await asyncio.wait_for(loaded, timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"DOMContentLoaded not seen within {timeout}s for {url}")
+
+    async def evaluate(self, expression, timeout=COMMAND_TIMEOUT):
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True,
+                                                      "awaitPromise": True}, timeout=timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CDPError(details.get("exception", {}).get("description") or details.get("text"))
+        return result.get("result", {}).get("value")
+
+    async def wait_for(self, selector, timeout=15, poll=0.25):
+        """
+        Wait until selector (or any of a list of selectors) matches; returns the one that did, or None.
+        """
+        selectors = [selector] if isinstance(selector, str) else list(selector)
+        expression = f"({json.dumps(selectors)}).find(s => document.querySelector(s)) || null"
+        deadline = time.time() + timeout
+        while True:
+            found = await self.evaluate(expression)
+            if found:
+                return found
+            if time.time() >= deadline:
+                return None
+            await asyncio.sleep(poll)
+
+    async def click(self, selector):
+        box = await self.evaluate(f"""(() => {{
+            const el = document.querySelector({json.dumps(selector)});
+            if (!el) return null;
+            el.scrollIntoView({{block: 'center'}});
+            const r = el.getBoundingClientRect();
+            return {{x: r.left + r.width / 2, y: r.top + r.height / 2}};
+        }})()""")
+        if not box:
+            raise CDPError(f"Nothing to click at {selector}")
+        for kind in ("mouseMoved", "mousePressed", "mouseReleased"):
+            await self.send("Input.dispatchMouseEvent", {"type": kind, "x": box["x"], "y": box["y"],
+                                                         "button": "left", "clickCount": 1})
+
+    async def type(self, selector, text):
+        focused = await self.evaluate(f"""(() => {{
+            const el = document.querySelector({json.dumps(selector)});
+            if (!el) return false;
+            el.focus();
+            el.select && el.select();
+            return true;
+        }})()""")
+        if not focused:
+            raise CDPError(f"Nothing to type into at {selector}")
+        await self.send("Input.insertText", {"text": text})
+
+    async def press_enter(self):
+        for kind in ("keyDown", "keyUp"):
+            await self.send("Input.dispatchKeyEvent", {"type": kind, "key": "Enter", "code": "Enter",
+                                                       "windowsVirtualKeyCode": 13, "text": "\r"})
+
+    async def close(self):
+        try:
+            await self.connection.send("Target.closeTarget", {"targetId": self.target_id}, timeout=5)
+        except Exception as e:
+            self.logger.debug(f"Closing page failed: {e}")
+
+
+# ---------------- Store Recipes ----------------
+# Same selectors as the Selenium scrapers; extraction runs as one script per page instead of one
+# round trip per card field
+BIGBASKET_CARDS_JS = """(() => {
+    const out = [];
+    for (const card of document.querySelectorAll("li[class*='PaginateItems']")) {
+        const unavailable = [...card.querySelectorAll('span')].some(sp =>
+            sp.textContent.trim() === 'Currently unavailable' && sp.outerHTML.includes('Tags___StyledLabel2'));
+        if (unavailable) continue;
+        const text = sel => (card.querySelector(sel)?.textContent || '').trim();
+        out.push({
+            brand: text("span[class*='BrandName___StyledLabel2']"),
+            item_name: text('h3.block.m-0.line-clamp-2'),
+            packing: text('span.PackChanger___StyledLabel-sc-newjpv-1') ||
+                     text('span.PackSelector___StyledLabel-sc-1lmu4hv-0 span.Label-sc-15v1nk5-0.gJxZPQ'),
+            price: text('div.Pricing___StyledDiv-sc-pldi2d-0 span:first-child'),
+        });
+    }
+    return out;
+})()"""
+
+# Blinkit and Swiggy put brand and name in one title; the first word is the brand
+TITLED_CARDS_JS = """(() => {
+    const out = [];
+    for (const card of document.querySelectorAll(%(card)s)) {
+        const title = (card.querySelector(%(title)s)?.textContent || '').trim().split(/\\s+/).filter(Boolean);
+        const packing = (card.querySelector(%(packing)s)?.textContent || '').trim();
+        let price = '';
+        for (const el of card.querySelectorAll(%(price)s)) {
+            const match = el.textContent.match(/₹\\s*[\\d,.]+/);
+            if (match) { price = match[0]; break; }
+        }
+        out.push({
+            brand: title[0] || 'N/A',
+            item_name: title.length > 1 ? title.slice(1).join(' ') : 'N/A',
+            packing: packing || 'N/A',
+            price: price || 'N/A',
+        });
+    }
+    return out;
+})()"""
+
+STORE_RECIPES = {
+    "Bigbasket": {
+        "cards": "li[class*='PaginateItems']",
+        "extract": BIGBASKET_CARDS_JS,
+        # Bigbasket scores brand + name only, and drops cards under 30 before the final filter
+        "score_packing": False,
+        "min_relevance": 30,
+        "hydration": True,
+    },
+    "Blinkit": {
+        "cards": "div[role='button'][tabindex='0']",
+        "location_button": "button.btn.location-box.mask-button",
+        "extract": TITLED_CARDS_JS % {
+            "card": json.dumps("div[role='button'][tabindex='0']"),
+            "title": json.dumps("div.tw-text-300.tw-font-semibold.tw-line-clamp-2"),
+            "packing": json.dumps("div.tw-text-200.tw-font-medium.tw-line-clamp-1"),
+            "price": json.dumps("div.tw-text-200.tw-font-semibold"),
+        },
+        "score_packing": True,
+        "min_relevance": 0,
+        "hydration": False,
+    },
+    "Swiggyinsta": {
+        "cards": "div[data-testid='default_container_ux4']",
+        "extract": TITLED_CARDS_JS % {
+            "card": json.dumps("div[data-testid='default_container_ux4']"),
+            "title": json.dumps("div.sc-aXZVg.kyEzVU._1sPB0"),
+            "packing": json.dumps("div._3eIPt, div._1HYm8, div.entQHA"),
+            "price": json.dumps("div[data-testid='item-offer-price']"),
+        },
+        "score_packing": True,
+        "min_relevance": 0,
+        "hydration": False,
+    },
+}
+
+COUNT_JS = "document.querySelectorAll(%s).length"
+SCROLL_JS = "window.scrollTo(0, document.body.scrollHeight)"
+
+
+async def load_more(page, recipe, query, logger):
+    """
+    Scroll for lazy-loaded cards until nothing new appears or the top results are already relevant.
+    """
+    count_js = COUNT_JS % json.dumps(recipe["cards"])
+    idle = 0
+    while idle < MAX_IDLE_SCROLLS:
+        raw = await page.evaluate(recipe["extract"])
+        scores = sorted((compute_relevance(query, p["brand"], p["item_name"], "", logger=logger) for p in raw),
+                        reverse=True)
+        if len(scores) >= TOP_K and scores[TOP_K - 1] >= 50:
+            return raw
+        known = await page.evaluate(count_js)
+        await page.evaluate(SCROLL_JS)
+        deadline = time.time() + SCROLL_WAIT_SECONDS
+        while time.time() < deadline and await page.evaluate(count_js) <= known:
+            await asyncio.sleep(0.25)
+        idle = idle + 1 if await page.evaluate(count_js) <= known else 0
+    return await page.evaluate(recipe["extract"])
+
+
+async def search_store(browser, store, query, location=None, logger=None):
+    """
+    One store search in a fresh tab. Returns the filtered products, or None when the store could not be searched.
+    """
+    from stores import STORE_SPECS
+
+    logger = logger or logging.getLogger(__name__)
+    spec, recipe = STORE_SPECS[store], STORE_RECIPES[store]
+    page = await browser.new_page(location=location)
+    try:
+        if location:
+            await browser.connection.send("Browser.grantPermissions",
+                                          {"origin": spec["origin"], "permissions": ["geolocation"]})
+        await page.goto(spec["url"])
+        ready = await page.wait_for([spec["search_box"]] + ([recipe["location_button"]]
+                                                            if recipe.get("location_button") else []))
+        if ready and ready == recipe.get("location_button"):
+            await page.click(ready)
+            logger.info(f"{store}: clicked detect-location")
+            ready = await page.wait_for(spec["search_box"])
+        if not ready:
+            logger.error(f"{store}: search box never appeared")
+            return None
+
+        await page.type(spec["search_box"], query)
+        await page.press_enter()
+        await asyncio.sleep(0.5)
+
+        if recipe["hydration"] and HYDRATION_ENABLED:
+            # Bigbasket's embedded state lists every pack variant; no card walking needed
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                payload = json.loads(await page.evaluate(f"(() => {{{READ_STATE_JS}}})()") or "{}")
+                if payload.get("sources") and is_current(payload, query):
+                    hydrated = state_products(payload)
+                    if hydrated:
+                        logger.info(f"{store}: read {len(hydrated)} products from hydration state")
+                        return keep_relevant(query, hydrated, recipe["score_packing"],
+                                             recipe["min_relevance"], logger=logger)
+                    break
+                await asyncio.sleep(0.5)
+
+        if not await page.wait_for(recipe["cards"], timeout=15):
+            # Same as the Selenium scrapers giving up on cards: a failed search, not a store with no results
+            logger.error(f"{store}: no result cards for '{query}'")
+            return None
+        raw = await load_more(page, recipe, query, logger)
+        products = keep_relevant(query, raw, recipe["score_packing"], recipe["min_relevance"], logger=logger)
+        logger.info(f"{store}: {len(raw)} cards, {len(products)} products kept")
+        return products
+    finally:
+        await page.close()
+
+
+async def search_all(queries, stores, headless=True, location=None, max_pages=DEFAULT_MAX_PAGES, logger=None):
+    """
+    Every (query, store) search from one event loop and one browser, at most max_pages tabs at a time.
+    Returns {(query, store): products or None}; stores whose circuit is open are skipped (None).
+    """
+    logger = logger or logging.getLogger(__name__)
+    limit = asyncio.Semaphore(max_pages)
+    breakers = {store: CircuitBreaker(store, logger=logger) for store in stores}
+    results = {}
+
+    async def one(browser, query, store):
+        if not breakers[store].allow():
+            results[(query, store)] = None
+            return
+        async with limit:
+            started = time.perf_counter()
+            try:
+                products = await search_store(browser, store, query, location=location, logger=logger)
+            except Exception as e:
+                # One store's broken socket or bad payload must not abort the other searches
+                logger.error(f"{store} search for '{query}' failed: {e!r}")
+                products = None
+            # Zero results is a working store; only searches that could not run count against the breaker
+            breakers[store].record(products is not None)
+            results[(query, store)] = products
+            logger.info(f"{store} '{query}' took {time.perf_counter() - started:.1f}s")
+
+    try:
+        async with Browser(headless=headless, logger=logger) as browser:
+            await asyncio.gather(*(one(browser, q, s) for q in queries for s in stores))
+    finally:
+        for breaker in breakers.values():
+            breaker.close()
+    return results
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    from catalog import STORES, record_scrape
+    from locations import resolve_location
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Search stores over the Chrome DevTools Protocol (no Selenium)")
+    parser.add_argument("--product", type=str, action="append", required=True, help="Product to search (repeatable)")
+    parser.add_argument("--stores", type=str, default=",".join(STORES), help="Comma-separated stores")
+    parser.add_argument("--location", type=str, default=None, help="Delivery pincode or 'lat,lon'")
+    parser.add_argument("--headless", action="store_true", help="Run Chrome in headless mode")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="Tabs searched at once")
+    args = parser.parse_args()
+
+    location = resolve_location(args.location)
+    stores = [s.strip() for s in args.stores.split(",") if s.strip() in STORE_RECIPES]
+    results = asyncio.run(search_all(args.product, stores, headless=args.headless, location=location,
+                                     max_pages=args.max_pages))
+    for (query, store), products in results.items():
+        if products is not None:
+            record_scrape(store, query, products, logger=logging.getLogger(), location=location)
+    print(json.dumps([{"query": q, "store": s, "products": p} for (q, s), p in results.items()], ensure_ascii=False))
+    sys.exit(0)
@@ -1,27 +1,19 @@
+import os
+import json
 import logging
 import sys
 import argparse
 import signal
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bigbasket import BBScrapper
-from blinkit import BlinkItScrapper
-from swiggy import SwiggyScrapper
+from concurrent.futures import ThreadPoolExecutor
+from catalog import record_scrape
+from drivers import close_driver, reap_orphans
+from stores import StoreSession, STORE_SPECS
+from tabs import SharedBrowser
+from logsetup import setup_logging
 from multiprocessing import Pool
-import os
-import tempfile
 
 # ---------------- Logging Setup ----------------
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
-)
-
-logging.getLogger("selenium.webdriver.remote.remote_connection").setLevel(logging.WARNING)
-logging.getLogger("urllib3").setLevel(logging.WARNING)
+setup_logging(level=os.getenv("PY_LOG_LEVEL", "DEBUG"))
 
 driver = None
 headless_mode = False
@@ -32,7 +24,7 @@ def cleanup(sig=None, frame=None, exit_program=True):
     global driver
     if driver:
         try:
-            driver.quit()
+            close_driver(driver)
             logging.info("Chrome closed successfully.")
         except Exception as e:
             logging.error(f"Error closing Chrome: {e}")
@@ -55,110 +47,82 @@ def parse_arguments():
         type=str,
         help="Product name to search for (required in headless mode)"
     )
+    parser.add_argument(
+        "--stores",
+        type=str,
+        default="Bigbasket,Blinkit,Swiggyinsta",
+        help="Comma-separated stores to scrape (default: all)"
+    )
+    parser.add_argument(
+        "--location",
+        type=str,
+        default=None,
+        help="Delivery pincode or 'lat,lon' to scrape prices for (default: whatever the store detects)"
+    )
+    parser.add_argument(
+        "--single-browser",
+        action="store_true",
+        default=os.getenv("SINGLE_BROWSER", "0") == "1",
+        help="Run every store in its own tab of one Chrome instead of one Chrome per store"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["selenium", "cdp"],
+        default=os.getenv("SCRAPER_BACKEND", "selenium"),
+        help="cdp drives one Chrome over the DevTools protocol from a single event loop (no chromedriver)"
+    )
     return parser.parse_args()
 
-# ---------------- Selenium Setup ----------------
-def create_driver(headless=False):
-    chrome_options = Options()
-    chrome_options.add_argument("--start-maximized")
-
-    if headless:
-        chrome_options.add_argument("--headless=new")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option("useAutomationExtension", False)
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument(
-            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-        )
-        logging.info("Running Chrome in headless mode (stealth patched)")
-
-     # Use unique temp user-data-dir for each process
-    user_data_dir = tempfile.mkdtemp()
-    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
-
-    
-
-    # Use the driver installed in the image
-    driver_path = os.getenv("CHROMEDRIVER_PATH")  # or wherever it is in the image
-    service = Service(driver_path)
-
-    driver_instance = webdriver.Chrome(service=service, options=chrome_options)
-
-    if headless:
-        driver_instance.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-            "source": """
-                Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-                Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
-                Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
-            """
-        })
-
-    return driver_instance
-
-# ---------------- Scraper Runners ----------------
-def run_bigbasket(args):
-    product_name, headless = args
-    driver = create_driver(headless=headless)
-    scrapper = BBScrapper(logging.getLogger(), driver)
-    logging.info(f"BigBasket scraper will start now.")
-    try:
-        if scrapper.open_bigbasket():
-            logging.info(f"BigBasket is opened.")
-            scrapper.search_product(product_name)
-            scrapper.print_search_results()
-            logging.info(f"product is searched on BigBasket.")
-            products = scrapper.extract_products()
-            logging.info(f"{products.length} products found on BigBasket.")
-            return {"source": "BigBasket", "products": products}
+# ---------------- Scraper Runner ----------------
+def run_store(args):
+    """
+    Scrape one store in its own browser (or in a tab of a shared one when driver is given).
+    Goes through StoreSession so the store's circuit breaker, retry budget and profile snapshot apply.
+    """
+    store, product_name, headless, location, driver = args
+    logging.info(f"{store} scraper will start now.")
+    with StoreSession(store, headless=headless, logger=logging.getLogger(), driver=driver,
+                      location=location) as session:
+        try:
+            products = session.search(product_name)
+        except Exception as e:
+            logging.error(f"{store} scraper failed: {e}")
+            return {"source": store, "products": []}
+        if session.last_search_ran:
+            logging.info(f"{len(products)} products found on {store}.")
+            record_scrape(store, product_name, products, logger=logging.getLogger(), location=location)
         else:
-            logging.error("Failed to open BigBasket.")
-            return {"source": "BigBasket", "products": []}
-    except Exception as e:
-        logging.error(f"BigBasket scraper failed: {e}")
-        return {"source": "BigBasket", "products": []}
-    finally:
-        driver.quit()
+            logging.error(f"{store} was not scraped (failed to open or extract, or circuit open).")
+        return {"source": store, "products": products, "resources": session.last_resources}
 
-def run_blinkit(args):
-    product_name, headless = args
-    driver = create_driver(headless=headless)
-    scrapper = BlinkItScrapper(logging.getLogger(), driver)
-    try:
-        if scrapper.open_blinkit():
-            scrapper.search_product(product_name)
-            products = scrapper.extract_products()
-            return {"source": "BlinkIt", "products": products}
-        else:
-            logging.error("Failed to open BlinkIt.")
-            return {"source": "BlinkIt", "products": []}
-    except Exception as e:
-        logging.error(f"BlinkIt scraper failed: {e}")
-        return {"source": "BlinkIt", "products": []}
-    finally:
-        driver.quit()
+def run_cdp(product_name, stores, headless, location):
+    """
+    All stores from one asyncio event loop over CDP; same result shape as run_store.
+    """
+    import asyncio
+    from cdp import search_all
+    from locations import resolve_location
 
-def run_swiggy(args):
-    product_name, headless = args
-    driver = create_driver(headless=headless)
-    scrapper = SwiggyScrapper(logging.getLogger(), driver)
     try:
-        if scrapper.open_swiggy():
-            scrapper.search_product(product_name)
-            products = scrapper.extract_products()
-            return {"source": "Swiggy", "products": products}
-        else:
-            logging.error("Failed to open Swiggy Instamart.")
-            return {"source": "Swiggy", "products": []}
+        found = asyncio.run(search_all([product_name], stores, headless=headless,
+                                       location=resolve_location(location), logger=logging.getLogger()))
     except Exception as e:
-        logging.error(f"Swiggy scraper failed: {e}")
-        return {"source": "Swiggy", "products": []}
-    finally:
-        driver.quit()
+        # Chrome never came up: every store failed, same as each one failing to open
+        logging.error(f"CDP browser failed: {e}")
+        found = {}
+    results = []
+    for store in stores:
+        products = found.get((product_name, store))
+        if products is None:
+            logging.error(f"{store} was not scraped (failed to open or circuit open).")
+        else:
+            logging.info(f"{len(products)} products found on {store}.")
+            record_scrape(store, product_name, products, logger=logging.getLogger(), location=location)
+            # The comparator reads the same results files the Selenium scrapers write
+            with open(f"results_{store.lower()}.json", "w", encoding="utf-8") as f:
+                json.dump(products, f, indent=4, ensure_ascii=False)
+        results.append({"source": store, "products": products or []})
+    return results
 
 # ---------------- Worker Wrapper ----------------
 def worker(task):
@@ -169,6 +133,7 @@ def worker(task):
 if __name__ == "__main__":
     args = parse_arguments()
     headless_mode = args.headless
+    reap_orphans()
 
     if headless_mode and args.product:
         product_name = args.product
@@ -176,14 +141,21 @@ if __name__ == "__main__":
     else:
         product_name = input("Enter product to compare : ")
 
-    tasks = [
-        (run_bigbasket, (product_name, headless_mode)),
-        (run_blinkit, (product_name, headless_mode)),
-        (run_swiggy, (product_name, headless_mode)),
-    ]
-
-    with Pool(processes=3) as pool:
-        results = pool.map(worker, tasks)
+    selected = [s.strip() for s in args.stores.split(",") if s.strip() in STORE_SPECS]
+
+    if args.backend == "cdp":
+        results = run_cdp(product_name, selected, headless_mode, args.location)
+    elif args.single_browser:
+        # One Chrome, one tab per store, driven from threads; profile snapshots are per store so tabs start fresh
+        with SharedBrowser(headless=headless_mode, logger=logging.getLogger()) as browser:
+            tasks = [(run_store, (store, product_name, headless_mode, args.location, browser.tab(store)))
+                     for store in selected]
+            with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as executor:
+                results = list(executor.map(worker, tasks))
+    else:
+        tasks = [(run_store, (store, product_name, headless_mode, args.location, None)) for store in selected]
+        with Pool(processes=max(len(tasks), 1)) as pool:
+            results = pool.map(worker, tasks)
 
     # Safely log results
     for result in results:
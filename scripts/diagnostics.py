@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from collections import deque
+from catalog import BASE_DIR
+
+# DIAGNOSTICS=0 keeps the event buffer but never writes captures
+DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS", "1") != "0"
+DIAGNOSTICS_DIR = os.getenv("DIAGNOSTICS_DIR", os.path.join(BASE_DIR, "diagnostics"))
+# Oldest captures are deleted once the store grows past this
+MAX_BYTES = int(float(os.getenv("DIAGNOSTICS_MAX_MB", 200)) * 1024 * 1024)
+# Recent events kept per session
+RING_SIZE = int(os.getenv("DIAGNOSTICS_EVENTS", 200))
+# A search still running after this long is captured as a timeout (before the server's kill)
+SLOW_SECONDS = float(os.getenv("DIAGNOSTICS_SLOW_SECONDS", 150))
+
+
+class _RingHandler(logging.Handler):
+    """
+    Appends the recording thread's log records to a session's ring; formatting waits for a capture.
+    """
+    def __init__(self, ring, thread_id):
+        super().__init__(level=logging.DEBUG)
+        self.ring = ring
+        self.thread_id = thread_id
+
+    def emit(self, record):
+        if record.thread == self.thread_id:
+            self.ring.append(record)
+
+
+class Diagnostics:
+    """
+    Cheap per-session record of what just happened: log records and events in a bounded ring,
+    turned into a screenshot, DOM snapshot and event log on disk only when a search fails.
+    """
+    def __init__(self, label, logger=None, ring_size=RING_SIZE):
+        self.label = label
+        self.logger = logger or logging.getLogger(__name__)
+        self.ring = deque(maxlen=ring_size)
+
+    def event(self, message, **fields):
+        self.ring.append((time.time(), message, fields))
+
+    def recording(self, driver=None, context=None):
+        return _Recording(self, driver, context or {})
+
+    # ---------------- Capture ----------------
+    def capture(self, reason, driver=None, context=None):
+        """
+        Write screenshot, DOM and buffered events for a failed search. Returns the capture dir or None.
+        """
+        if not DIAGNOSTICS_ENABLED:
+            return None
+        context = context or {}
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        slug = re.sub(r"[^a-z0-9]+", "-", f"{self.label} {context.get('query', '')}".lower()).strip("-")[:60]
+        path = os.path.join(DIAGNOSTICS_DIR, f"{stamp}-{os.getpid()}-{slug}")
+        try:
+            os.makedirs(path, exist_ok=True)
+            meta = dict(context, store=self.label, reason=reason, captured_at=now)
+            if driver is not None:
+                meta.update(self._page(driver, path))
+            with open(os.path.join(path, "events.json"), "w", encoding="utf-8") as f:
+                json.dump({"meta": meta, "events": self._events()}, f, indent=2, ensure_ascii=False, default=str)
+        except OSError as e:
+            self.logger.warning(f"Could not write diagnostics for {self.label}: {e}")
+            return None
+        self.logger.info(f"{self.label} diagnostics ({reason}) saved to {path}")
+        prune()
+        return path
+
+    def _page(self, driver, path):
+        page = {}
+        try:
+            page["url"] = driver.current_url
+        except Exception as e:
+            page["url_error"] = str(e)
+        try:
+            with open(os.path.join(path, "screenshot.png"), "wb") as f:
+                f.write(driver.get_screenshot_as_png())
+        except Exception as e:
+            page["screenshot_error"] = str(e)
+        try:
+            with open(os.path.join(path, "dom.html"), "w", encoding="utf-8") as f:
+                f.write(driver.page_source)
+        except Exception as e:
+            page["dom_error"] = str(e)
+        return page
+
+    def _events(self):
+        events = []
+        for item in list(self.ring):
+            if isinstance(item, logging.LogRecord):
+                try:
+                    message = item.getMessage()
+                except Exception:
+                    message = str(item.msg)
+                events.append({"ts": item.created, "level": item.levelname, "logger": item.name, "msg": message})
+            else:
+                ts, message, fields = item
+                events.append(dict(fields, ts=ts, level="EVENT", msg=message))
+        return events
+
+
+class _Recording:
+    """
+    Context for one search: buffers this thread's log records and captures once if it runs past SLOW_SECONDS.
+    """
+    def __init__(self, diagnostics, driver, context):
+        self.diagnostics = diagnostics
+        self.driver = driver
+        self.context = context
+        self.handler = _RingHandler(diagnostics.ring, threading.get_ident())
+        self.timer = None
+        self.timed_out = False
+
+    def _slow(self):
+        driver = self.driver() if callable(self.driver) else self.driver
+        self.timed_out = True
+        self.diagnostics.capture(f"still running after {SLOW_SECONDS:.0f}s", driver, self.context)
+
+    def __enter__(self):
+        logging.getLogger().addHandler(self.handler)
+        self.diagnostics.event("search started", **self.context)
+        if DIAGNOSTICS_ENABLED and SLOW_SECONDS > 0:
+            self.timer = threading.Timer(SLOW_SECONDS, self._slow)
+            self.timer.daemon = True
+            self.timer.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timer:
+            self.timer.cancel()
+        logging.getLogger().removeHandler(self.handler)
+
+
+# ---------------- Store ----------------
+def _captures(root=None):
+    root = root or DIAGNOSTICS_DIR
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            found.append({"name": name, "path": path, "bytes": size, "mtime": os.path.getmtime(path)})
+    return found
+
+
+def prune(max_bytes=MAX_BYTES, root=None):
+    """
+    Delete the oldest captures until the store fits in max_bytes (the newest is always kept).
+    Returns how many were deleted.
+    """
+    captures = sorted(_captures(root), key=lambda c: c["mtime"])
+    total = sum(c["bytes"] for c in captures)
+    removed = 0
+    while len(captures) > 1 and total > max_bytes:
+        oldest = captures.pop(0)
+        shutil.rmtree(oldest["path"], ignore_errors=True)
+        total -= oldest["bytes"]
+        removed += 1
+    return removed
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Failure captures (screenshot, DOM, recent events) of scrapes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List captures, oldest first")
+    prune_parser = sub.add_parser("prune", help="Delete the oldest captures until the store fits")
+    prune_parser.add_argument("--max-mb", type=float, default=MAX_BYTES / (1024 * 1024))
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        print(json.dumps({"removed": prune(int(args.max_mb * 1024 * 1024))}))
+    else:
+        captures = _captures()
+        print(json.dumps({"captures": captures, "bytes": sum(c["bytes"] for c in captures)}))
+    sys.exit(0)
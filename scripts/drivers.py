@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import psutil
+
+# Every profile dir and registry entry we create is recognisable, so orphans can be reaped safely
+PROFILE_PREFIX = "smartcart-profile-"
+STATE_DIR = os.getenv("BROWSER_STATE_DIR", os.path.join(tempfile.gettempdir(), "smartcart-browsers"))
+
+# Unregistered profile dirs younger than this may belong to a browser that is still starting
+ORPHAN_GRACE_SECONDS = int(os.getenv("BROWSER_ORPHAN_GRACE", 10 * 60))
+
+# Chrome refuses a profile that still has these; caches are not worth snapshotting
+PROFILE_LOCK_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile")
+PROFILE_CACHE_DIRS = ("Cache", "Code Cache", "GPUCache", "GrShaderCache", "ShaderCache", "Service Worker/CacheStorage")
+
+# Leases owned by this process, keyed by id(driver)
+_leases = {}
+
+# Hides the usual automation tells in headless Chrome; registered per tab
+STEALTH_JS = """
+    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
+    Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
+"""
+
+# A browser shared by several stores (tabs.py) keeps its background tabs running at full speed
+SHARED_BROWSER_ARGS = (
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+)
+
+
+# ---------------- Process Trees ----------------
+def _create_time(pid):
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.Error:
+        return None
+
+
+def _is_alive(pid, create_time=None):
+    """
+    True when pid is running and (if given) is the same process that was recorded, not a reused pid.
+    """
+    if not pid:
+        return False
+    current = _create_time(pid)
+    if current is None:
+        return False
+    return create_time is None or abs(current - create_time) < 1
+
+
+def profile_processes(profile_dir):
+    """
+    Chrome processes started with this --user-data-dir, including ones reparented after a crash.
+    """
+    marker = f"--user-data-dir={profile_dir}"
+    found = []
+    for proc in psutil.process_iter(["pid", "cmdline"]):
+        try:
+            if any(arg == marker for arg in proc.info["cmdline"] or []):
+                found.append(proc)
+        except psutil.Error:
+            continue
+    return found
+
+
+def kill_tree(pid, create_time=None, include_parent=True):
+    """
+    Kill a process and all of its descendants. Only touches pid if it is still the recorded process.
+    """
+    if not _is_alive(pid, create_time):
+        return 0
+    try:
+        parent = psutil.Process(pid)
+        procs = parent.children(recursive=True)
+        if include_parent:
+            procs.append(parent)
+    except psutil.Error:
+        return 0
+
+    for proc in procs:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(procs, timeout=5)
+    return len(procs)
+
+
+# ---------------- Profiles ----------------
+def clone_profile(src, dst, prune_caches=False):
+    """
+    Copy a user-data-dir into dst. Uses reflinks (copy-on-write) where the filesystem supports them.
+    """
+    os.makedirs(dst, exist_ok=True)
+    try:
+        subprocess.run(["cp", "-a", "--reflink=auto", os.path.join(src, "."), dst],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.debug(f"cp --reflink failed ({e}); falling back to copytree")
+        shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+    for name in PROFILE_LOCK_FILES:
+        path = os.path.join(dst, name)
+        if os.path.lexists(path):
+            os.remove(path)
+    if prune_caches:
+        for profile in os.listdir(dst):
+            for cache in PROFILE_CACHE_DIRS:
+                shutil.rmtree(os.path.join(dst, profile, cache), ignore_errors=True)
+    return dst
+
+
+# ---------------- Registry ----------------
+def _registry_path(profile_dir):
+    return os.path.join(STATE_DIR, os.path.basename(profile_dir) + ".json")
+
+
+def _write_entry(entry):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _registry_path(entry["profile_dir"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def _read_entries():
+    entries = []
+    if not os.path.isdir(STATE_DIR):
+        return entries
+    for name in os.listdir(STATE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(STATE_DIR, name), "r", encoding="utf-8") as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def teardown(entry):
+    """
+    Kill whatever is left of a browser session and delete its profile dir and registry entry.
+    """
+    killed = 0
+    for pid, create_time in entry.get("pids", []):
+        killed += kill_tree(pid, create_time)
+    for proc in profile_processes(entry["profile_dir"]):
+        killed += kill_tree(proc.pid)
+    shutil.rmtree(entry["profile_dir"], ignore_errors=True)
+    try:
+        os.remove(_registry_path(entry["profile_dir"]))
+    except OSError:
+        pass
+    return killed
+
+
+def reap_orphans(grace=ORPHAN_GRACE_SECONDS):
+    """
+    Tear down sessions whose owning process is gone (crash, SIGKILL) and sweep unregistered profile dirs.
+    Returns the number of sessions reaped.
+    """
+    reaped = 0
+    known = set()
+    for entry in _read_entries():
+        known.add(os.path.basename(entry["profile_dir"]))
+        if _is_alive(entry.get("owner_pid"), entry.get("owner_create_time")):
+            continue
+        killed = teardown(entry)
+        reaped += 1
+        logging.info(f"Reaped orphaned browser session {entry['profile_dir']} ({killed} processes killed)")
+
+    cutoff = time.time() - grace
+    tmp_root = tempfile.gettempdir()
+    for name in os.listdir(tmp_root):
+        path = os.path.join(tmp_root, name)
+        if not name.startswith(PROFILE_PREFIX) or name in known:
+            continue
+        try:
+            if os.path.getmtime(path) > cutoff or profile_processes(path):
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        reaped += 1
+        logging.info(f"Removed unregistered browser profile {path}")
+    return reaped
+
+
+# ---------------- Selenium Setup ----------------
+def create_driver(headless=False, template=None, shared=False):
+    """
+    Launch Chrome on a fresh profile, or on a clone of the snapshot at template (see profiles.py).
+    shared=True prepares it to host one tab per store: no background throttling, and page loads
+    return at DOMContentLoaded so one tab's navigation holds the driver as briefly as possible.
+    """
+    # selenium is only needed once a browser is actually launched, not to reap or kill trees
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--start-maximized")
+    # Cookies must stay readable when a profile is cloned into another browser
+    chrome_options.add_argument("--password-store=basic")
+    if shared:
+        for arg in SHARED_BROWSER_ARGS:
+            chrome_options.add_argument(arg)
+        chrome_options.page_load_strategy = "eager"
+
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option("useAutomationExtension", False)
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument(
+            "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+        )
+        logging.info("Running Chrome in headless mode (stealth patched)")
+
+    entry = lease_profile(template)
+    chrome_options.add_argument(f"--user-data-dir={entry['profile_dir']}")
+
+    # Use the driver installed in the image
+    driver_path = os.getenv("CHROMEDRIVER_PATH")  # or wherever it is in the image
+    service = Service(driver_path)
+
+    try:
+        driver_instance = webdriver.Chrome(service=service, options=chrome_options)
+    except Exception:
+        teardown(entry)
+        raise
+
+    # chromedriver and the browser it spawned; renderers are found later as their descendants
+    track_pids(entry, driver_instance.service.process.pid)
+    _leases[id(driver_instance)] = entry
+
+    if headless:
+        apply_stealth(driver_instance)
+
+    return driver_instance
+
+
+def lease_profile(template=None):
+    """
+    A unique profile dir (optionally a clone of template), registered before launch so a crash
+    mid-start is still reaped. Browsers launched without Selenium (cdp.py) use this directly.
+    """
+    user_data_dir = tempfile.mkdtemp(prefix=PROFILE_PREFIX)
+    if template:
+        try:
+            clone_profile(template, user_data_dir)
+        except Exception:
+            # Not registered yet, so the reaper would never find it
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+    entry = {
+        "profile_dir": user_data_dir,
+        "owner_pid": os.getpid(),
+        "owner_create_time": _create_time(os.getpid()),
+        "started_at": time.time(),
+        "pids": [],
+    }
+    _write_entry(entry)
+    return entry
+
+
+def track_pids(entry, pid):
+    """
+    Record a launched process and its direct children in the lease.
+    """
+    pids = [pid]
+    try:
+        pids += [p.pid for p in psutil.Process(pid).children()]
+    except psutil.Error:
+        pass
+    entry["pids"] = [(p, _create_time(p)) for p in pids]
+    _write_entry(entry)
+
+
+def apply_stealth(driver):
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": STEALTH_JS})
+
+
+def close_driver(driver):
+    """
+    Quit the browser, then kill anything quit() left behind and delete its profile dir.
+    """
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"driver.quit() failed, killing browser tree: {e}")
+    entry = _leases.pop(id(driver), None)
+    if entry:
+        teardown(entry)
+
+
+def snapshot_profile(driver, dest):
+    """
+    Quit the browser so its profile is flushed to disk, copy the profile to dest, then tear it down.
+    """
+    entry = _leases.pop(id(driver), None)
+    if entry is None:
+        raise ValueError("driver was not created by create_driver")
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"driver.quit() failed before snapshot: {e}")
+    try:
+        return clone_profile(entry["profile_dir"], dest, prune_caches=True)
+    except Exception:
+        shutil.rmtree(dest, ignore_errors=True)
+        raise
+    finally:
+        teardown(entry)
+
+
+def close_all():
+    for entry in list(_leases.values()):
+        teardown(entry)
+    _leases.clear()
+
+
+atexit.register(close_all)
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="SmartCart browser lifecycle")
+    parser.add_argument("--reap", action="store_true", help="Tear down browsers whose owner process is gone")
+    parser.add_argument("--grace", type=int, default=ORPHAN_GRACE_SECONDS,
+                        help="Leave unregistered profile dirs younger than this many seconds")
+    args = parser.parse_args()
+
+    if args.reap:
+        reaped = reap_orphans(grace=args.grace)
+        logging.info(f"Reaped {reaped} orphaned browser sessions")
+    else:
+        print(json.dumps(_read_entries(), indent=2))
+    sys.exit(0)
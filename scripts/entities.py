@@ -0,0 +1,169 @@
+import re
+import sys
+import json
+import argparse
+from difflib import SequenceMatcher
+from functools import lru_cache
+from normalizer import clean_text, parse_packing, parse_price
+
+# Names inside a block must be at least this similar to be the same SKU
+MATCH_THRESHOLD = 0.72
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------------- Keys ----------------
+@lru_cache(maxsize=8192)
+def brand_key(brand):
+    """
+    First brand token, lowercased and stripped of punctuation ("Johnson's Baby" -> "johnsons").
+    Blinkit/Swiggy split the title's first word off as the brand, so the first token is what stores agree on.
+    """
+    text = clean_text(brand).lower().replace("'", "").replace("’", "")
+    tokens = _TOKEN_RE.findall(text)
+    return tokens[0] if tokens else ""
+
+
+def pack_key(packing):
+    quantity, unit = parse_packing(clean_text(packing))
+    if quantity is None:
+        return None
+    return f"{quantity:g}{unit}"
+
+
+@lru_cache(maxsize=8192)
+def name_tokens(brand, item_name):
+    """
+    Name tokens without the brand token and pack-size numbers, so stores' title splits compare equal.
+    """
+    text = clean_text(f"{brand} {item_name}").lower().replace("'", "").replace("’", "")
+    bkey = brand_key(brand)
+    return tuple(t for t in _TOKEN_RE.findall(text) if t != bkey and not t.isdigit())
+
+
+def name_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    set_a, set_b = set(a), set(b)
+    overlap = len(set_a & set_b) / min(len(set_a), len(set_b))
+    ratio = SequenceMatcher(None, " ".join(a), " ".join(b)).ratio()
+    return (overlap + ratio) / 2
+
+
+# ---------------- Resolution ----------------
+def build_blocks(products):
+    """
+    Blocking index: (brand key, canonical pack) -> product indices.
+    """
+    blocks = {}
+    for idx, product in enumerate(products):
+        key = (brand_key(product.get("brand", "")), pack_key(product.get("packing", "")))
+        blocks.setdefault(key, []).append(idx)
+    return blocks
+
+
+def resolve_entities(products, threshold=MATCH_THRESHOLD):
+    """
+    Cluster the same SKU across stores. Products are only compared within their block,
+    and a cluster never takes two listings from the same store.
+    Returns a list of clusters (lists of product indices).
+    """
+    parent = list(range(len(products)))
+    stores = [{products[i].get("store", "")} for i in range(len(products))]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (bkey, pkey), members in build_blocks(products).items():
+        if len(members) < 2 or not bkey:
+            continue
+        tokens = [name_tokens(products[i].get("brand", ""), products[i].get("item_name", "")) for i in members]
+        # Best matches first, so a store's closest listing claims the cluster slot
+        pairs = []
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                score = name_similarity(tokens[a], tokens[b])
+                if score >= threshold:
+                    pairs.append((score, members[a], members[b]))
+        pairs.sort(reverse=True)
+
+        for _, i, j in pairs:
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j or stores[root_i] & stores[root_j]:
+                continue
+            parent[root_j] = root_i
+            stores[root_i] |= stores[root_j]
+
+    clusters = {}
+    for i in range(len(products)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+
+def group_products(products, threshold=MATCH_THRESHOLD):
+    """
+    Grouped "same product, N store prices" rows, most widely stocked first.
+    """
+    groups = []
+    for members in resolve_entities(products, threshold=threshold):
+        listings = [products[i] for i in members]
+        prices = []
+        for p in listings:
+            paise = p.get("price_paise")
+            if paise is None:
+                paise = parse_price(p.get("price"))
+            prices.append({
+                "store": p.get("store", ""),
+                "item_name": p.get("item_name", ""),
+                "packing": p.get("packing", ""),
+                "price": p.get("price", ""),
+                "price_paise": paise,
+            })
+        priced = [p for p in prices if p["price_paise"] is not None]
+        priced.sort(key=lambda p: p["price_paise"])
+        lead = max(listings, key=lambda p: float(p.get("original_relevance", p.get("relevance", 0)) or 0))
+
+        groups.append({
+            "brand": lead.get("brand", ""),
+            "item_name": lead.get("item_name", ""),
+            "pack": pack_key(lead.get("packing", "")),
+            "store_count": len({p["store"] for p in prices}),
+            "best_store": priced[0]["store"] if priced else None,
+            "best_price_paise": priced[0]["price_paise"] if priced else None,
+            "spread_paise": (priced[-1]["price_paise"] - priced[0]["price_paise"]) if priced else None,
+            "relevance": float(lead.get("original_relevance", lead.get("relevance", 0)) or 0),
+            "prices": priced + [p for p in prices if p["price_paise"] is None],
+        })
+
+    groups.sort(key=lambda g: (-g["store_count"], -g["relevance"]))
+    return groups
+
+
+def resolve_catalog(catalog, store=None, threshold=MATCH_THRESHOLD):
+    """
+    Group every product in the catalog (optionally one store) into cross-store SKUs.
+    """
+    sql = "SELECT id, store, brand, item_name, packing, price, price_paise FROM products"
+    params = ()
+    if store:
+        sql += " WHERE store = ?"
+        params = (store,)
+    products = [dict(row) for row in catalog.conn.execute(sql, params)]
+    return group_products(products, threshold=threshold)
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from catalog import Catalog
+
+    parser = argparse.ArgumentParser(description="Group the same product across stores")
+    parser.add_argument("--min-stores", type=int, default=2, help="Only print groups seen in this many stores")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    args = parser.parse_args()
+
+    with Catalog() as catalog:
+        groups = resolve_catalog(catalog, threshold=args.threshold)
+    json.dump([g for g in groups if g["store_count"] >= args.min_stores], sys.stdout, indent=2, ensure_ascii=False)
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import logging
+import argparse
+import tempfile
+from multiprocessing import Process, Queue
+from catalog import Catalog, DEFAULT_MAX_AGE, STORES, record_scrape
+from ranking import tag_products, build_comparison
+from locations import resolve_location
+from stores import StoreSession
+from drivers import reap_orphans
+from logsetup import setup_logging
+
+# ---------------- Logging Setup ----------------
+# stdout carries the NDJSON stream; all logs go to stderr
+setup_logging()
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def parse_locations(raw):
+    """
+    "560001,110001" or a JSON array -> resolved locations in order, duplicates dropped.
+    A "lat,lon" entry must be given through the JSON form (its comma would split it).
+    """
+    raw = raw.strip()
+    specs = json.loads(raw) if raw.startswith("[") else raw.split(",")
+    locations = {}
+    for spec in specs:
+        location = resolve_location(spec)
+        if location:
+            locations.setdefault(location["key"], location)
+    return list(locations.values())
+
+
+# ---------------- Store Worker ----------------
+def store_worker(store, query, locations, headless, results):
+    """
+    Search one query at several locations with a single browser, moving it between locations.
+    """
+    # Scrapers print JSON dumps to stdout; keep them out of the NDJSON stream
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    workdir = tempfile.mkdtemp(prefix=f"smartcart-fanout-{store.lower()}-")
+    os.chdir(workdir)
+
+    session = StoreSession(store, headless=headless, logger=logging.getLogger(), location=locations[0])
+    try:
+        for location in locations:
+            session.set_location(location)
+            products = session.search(query)
+            if session.last_search_ran:
+                record_scrape(store, query, products, logger=logging.getLogger(), location=location)
+            results.put((location["key"], store, products))
+    except Exception:
+        logging.exception(f"{store} fan-out worker failed")
+    finally:
+        session.close()
+        # Tells the parent which locations this browser owned, so unfinished ones stop waiting on it
+        results.put((None, store, [location["key"] for location in locations]))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def split(items, parts):
+    """
+    Round-robin items into at most `parts` non-empty chunks.
+    """
+    chunks = [items[i::parts] for i in range(max(parts, 1))]
+    return [chunk for chunk in chunks if chunk]
+
+
+# ---------------- Fan-out ----------------
+def run_fanout(query, locations, stores=STORES, headless=True, sort_by="relevance", max_age=DEFAULT_MAX_AGE,
+               min_relevance=20, refresh=False, browsers_per_store=1):
+    by_key = {location["key"]: location for location in locations}
+    with Catalog() as catalog:
+        stale = {key: (list(stores) if refresh else catalog.stale_stores(query, max_age=max_age, stores=stores,
+                                                                         location=key))
+                 for key in by_key}
+
+    pending = {key: set(s) for key, s in stale.items()}
+    collected = {key: [] for key in by_key}
+    emitted = set()
+
+    def finish(key):
+        fresh_stores = set(stores) - set(stale[key])
+        products = list(collected[key])
+        if fresh_stores:
+            with Catalog() as catalog:
+                products += [p for p in catalog.lookup(query, max_age=max_age, min_relevance=min_relevance,
+                                                       location=key)
+                             if p["store"] in fresh_stores]
+        emit({
+            "type": "location",
+            "location": key,
+            "label": by_key[key]["label"],
+            "data": build_comparison(query, products, sort_by=sort_by,
+                                     source="catalog" if not stale[key] else "scrape", location=key),
+        })
+        emitted.add(key)
+
+    # Locations served entirely from the catalog stream back before any browser starts
+    for key in by_key:
+        if not pending[key]:
+            finish(key)
+
+    results = Queue()
+    workers = []
+    for store in stores:
+        store_locations = [by_key[key] for key in by_key if store in pending[key]]
+        for chunk in split(store_locations, browsers_per_store):
+            worker = Process(target=store_worker, args=(store, query, chunk, headless, results))
+            worker.start()
+            workers.append(worker)
+            logging.info(f"{store}: {len(chunk)} locations in one browser")
+
+    running = len(workers)
+    while running and len(emitted) < len(by_key):
+        try:
+            key, store, products = results.get(timeout=1)
+        except queue.Empty:
+            if not any(w.is_alive() for w in workers) and results.empty():
+                break
+            continue
+
+        if key is None:
+            # One browser finished; locations it never reached complete without that store
+            running -= 1
+            for k in products:
+                pending[k].discard(store)
+        else:
+            collected[key].extend(tag_products(store, products, min_relevance=min_relevance))
+            pending[key].discard(store)
+
+        for k in by_key:
+            if k not in emitted and not pending[k]:
+                finish(k)
+
+    for key in by_key:
+        if key not in emitted:
+            finish(key)
+
+    for worker in workers:
+        worker.join(timeout=10)
+
+    emit({"type": "done", "query": query, "count": len(by_key), "browsers": len(workers)})
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search one product at many delivery locations with shared browsers")
+    parser.add_argument("--product", type=str, required=True, help="Product to search")
+    parser.add_argument("--locations", type=str, required=True,
+                        help="Comma-separated pincodes, or a JSON array of pincodes / 'lat,lon' strings")
+    parser.add_argument("--stores", type=str, default=",".join(STORES), help="Comma-separated stores")
+    parser.add_argument("--headless", action="store_true", help="Run Chrome in headless mode")
+    parser.add_argument("--sort-by", choices=["relevance", "unit_price"], default="relevance")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help="Serve locations from the catalog when rows are younger than this many seconds")
+    parser.add_argument("--min-relevance", type=float, default=20)
+    parser.add_argument("--refresh", action="store_true", help="Ignore the catalog and scrape every location")
+    parser.add_argument("--browsers-per-store", type=int, default=1,
+                        help="Split each store's locations over this many browsers (default: one shared browser)")
+    args = parser.parse_args()
+
+    try:
+        locations = parse_locations(args.locations)
+    except ValueError as e:
+        parser.error(str(e))
+    if not locations:
+        parser.error("--locations needs at least one pincode or 'lat,lon'")
+
+    stores = [s.strip() for s in args.stores.split(",") if s.strip() in STORES]
+    reap_orphans()
+    logging.info(f"Fan-out of '{args.product}' over {len(locations)} locations and {len(stores)} stores")
+
+    run_fanout(args.product, locations, stores=stores, headless=args.headless, sort_by=args.sort_by,
+               max_age=args.max_age, min_relevance=args.min_relevance, refresh=args.refresh,
+               browsers_per_store=args.browsers_per_store)
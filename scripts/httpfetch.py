@@ -0,0 +1,256 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import zlib
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin, quote_plus
+from hydration import is_current, state_products
+from scutils import keep_relevant
+from breakers import CircuitBreaker
+
+# HTTPFETCH=0 always uses the browser
+HTTPFETCH_ENABLED = os.getenv("HTTPFETCH", "1") != "0"
+# HTTP/2 needs httpx with the h2 extra; without them (or with HTTPFETCH_HTTP2=0) a stdlib keep-alive pool is used
+HTTP2_ENABLED = os.getenv("HTTPFETCH_HTTP2", "1") != "0"
+TIMEOUT = float(os.getenv("HTTPFETCH_TIMEOUT", 8))
+MAX_IDLE_PER_HOST = int(os.getenv("HTTPFETCH_POOL_SIZE", 4))
+MAX_REDIRECTS = 3
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/115.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/json;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-IN,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+NEXT_DATA_RE = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+
+# ---------------- Store Fetchers ----------------
+def _store_url(store, var, default_path):
+    """
+    Explicit env URL, else default_path under the store's browser URL (so mock stores are followed too).
+    """
+    from_env = os.getenv(var)
+    if from_env is not None:
+        return from_env
+    if default_path is None:
+        return ""
+    base = {"Bigbasket": os.getenv("BIGBASKET_URL", "https://www.bigbasket.com/")}.get(store)
+    return urljoin(base, default_path) if base else ""
+
+
+# "{query}" is replaced with the URL-encoded query. "html" pages carry their results in __NEXT_DATA__;
+# "json" bodies are searched for product lists the same way. An empty URL disables a store's fast path.
+STORE_FETCHERS = {
+    # The search page is server-rendered with the full result state
+    "Bigbasket": {"url": _store_url("Bigbasket", "BIGBASKET_SEARCH_URL", "ps/?q={query}"), "format": "html",
+                  "score_packing": False, "min_relevance": 30, "price_divisor": 1},
+    # Client-rendered search pages; only a JSON endpoint (set per deployment) can skip the browser
+    "Blinkit": {"url": _store_url("Blinkit", "BLINKIT_SEARCH_JSON_URL", None), "format": "json",
+                "score_packing": True, "min_relevance": 0, "price_divisor": 1},
+    "Swiggyinsta": {"url": _store_url("Swiggyinsta", "SWIGGY_SEARCH_JSON_URL", None), "format": "json",
+                    "score_packing": True, "min_relevance": 0, "price_divisor": 1},
+}
+
+
+# ---------------- Connection Pool ----------------
+class HTTPPool:
+    """
+    Keep-alive connections reused across requests and threads: httpx over HTTP/2 when available,
+    otherwise a per-origin pool of http.client connections.
+    """
+    def __init__(self, timeout=TIMEOUT, max_idle=MAX_IDLE_PER_HOST, http2=HTTP2_ENABLED):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.client = None
+        if http2:
+            try:
+                import httpx
+                import h2  # noqa: F401  (httpx needs it for http2=True)
+                self.client = httpx.Client(http2=True, timeout=timeout, follow_redirects=True,
+                                           limits=httpx.Limits(max_keepalive_connections=max_idle * 4))
+            except ImportError:
+                self.client = None
+
+    def get(self, url, headers=None):
+        """
+        Returns (status, body bytes, final url).
+        """
+        headers = dict(HEADERS, **(headers or {}))
+        if self.client is not None:
+            response = self.client.get(url, headers=headers)
+            return response.status_code, response.content, str(response.url)
+
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request(url, headers)
+            location = response_headers.get("location")
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return status, body, url
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def _request(self, url, headers):
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # A pooled connection may have been closed by the server; retry once on a fresh one
+        for attempt in range(2):
+            conn, reused = self._checkout(origin)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            response_headers = {k.lower(): v for k, v in response.getheaders()}
+            if response_headers.get("connection", "").lower() == "close":
+                conn.close()
+            else:
+                self._checkin(origin, conn)
+            return response.status, response_headers, self._decode(body, response_headers)
+
+    def _checkout(self, origin):
+        with self.lock:
+            pool = self.idle.get(origin)
+            if pool:
+                return pool.pop(), True
+        scheme, host, port = origin
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def _checkin(self, origin, conn):
+        with self.lock:
+            pool = self.idle.setdefault(origin, [])
+            if len(pool) < self.max_idle:
+                pool.append(conn)
+                return
+        conn.close()
+
+    @staticmethod
+    def _decode(body, headers):
+        encoding = headers.get("content-encoding", "").lower()
+        if encoding == "gzip":
+            return gzip.decompress(body)
+        if encoding == "deflate":
+            return zlib.decompress(body)
+        return body
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        with self.lock:
+            for pool in self.idle.values():
+                for conn in pool:
+                    conn.close()
+            self.idle.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """
+    One pool per process, so every search a worker runs reuses the same connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HTTPPool()
+        return _pool
+
+
+# ---------------- Parsing ----------------
+def parse_response(fetcher, body, url, query):
+    """
+    Raw product rows from one response, or None when it does not look like this query's results.
+    """
+    text = body.decode("utf-8", errors="replace")
+    if fetcher["format"] == "html":
+        match = NEXT_DATA_RE.search(text)
+        if not match:
+            return None
+        payload = {"url": url, "sources": {"next": json.loads(match.group(1))}}
+        if not is_current(payload, query):
+            return None
+    else:
+        payload = {"url": url, "sources": {"json": json.loads(text)}}
+    return state_products(payload, price_divisor=fetcher["price_divisor"])
+
+
+def fetch_products(store, query, logger=None, pool=None):
+    """
+    Products for one store search over plain HTTP, filtered like the store's scraper.
+    None means "use the browser": no fast path for this store, a failed request, or nothing usable.
+    Outcomes feed the fast path's own circuit breaker ("<store> http"), shared by every process on the host,
+    so a fast path that keeps failing stops costing a request timeout before each browser search.
+    """
+    logger = logger or logging.getLogger(__name__)
+    fetcher = STORE_FETCHERS.get(store)
+    if not HTTPFETCH_ENABLED or not fetcher or not fetcher["url"]:
+        return None
+
+    breaker = CircuitBreaker(f"{store} http", logger=logger)
+    try:
+        if not breaker.allow():
+            return None
+        url = fetcher["url"].replace("{query}", quote_plus(query))
+        started = time.perf_counter()
+        try:
+            status, body, final_url = (pool or shared_pool()).get(url)
+            raw = parse_response(fetcher, body, final_url, query) if status == 200 else None
+        except Exception as e:
+            logger.warning(f"{store} HTTP fetch failed: {e}")
+            raw = None
+            status = None
+        # A page with no rows for this query is a working fast path; only request and parse errors count
+        breaker.record(raw is not None)
+    finally:
+        breaker.close()
+
+    if not raw:
+        logger.info(f"{store} HTTP fast path gave nothing (status {status}); using the browser")
+        return None
+    products = keep_relevant(query, raw, fetcher["score_packing"], fetcher["min_relevance"], logger=logger)
+    logger.info(f"{store} HTTP fast path: {len(raw)} rows, {len(products)} kept in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms")
+    if not products:
+        # Nothing usable, like a Bigbasket page with no relevant hydrated product: the browser reads the DOM
+        return None
+    return products
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Search stores over plain HTTP (no browser) where possible")
+    parser.add_argument("--product", type=str, required=True, help="Product to search")
+    parser.add_argument("--stores", type=str, default=",".join(STORE_FETCHERS), help="Comma-separated stores")
+    args = parser.parse_args()
+
+    results = {store: fetch_products(store.strip(), args.product) for store in args.stores.split(",")}
+    print(json.dumps(results, ensure_ascii=False))
+    sys.exit(0)
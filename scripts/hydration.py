@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import logging
+from urllib.parse import unquote_plus
+from scutils import canonical_query
+
+# HYDRATION=0 forces the old DOM extraction everywhere
+HYDRATION_ENABLED = os.getenv("HYDRATION", "1") != "0"
+
+# One round trip: every embedded state blob the page carries, serialized in the browser
+READ_STATE_JS = """
+const out = {url: location.href, sources: {}};
+try {
+    const el = document.getElementById('__NEXT_DATA__');
+    if (window.__NEXT_DATA__) out.sources.next = window.__NEXT_DATA__;
+    else if (el) out.sources.next = JSON.parse(el.textContent);
+} catch (e) {}
+for (const name of ['__PRELOADED_STATE__', '__INITIAL_STATE__', '__APOLLO_STATE__', '__NUXT__']) {
+    try { if (window[name]) out.sources[name] = window[name]; } catch (e) {}
+}
+try { return JSON.stringify(out); } catch (e) { return JSON.stringify({url: location.href, sources: {}}); }
+"""
+
+# Field names used by the stores' state payloads, most specific first
+NAME_KEYS = ("desc", "product_name", "productName", "display_name", "name", "title")
+BRAND_KEYS = ("brand", "brand_name", "brandName")
+PACK_KEYS = ("w", "pack_desc", "formattedPacksize", "packsize", "packSize", "pack_size", "weight", "unit", "quantity")
+# Selling price before MRP, wherever it is nested (pricing.discount.prim_price.sp, ...)
+PRICE_KEYS = ("sp", "selling_price", "sellingPrice", "discountedSellingPrice", "offer_price", "offerPrice",
+              "price", "mrp")
+VARIANT_KEYS = ("children", "variants", "product_variants", "availableVariants", "packs")
+OUT_OF_STOCK_KEYS = ("outOfStock", "out_of_stock", "is_out_of_stock", "isOutOfStock", "soldOut")
+
+
+# ---------------- Reading ----------------
+def read_state(driver):
+    """
+    Embedded hydration state of the current page ({"url", "sources"}), or None when there is none.
+    """
+    try:
+        payload = json.loads(driver.execute_script(READ_STATE_JS) or "{}")
+    except Exception as e:
+        logging.debug(f"Could not read hydration state: {e}")
+        return None
+    return payload if payload.get("sources") else None
+
+
+def is_current(payload, query):
+    """
+    True when the state belongs to this search. Client-side navigation updates the URL but leaves the
+    first page's __NEXT_DATA__ in place, so Next state is judged by its own query and the URL is only
+    trusted for other sources.
+    """
+    wanted = canonical_query(query)
+    if not wanted:
+        return False
+    next_data = payload["sources"].get("next")
+    if next_data is not None:
+        next_query = next_data.get("query") if isinstance(next_data, dict) else None
+        candidates = [str(v) for v in next_query.values()] if isinstance(next_query, dict) else []
+    else:
+        candidates = [unquote_plus(payload.get("url", ""))]
+    return any(wanted in canonical_query(c) for c in candidates)
+
+
+# ---------------- Parsing ----------------
+def _find(node, keys, depth):
+    """
+    First scalar value under any of keys (in key order), searching nested dicts up to depth levels.
+    """
+    for key in keys:
+        level = [node]
+        for _ in range(depth + 1):
+            nested = []
+            for d in level:
+                value = d.get(key)
+                if isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value).strip():
+                    return value
+                nested.extend(v for v in d.values() if isinstance(v, dict))
+            level = nested
+            if not level:
+                break
+    return None
+
+
+def _brand(node):
+    for d in [node] + [v for v in node.values() if isinstance(v, dict)]:
+        for key in BRAND_KEYS:
+            value = d.get(key)
+            if isinstance(value, dict):
+                value = value.get("name")
+            if isinstance(value, str) and value.strip():
+                return value.strip()
+    return ""
+
+
+def _price(node, price_divisor):
+    value = _find(node, PRICE_KEYS, depth=4)
+    try:
+        amount = float(str(value).replace("₹", "").replace(",", "").strip()) / price_divisor
+    except (TypeError, ValueError):
+        return None
+    return f"₹{amount:g}" if amount > 0 else None
+
+
+def _looks_like_product(node):
+    return isinstance(node, dict) and _find(node, NAME_KEYS, depth=1) is not None and \
+        _find(node, PRICE_KEYS, depth=4) is not None
+
+
+def _to_records(node, price_divisor, inherited=None):
+    """
+    One record per pack variant of a product node.
+    """
+    inherited = inherited or {}
+    if any(node.get(key) is True for key in OUT_OF_STOCK_KEYS):
+        return []
+    name = _find(node, NAME_KEYS, depth=1) or inherited.get("item_name", "")
+    brand = _brand(node) or inherited.get("brand", "")
+    record = {
+        "brand": brand,
+        "item_name": str(name).strip(),
+        "packing": str(_find(node, PACK_KEYS, depth=2) or "").strip(),
+        "price": _price(node, price_divisor),
+    }
+    records = [record] if record["price"] else []
+    for key in VARIANT_KEYS:
+        variants = node.get(key)
+        if isinstance(variants, list):
+            for variant in variants:
+                if isinstance(variant, dict):
+                    records.extend(_to_records(variant, price_divisor, inherited=record))
+    return records
+
+
+def state_products(payload, price_divisor=1):
+    """
+    Every product (and pack variant) found in the state: [{"brand", "item_name", "packing", "price"}].
+    A product list is any list whose entries mostly carry a name and a price.
+    """
+    records, seen = [], set()
+    stack = list(payload.get("sources", {}).values())
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            dicts = [item for item in node if isinstance(item, dict)]
+            hits = [item for item in dicts if _looks_like_product(item)]
+            if dicts and len(hits) * 2 >= len(dicts):
+                for item in hits:
+                    for record in _to_records(item, price_divisor):
+                        key = (record["brand"], record["item_name"], record["packing"])
+                        if key not in seen:
+                            seen.add(key)
+                            records.append(record)
+            else:
+                stack.extend(reversed(node))
+    return records
+
+
+def hydrated_products(driver, query, price_divisor=1, logger=None, timeout=5):
+    """
+    Products from the page's embedded state, or None when it is missing, stale or empty (use the DOM then).
+    Stale state is re-read for up to timeout seconds while the results page is still loading.
+    """
+    logger = logger or logging.getLogger(__name__)
+    if not HYDRATION_ENABLED:
+        return None
+    deadline = time.time() + timeout
+    while True:
+        payload = read_state(driver)
+        if payload is None:
+            logger.debug("No hydration state on page; using DOM extraction")
+            return None
+        if is_current(payload, query):
+            break
+        if time.time() >= deadline:
+            logger.debug("Hydration state is from another page; using DOM extraction")
+            return None
+        time.sleep(0.5)
+    products = state_products(payload, price_divisor=price_divisor)
+    if not products:
+        logger.debug("Hydration state has no products; using DOM extraction")
+        return None
+    logger.info(f"Read {len(products)} products (with pack variants) from hydration state")
+    return products
@@ -0,0 +1,114 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-start budgets (ms of module imports) for the processes spawned on every search
+DEFAULT_BUDGETS = {
+    "main-pro.py": int(os.getenv("IMPORT_BUDGET_MAIN_MS", 150)),
+    "price-comparator.py": int(os.getenv("IMPORT_BUDGET_COMPARATOR_MS", 150)),
+}
+# Modules that must not load just to start an entry point (first use imports them)
+DEFAULT_FORBIDDEN = ("selenium", "polyfuzz", "pandas", "sklearn", "numpy", "webdriver_manager")
+
+# "import time:       123 |       4567 |   package.module"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# ---------------- Measurement ----------------
+def interpreter_modules():
+    """
+    Modules a bare interpreter imports on its own (site, encodings, ...); not charged to any script.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return {m.group(4) for m in map(IMPORTTIME_RE.match, proc.stderr.splitlines()) if m}
+
+
+def measure(script, runs=3, baseline=None):
+    """
+    Run `script --help` with -X importtime in a scratch cwd and keep the fastest run.
+    Returns {"script", "import_ms", "wall_ms", "modules": {top-level name: cumulative ms}}.
+    """
+    best = None
+    baseline = interpreter_modules() if baseline is None else baseline
+    path = os.path.join(SCRIPT_DIR, script)
+    workdir = tempfile.mkdtemp(prefix="smartcart-importtime-")
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", path, "--help"], cwd=workdir, env=env,
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        modules = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if not match:
+                continue
+            _, cumulative, indent, name = match.groups()
+            # Only imports done directly by the script (top level of the import tree)
+            if len(indent) == 1 and name not in baseline:
+                top = name.split(".")[0]
+                modules[top] = modules.get(top, 0) + int(cumulative) / 1000
+
+        result = {
+            "script": script,
+            "import_ms": round(sum(modules.values()), 1),
+            "wall_ms": round(wall_ms, 1),
+            "modules": {k: round(v, 1) for k, v in sorted(modules.items(), key=lambda kv: -kv[1])},
+            "loaded": sorted({m.group(4).split(".")[0] for m in map(IMPORTTIME_RE.match, proc.stderr.splitlines()) if m}),
+        }
+        if best is None or result["import_ms"] < best["import_ms"]:
+            best = result
+    shutil.rmtree(workdir, ignore_errors=True)
+    return best
+
+
+def check(result, budget_ms, forbidden=DEFAULT_FORBIDDEN):
+    problems = []
+    if result["import_ms"] > budget_ms:
+        problems.append(f"imports took {result['import_ms']} ms (budget {budget_ms} ms)")
+    eager = [name for name in forbidden if name in result["loaded"]]
+    if eager:
+        problems.append(f"heavy modules imported at startup: {', '.join(eager)}")
+    return problems
+
+
+def print_report(result, top=8):
+    print(f"{result['script']}: imports {result['import_ms']} ms, wall {result['wall_ms']} ms")
+    for name, ms in list(result["modules"].items())[:top]:
+        print(f"    {ms:>8.1f} ms  {name}")
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import time of the Python entry points")
+    parser.add_argument("scripts", nargs="*", help="Entry points to measure (default: the budgeted ones)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per script; the fastest is reported")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when a script is over budget")
+    parser.add_argument("--json", action="store_true", help="Print raw measurements as JSON")
+    args = parser.parse_args()
+
+    scripts = args.scripts or list(DEFAULT_BUDGETS)
+    baseline = interpreter_modules()
+    failures = 0
+    for script in scripts:
+        result = measure(script, runs=args.runs, baseline=baseline)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_report(result)
+        if args.check and script in DEFAULT_BUDGETS:
+            for problem in check(result, DEFAULT_BUDGETS[script]):
+                print(f"FAIL {script}: {problem}")
+                failures += 1
+
+    sys.exit(1 if failures else 0)
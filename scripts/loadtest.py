@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+import psutil
+from drivers import PROFILE_PREFIX
+from mockstores import start_mock_server, store_env
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+
+DEFAULT_QUERIES = "amul milk,britannia bread,eggoz eggs,basmati rice,atta,sunflower oil,maggi noodles,butter"
+
+
+# ---------------- Process Sampling ----------------
+def smartcart_processes():
+    """
+    The server, every Python script of this repo and the Chrome processes started by drivers.py.
+    """
+    procs = []
+    for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+        try:
+            cmdline = proc.info["cmdline"] or []
+            joined = " ".join(cmdline)
+            if PROFILE_PREFIX in joined or SCRIPT_DIR in joined or os.path.join(REPO_DIR, "server.js") in joined:
+                procs.append(proc)
+        except psutil.Error:
+            continue
+    return procs
+
+
+def is_browser(proc):
+    """
+    Chrome's main process (renderers, GPU and utility processes carry --type=).
+    """
+    cmdline = proc.info["cmdline"] or []
+    return (any(arg.startswith("--user-data-dir=") and PROFILE_PREFIX in arg for arg in cmdline)
+            and not any(arg.startswith("--type=") for arg in cmdline))
+
+
+def sample(in_flight):
+    browsers, rss = 0, 0
+    for proc in smartcart_processes():
+        try:
+            rss += proc.memory_info().rss
+            browsers += is_browser(proc)
+        except psutil.Error:
+            continue
+    return {"browsers": browsers, "rss_mb": round(rss / 2 ** 20, 1), "in_flight": in_flight}
+
+
+class Sampler(threading.Thread):
+    """
+    Record browser count, total RSS and requests in flight every interval seconds.
+    """
+    def __init__(self, interval, in_flight):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.in_flight = in_flight
+        self.started = time.time()
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            point = sample(self.in_flight())
+            point["t"] = round(time.time() - self.started, 1)
+            self.samples.append(point)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=self.interval + 5)
+
+
+# ---------------- Load ----------------
+def post_search(base_url, query, refresh, timeout):
+    payload = json.dumps({"query": query, "refresh": refresh}).encode("utf-8")
+    request = urllib.request.Request(f"{base_url}/api/search", data=payload,
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read() or b"{}")
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status, body = e.code, {}
+    except (urllib.error.URLError, TimeoutError, ValueError) as e:
+        status, body = 0, {"error": str(e)}
+    latency_ms = (time.perf_counter() - started) * 1000
+    matches = (body.get("data") or {}).get("total_matches", 0) if isinstance(body.get("data"), dict) else 0
+    return {"query": query, "status": status, "ok": status == 200 and bool(body.get("success")),
+            "latency_ms": round(latency_ms, 1), "matches": matches}
+
+
+def run_load(base_url, queries, concurrency, total=None, duration=None, refresh=True, timeout=300,
+             sample_interval=2.0):
+    """
+    Keep `concurrency` searches in flight until `total` requests were sent or `duration` seconds passed.
+    """
+    results, lock = [], threading.Lock()
+    counter = {"sent": 0, "in_flight": 0}
+    deadline = time.time() + duration if duration else None
+
+    def next_query():
+        with lock:
+            if (total is not None and counter["sent"] >= total) or (deadline and time.time() >= deadline):
+                return None
+            query = queries[counter["sent"] % len(queries)]
+            counter["sent"] += 1
+            counter["in_flight"] += 1
+            return query
+
+    def client():
+        while True:
+            query = next_query()
+            if query is None:
+                return
+            result = post_search(base_url, query, refresh, timeout)
+            with lock:
+                counter["in_flight"] -= 1
+                results.append(result)
+            logging.info(f"{query}: {result['status']} in {result['latency_ms']:.0f} ms, {result['matches']} matches")
+
+    sampler = Sampler(sample_interval, lambda: counter["in_flight"])
+    sampler.start()
+    started = time.time()
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.time() - started
+    sampler.stop()
+    return summarize(results, elapsed, concurrency, sampler.samples)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(results, elapsed, concurrency, samples):
+    latencies = sorted(r["latency_ms"] for r in results if r["ok"])
+    ok = len(latencies)
+    return {
+        "requests": len(results),
+        "ok": ok,
+        "errors": len(results) - ok,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 1),
+        "throughput_per_minute": round(ok / elapsed * 60, 2) if elapsed else 0,
+        "latency_ms": {f"p{p}": percentile(latencies, p) for p in (50, 90, 95, 99)} | {
+            "max": latencies[-1] if latencies else None},
+        "peak_browsers": max((s["browsers"] for s in samples), default=0),
+        "peak_rss_mb": max((s["rss_mb"] for s in samples), default=0),
+        "timeline": samples,
+    }
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    print(f"{report['ok']}/{report['requests']} ok at concurrency {report['concurrency']} "
+          f"in {report['elapsed_seconds']}s -> {report['throughput_per_minute']} searches/min")
+    print("latency ms: " + ", ".join(f"{k}={v}" for k, v in lat.items()))
+    print(f"peak browsers {report['peak_browsers']}, peak RSS {report['peak_rss_mb']} MB")
+    print(f"{'t (s)':>7} {'in flight':>10} {'browsers':>9} {'RSS MB':>9}")
+    for point in report["timeline"]:
+        print(f"{point['t']:>7} {point['in_flight']:>10} {point['browsers']:>9} {point['rss_mb']:>9}")
+
+
+# ---------------- Server ----------------
+def start_server(port, mock_url, state_dir, extra_env=None, fast_path=False):
+    """
+    Run server.js against the mock stores, with every store of state it writes (catalog, breakers, queue,
+    profile snapshots, selector health, price history, watchlist, diagnostics) in a scratch directory
+    so a load test never touches real data.
+    """
+    env = dict(os.environ, PORT=str(port), **store_env(mock_url, fast_path=fast_path))
+    env.update({
+        "CATALOG_PATH": os.path.join(state_dir, "catalog.db"),
+        "BREAKER_PATH": os.path.join(state_dir, "breakers.db"),
+        "QUEUE_PATH": os.path.join(state_dir, "queue.db"),
+        "PROFILE_SNAPSHOT_DIR": os.path.join(state_dir, "profiles"),
+        "SELECTOR_HEALTH_PATH": os.path.join(state_dir, "selector-health.db"),
+        "PRICE_HISTORY_DIR": os.path.join(state_dir, "price-history"),
+        "WATCHLIST_PATH": os.path.join(state_dir, "watchlist.db"),
+        "DIAGNOSTICS_DIR": os.path.join(state_dir, "diagnostics"),
+        "PREFETCH_INTERVAL_MINUTES": "0",
+        "CATALOG_COMPACT_HOURS": "0",
+        "WATCHLIST_CHECK_MINUTES": "0",
+    })
+    env.update(extra_env or {})
+    proc = subprocess.Popen(["node", os.path.join(REPO_DIR, "server.js")], cwd=REPO_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(60):
+        try:
+            urllib.request.urlopen(f"{base_url}/", timeout=1)
+            return proc, base_url
+        except urllib.error.HTTPError:
+            return proc, base_url
+        except (urllib.error.URLError, OSError):
+            if proc.poll() is not None:
+                raise RuntimeError(f"server.js exited with code {proc.returncode}")
+            time.sleep(0.5)
+    os.killpg(proc.pid, signal.SIGTERM)
+    raise RuntimeError("server.js did not start listening within 30s")
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Load-test /api/search end to end against local mock stores")
+    parser.add_argument("--url", type=str, help="Use an already running server (it must point at the mock stores)")
+    parser.add_argument("--port", type=int, default=8090, help="Port for the server started by this harness")
+    parser.add_argument("--concurrency", type=int, default=4, help="Searches kept in flight")
+    parser.add_argument("--requests", type=int, default=None, help="Total searches (default: 2 per client)")
+    parser.add_argument("--duration", type=int, default=None, help="Stop sending after this many seconds")
+    parser.add_argument("--queries", type=str, default=DEFAULT_QUERIES, help="Comma-separated queries, round-robin")
+    parser.add_argument("--use-catalog", action="store_true", help="Let fresh catalog rows skip scraping")
+    parser.add_argument("--mock-latency-ms", type=int, default=0, help="Mean simulated store page latency")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="Fraction of store page loads that 503")
+    parser.add_argument("--mock-port", type=int, default=0, help="Mock store port (default: any free port)")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="Seconds between resource samples")
+    parser.add_argument("--timeout", type=int, default=330, help="Per-request timeout in seconds")
+    parser.add_argument("--queue", action="store_true", help="Start the server with SCRAPE_QUEUE=1")
+    parser.add_argument("--http-fast-path", action="store_true",
+                        help="Let stores answer over plain HTTP (no browser starts for those searches)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    queries = [q.strip() for q in args.queries.split(",") if q.strip()]
+    total = args.requests if args.requests or args.duration else args.concurrency * 2
+
+    mock, mock_url = start_mock_server(port=args.mock_port, latency_ms=args.mock_latency_ms,
+                                       error_rate=args.mock_error_rate)
+    server, state_dir = None, None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            logging.info(f"Using running server {base_url}; start it with: "
+                         + " ".join(f"{k}={v}" for k, v in store_env(mock_url, args.http_fast_path).items()))
+        else:
+            state_dir = tempfile.mkdtemp(prefix="smartcart-loadtest-")
+            server, base_url = start_server(args.port, mock_url, state_dir,
+                                            {"SCRAPE_QUEUE": "1"} if args.queue else None,
+                                            fast_path=args.http_fast_path)
+            logging.info(f"Started server.js at {base_url} (state in {state_dir})")
+
+        report = run_load(base_url, queries, args.concurrency, total=total, duration=args.duration,
+                          refresh=not args.use_catalog, timeout=args.timeout, sample_interval=args.sample_interval)
+        report["mock_page_loads"] = dict(mock.stats)
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report)
+    finally:
+        mock.shutdown()
+        if server:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=30)
+        if state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+    sys.exit(0 if report["errors"] == 0 else 1)
@@ -0,0 +1,132 @@
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+
+# ---------------- Known Pincodes ----------------
+# Delivery point coordinates for common pincodes; extend with LOCATIONS_FILE ({"560102": [12.91, 77.64, "HSR Layout"]})
+PINCODES = {
+    "110001": (28.6315, 77.2167, "New Delhi"),
+    "122001": (28.4595, 77.0266, "Gurugram"),
+    "201301": (28.5355, 77.3910, "Noida"),
+    "400001": (18.9388, 72.8354, "Mumbai"),
+    "411001": (18.5204, 73.8567, "Pune"),
+    "560001": (12.9716, 77.5946, "Bengaluru"),
+    "600001": (13.0878, 80.2785, "Chennai"),
+    "500001": (17.3850, 78.4867, "Hyderabad"),
+    "700001": (22.5726, 88.3639, "Kolkata"),
+    "380001": (23.0225, 72.5714, "Ahmedabad"),
+}
+
+PINCODE_RE = re.compile(r"^\d{6}$")
+LATLON_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+# Key used in catalog/queue rows when no location was requested (whatever the browser detects)
+DEFAULT_KEY = ""
+
+_extra_loaded = False
+
+
+def _load_extra():
+    global _extra_loaded
+    if _extra_loaded:
+        return
+    _extra_loaded = True
+    path = os.getenv("LOCATIONS_FILE")
+    if not path:
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for pincode, value in json.load(f).items():
+                lat, lon = float(value[0]), float(value[1])
+                PINCODES[str(pincode)] = (lat, lon, value[2] if len(value) > 2 else str(pincode))
+    except (OSError, ValueError, TypeError, IndexError) as e:
+        logging.error(f"Could not load LOCATIONS_FILE {path}: {e}")
+
+
+def resolve_location(spec):
+    """
+    Turn a pincode ("560001") or "lat,lon" into {"key", "lat", "lon", "label"}; None/"" means the default location.
+    Raises ValueError for unknown pincodes or malformed input.
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, dict):
+        return spec
+    spec = str(spec).strip()
+    if not spec:
+        return None
+
+    _load_extra()
+    if PINCODE_RE.match(spec):
+        if spec not in PINCODES:
+            raise ValueError(f"Unknown pincode {spec}; add it to LOCATIONS_FILE or pass 'lat,lon'")
+        lat, lon, label = PINCODES[spec]
+        return {"key": spec, "lat": lat, "lon": lon, "label": label}
+
+    match = LATLON_RE.match(spec)
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Coordinates out of range: {spec}")
+        key = f"{lat:.4f},{lon:.4f}"
+        return {"key": key, "lat": lat, "lon": lon, "label": key}
+
+    raise ValueError(f"Location must be a 6-digit pincode or 'lat,lon', got {spec!r}")
+
+
+def known_pincodes():
+    """
+    Every pincode resolve_location accepts (built-in table plus LOCATIONS_FILE), with its label.
+    """
+    _load_extra()
+    return {pincode: label for pincode, (_, _, label) in sorted(PINCODES.items())}
+
+
+def location_key(location):
+    """
+    Catalog/queue key for a location spec or resolved location.
+    """
+    resolved = resolve_location(location)
+    return resolved["key"] if resolved else DEFAULT_KEY
+
+
+# ---------------- Browser ----------------
+def apply_location(driver, location, origins=()):
+    """
+    Make the browser report this location to the stores' "detect my location" flows (CDP geolocation override).
+    """
+    if not location:
+        return False
+    driver.execute_cdp_cmd("Emulation.setGeolocationOverride", {
+        "latitude": location["lat"],
+        "longitude": location["lon"],
+        "accuracy": 50,
+    })
+    for origin in origins:
+        try:
+            driver.execute_cdp_cmd("Browser.grantPermissions", {"origin": origin, "permissions": ["geolocation"]})
+        except Exception as e:
+            logging.debug(f"Could not grant geolocation to {origin}: {e}")
+    logging.info(f"Browser location set to {location['label']} ({location['lat']}, {location['lon']})")
+    return True
+
+
+def clear_store_state(driver, origin):
+    """
+    Forget a store's saved address (cookies, localStorage, IndexedDB) so it detects the new location.
+    """
+    driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delivery locations known to the scrapers")
+    parser.add_argument("--list", action="store_true", help="Print the known pincodes as JSON")
+    args = parser.parse_args()
+
+    if args.list:
+        print(json.dumps(known_pincodes()))
+    sys.exit(0)
@@ -0,0 +1,176 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing.util
+from logging.handlers import QueueHandler, QueueListener
+
+# Noisy third-party loggers, overridable with LOG_LEVELS="name=LEVEL,..."
+DEFAULT_LOGGER_LEVELS = {
+    "selenium.webdriver.remote.remote_connection": "WARNING",
+    "selenium.webdriver.common.selenium_manager": "WARNING",
+    "urllib3": "WARNING",
+}
+
+# Hot-loop records tagged extra={"sampled": True} keep the first and then one in N per call site
+DEFAULT_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", 20))
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+
+
+# ---------------- Formatting ----------------
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, request id and any extra fields.
+    """
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key not in payload and key not in ("sampled",):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    def __init__(self, request_id=None):
+        super().__init__()
+        self.request_id = request_id or os.getenv("REQUEST_ID", "-")
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = self.request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drop most records marked extra={"sampled": True}; unmarked records always pass.
+    """
+    def __init__(self, every=DEFAULT_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(int(every), 1)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False):
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+        if count % self.every:
+            return False
+        if count:
+            record.sampled_count = count
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    Enqueue records with the message rendered but extra fields and traceback kept separate.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ---------------- Setup ----------------
+def parse_logger_levels(spec):
+    levels = dict(DEFAULT_LOGGER_LEVELS)
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener(handlers):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return log_queue
+
+
+def _restart_in_child():
+    # A forked child (multiprocessing Pool/Process) inherits the QueueHandler but not the listener thread
+    if _listener is None or _queue_handler is None:
+        return
+    _queue_handler.queue = _start_listener(_listener.handlers)
+    multiprocessing.util.Finalize(None, stop_logging, exitpriority=0)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+
+def setup_logging(level=None, stream=None, log_file=None, fmt=None, logger_levels=None, sample_every=None):
+    """
+    Route all logging through a queue so handlers do their I/O on a background thread.
+    level defaults to PY_LOG_LEVEL (INFO); fmt is "json" (default, LOG_FORMAT) or "text".
+    """
+    global _queue_handler
+    level = (level or os.getenv("PY_LOG_LEVEL", "INFO"))
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    if fmt == "text":
+        formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(request_id)s %(name)s: %(message)s")
+    else:
+        formatter = JsonFormatter()
+
+    handlers = [logging.StreamHandler(stream or sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _queue_handler = StructuredQueueHandler(_start_listener(handlers))
+    _queue_handler.addFilter(RequestIdFilter())
+    _queue_handler.addFilter(SamplingFilter(sample_every or DEFAULT_SAMPLE_EVERY))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    for name, logger_level in parse_logger_levels(logger_levels or os.getenv("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    return root
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_in_child)
@@ -9,6 +9,11 @@ from datetime import datetime
 import json
 import argparse
 import logging
+from catalog import Catalog, DEFAULT_MAX_AGE, STORES
+from workqueue import WorkQueue
+from locations import resolve_location
+from logsetup import setup_logging
+from drivers import kill_tree, reap_orphans
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -17,14 +22,8 @@ os.makedirs(LOG_DIR, exist_ok=True)
 date_str = datetime.now().strftime("%Y%m%d")
 log_file_path = os.path.join(LOG_DIR, f"backend-py-{date_str}.log")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(log_file_path),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Structured JSON lines on stdout (read by server.js) and in the daily file, written off-thread
+setup_logging(stream=sys.stdout, log_file=log_file_path)
 
 def find_scripts():
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -40,48 +39,65 @@ def find_scripts():
 
     return scrapers, comparators
 
-def kill_chrome_processes():
-    for proc in psutil.process_iter(['name']):
-        try:
-            if proc.info['name'] and 'chrome' in proc.info['name'].lower():
-                proc.kill()
-        except Exception:
-            pass
-
 def get_log_file():
     return log_file_path
 
-def run_scripts(scripts, user_input, headless_flag):
+def run_scripts(scripts, user_input, headless_flag, extra_args=None):
     log_file = get_log_file()
     for script in scripts:
         logging.info(f"Running {script} (logs -> {log_file}) ...")
         try:
-            with open(log_file, "a") as lf:
-                lf.write(f"\n\n===== Running {script} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-                cmd = [sys.executable, script]
-                if headless_flag:
-                    cmd.append("--headless")
-
-                proc = subprocess.Popen(
-                    cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=sys.stdout,
-                    stderr=subprocess.STDOUT
-                )
-                try:
-                    proc.communicate(input=user_input.encode())
-                except KeyboardInterrupt:
-                    logging.warning(f"Ctrl+C pressed. Terminating {script}...")
-                    proc.kill()
-                    kill_chrome_processes()
-                    logging.info(f"{script} terminated. Moving to next script...")
-
-                
-
+            cmd = [sys.executable, script]
+            if headless_flag:
+                cmd.append("--headless")
+            cmd.extend(extra_args or [])
+
+            # Scraper logs are already structured; pass them straight through to Node
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=sys.stdout,
+                stderr=subprocess.STDOUT
+            )
+            try:
+                proc.communicate(input=user_input.encode())
+            except KeyboardInterrupt:
+                logging.warning(f"Ctrl+C pressed. Terminating {script}...")
+                # Only this search's scraper, its pool workers and their browsers; other searches keep running
+                kill_tree(proc.pid)
+                reap_orphans()
+                logging.info(f"{script} terminated. Moving to next script...")
 
         except subprocess.CalledProcessError as e:
             logging.error(f"Error running {script}: {e}")
 
+def scrape_via_queue(user_input, stores, timeout, location=None):
+    """
+    Enqueue one job per stale store, wait for the workers, and record their results in the local catalog.
+    Returns the stores that came back.
+    """
+    with WorkQueue() as wq:
+        job_ids = [wq.enqueue(store, user_input, location=location) for store in stores]
+        logging.info(f"Queued jobs {job_ids} for {stores}. Waiting up to {timeout}s for workers...")
+        jobs = wq.wait(job_ids, timeout=timeout)
+
+    scraped = []
+    with Catalog() as catalog:
+        for job in jobs.values():
+            if job["status"] == "done":
+                catalog.record_scrape(job["store"], user_input, job["result"]["products"], location=location)
+                scraped.append(job["store"])
+            else:
+                logging.warning(f"Job {job['id']} for {job['store']} ended as {job['status']}: {job['error']}")
+    return scraped
+
+def handle_termination(sig=None, frame=None):
+    # Node sends SIGTERM on shutdown; take our scrapers and their browsers down with us
+    logging.warning("Termination signal received. Stopping this search's browsers...")
+    kill_tree(os.getpid(), include_parent=False)
+    reap_orphans()
+    sys.exit(1)
+
 def is_running_from_node():
     try:
         parent = psutil.Process(os.getppid())
@@ -95,9 +111,28 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--product", type=str, help="Product to search and compare")
     parser.add_argument("--headless", action="store_true", help="Run in headless mode")
+    parser.add_argument("--sort-by", choices=["relevance", "unit_price"], default="relevance",
+                        help="Rank comparison by relevance or by unit price")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help="Serve from the catalog when rows are younger than this many seconds")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the catalog and scrape every store")
+    parser.add_argument("--queue", action="store_true",
+                        help="Hand scrapes to queue-worker.py processes instead of launching browsers here")
+    parser.add_argument("--queue-timeout", type=int, default=int(os.getenv("QUEUE_WAIT_TIMEOUT", 240)),
+                        help="Seconds to wait for queued scrapes")
+    parser.add_argument("--location", type=str, default=None,
+                        help="Delivery pincode or 'lat,lon' (default: whatever each store detects)")
     args = parser.parse_args()
+    try:
+        resolve_location(args.location)
+    except ValueError as e:
+        parser.error(str(e))
+
+    signal.signal(signal.SIGTERM, handle_termination)
+    reap_orphans()
 
     user_input = args.product if args.product else input("Enter product to search and compare: ")
+    location_args = ["--location", args.location] if args.location else []
 
     if is_running_from_node():
         headless_flag = True
@@ -112,47 +147,45 @@ if __name__ == "__main__":
 
     logging.info("user_input for scrapper is "+ user_input)
 
-    run_scripts(scrapers, user_input, headless_flag)
+    with Catalog() as catalog:
+        stale_stores = STORES if args.refresh else catalog.stale_stores(
+            user_input, max_age=args.max_age, location=args.location)
+
+    if stale_stores and args.queue:
+        logging.info(f"Catalog stale for {stale_stores}. Queueing scrapes...")
+        scrape_via_queue(user_input, stale_stores, args.queue_timeout, location=args.location)
+    elif stale_stores:
+        logging.info(f"Catalog stale for {stale_stores}. Scraping...")
+        run_scripts(scrapers, user_input, headless_flag, ["--stores", ",".join(stale_stores)] + location_args)
+    else:
+        logging.info(f"Catalog has fresh results for '{user_input}'. Skipping scrapers.")
+
+    # Compare from the catalog unless every store was scraped just now; queued results only live there
+    from_catalog = args.queue or len(stale_stores) < len(STORES)
 
     comparator_script = comparators[0]
     log_file = get_log_file()
     logging.info(f"Running comparator {comparator_script} (logs -> {log_file}) ...")
 
     try:
-        cmd = [sys.executable, comparator_script]
-        
-
-       
-
-
         result = subprocess.run(
             [
                 sys.executable, 
                 comparator_script,
                 "--product", user_input,
+                "--sort-by", args.sort_by,
+                "--max-age", str(args.max_age),
                 "--headless"
-            ],
-            capture_output=True,
+            ] + (["--from-catalog"] if from_catalog else []) + location_args,
+            stdout=subprocess.PIPE,
+            stderr=sys.stdout,
             text=True,
             check=True,
         )
 
-
-        # Print entire stdout and stderr
-        print("[comparator STDOUT]")
-        print(result.stdout)
-
-        print("[comparator STDERR]")
-        print(result.stderr)
-
-        with open(log_file, "a") as lf:
-            lf.write(f"\n\n===== Running comparator {comparator_script} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-            lf.write(result.stdout)
-            if result.stderr:
-                lf.write("\n[STDERR]\n" + result.stderr)
-
+        # The result itself goes to output.json; only its size is worth a log line
         output = result.stdout.strip()
-        logging.info(f"Comparator output was: {output}")
+        logging.debug(f"Comparator returned {len(output)} bytes")
 
         json_match = re.search(r'(\{.*\}|\[.*\])', output, re.DOTALL)
 
@@ -161,14 +194,12 @@ if __name__ == "__main__":
             data = {}
         else:
             json_str = json_match.group(1)
-            logging.info(f"json json_str for node is: {json_str}")
             try:
                 data = json.loads(json_str)
-                logging.info(f"json output for node is: {data}")
+                logging.info(f"Comparator returned {data.get('total_matches', 0)} matches")
             except json.JSONDecodeError as e:
                 logging.error(f"Failed to decode JSON: {e}\nRaw JSON string:\n{json_str}")
                 data = {}
-                logging.info(data)
 
     except subprocess.CalledProcessError as e:
         logging.exception(f"Error running comparator: {e}")
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import html
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from scutils import canonical_query
+
+# Product fixtures served by every mock store (prices differ per store)
+FIXTURES_PATH = os.getenv("MOCK_FIXTURES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures",
+                                                        "products.json"))
+
+# Path of each mock store and the env var stores.py reads its URL from
+STORE_PATHS = {
+    "Bigbasket": ("/bigbasket/", "BIGBASKET_URL"),
+    "Blinkit": ("/blinkit/s/", "BLINKIT_URL"),
+    "Swiggyinsta": ("/swiggy/instamart/search", "SWIGGY_URL"),
+}
+
+# Search endpoints httpfetch.py reads without a browser, and the env var it reads each URL from
+SEARCH_API_PATHS = {
+    "Bigbasket": ("/bigbasket/ps/", "BIGBASKET_SEARCH_URL"),
+    "Blinkit": ("/blinkit/api/search", "BLINKIT_SEARCH_JSON_URL"),
+    "Swiggyinsta": ("/swiggy/api/search", "SWIGGY_SEARCH_JSON_URL"),
+}
+
+
+# ---------------- Page Templates ----------------
+# Same DOM structure and class names the scrapers' selectors expect from the live sites
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body></html>"""
+
+BIGBASKET_SEARCH = """<form method="get"><input name="q" placeholder="Search for Products..." value="{query}"></form>"""
+BIGBASKET_HEADER = """<div><span class="CategoryInfo___StyledLabel2-sc-mock">{count}</span>
+<h2 class="CategoryInfo___StyledH2-sc-mock">Results for "{query}"</h2></div>"""
+BIGBASKET_CARD = """<li class="PaginateItems___StyledLi-sc-mock">
+  <span class="BrandName___StyledLabel2-sc-mock">{brand}</span>
+  <h3 class="block m-0 line-clamp-2">{item_name}</h3>
+  <span class="PackChanger___StyledLabel-sc-newjpv-1">{packing}</span>
+  <div class="Pricing___StyledDiv-sc-pldi2d-0"><span>&#8377;{price}</span></div>
+</li>"""
+
+BLINKIT_LOCATION = """<button class="btn location-box mask-button"
+  onclick="document.cookie='mock_location=1; path=/'; location.reload();">Detect my location</button>"""
+BLINKIT_SEARCH = """<form method="get"><input class="SearchBarContainer__Input-sc-hl8pft-3" name="q" value="{query}"></form>"""
+BLINKIT_CARD = """<div role="button" tabindex="0">
+  <div class="tw-text-300 tw-font-semibold tw-line-clamp-2">{brand} {item_name}</div>
+  <div class="tw-text-200 tw-font-medium tw-line-clamp-1">{packing}</div>
+  <div class="tw-text-200 tw-font-semibold">&#8377;{price}</div>
+</div>"""
+
+SWIGGY_SEARCH = """<form method="get"><input type="search" data-testid="search-page-header-search-bar-input"
+  name="q" value="{query}"></form>"""
+SWIGGY_CARD = """<div data-testid="default_container_ux4">
+  <div class="sc-aXZVg kyEzVU _1sPB0">{brand} {item_name}</div>
+  <div class="_3eIPt">{packing}</div>
+  <div data-testid="item-offer-price">&#8377;{price}</div>
+</div>"""
+
+
+def load_fixtures(path=FIXTURES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def matching_products(products, store, query):
+    """
+    Fixture products whose brand or name shares a word with the query, with this store's price.
+    """
+    words = [w for w in canonical_query(query).split() if len(w) > 2]
+    found = []
+    for product in products:
+        text = f"{product['brand']} {product['item_name']}".lower()
+        if store in product["prices"] and any(w in text for w in words):
+            found.append(dict(product, price=product["prices"][store]))
+    return found
+
+
+def next_data(query, products):
+    """
+    Bigbasket-style __NEXT_DATA__: one entry per product with its other packs as children.
+    """
+    entries = {}
+    for p in products:
+        variant = {"desc": p["item_name"], "brand": {"name": p["brand"]}, "w": p["packing"],
+                   "pricing": {"discount": {"mrp": str(p["price"] + 5), "prim_price": {"sp": str(p["price"])}}}}
+        parent = entries.setdefault((p["brand"], p["item_name"]), dict(variant, children=[]))
+        if parent["w"] != variant["w"]:
+            parent["children"].append(variant)
+    state = {"page": "/ps", "query": {"q": query},
+             "props": {"pageProps": {"SSRData": {"tabs": [{"product_info": {"products": list(entries.values())}}]}}}}
+    # "</" would end the script tag early
+    return json.dumps(state, ensure_ascii=False).replace("</", "<\\/")
+
+
+def search_json(query, products):
+    """
+    JSON search response in the shape app search APIs use: a flat product list with selling prices.
+    """
+    return json.dumps({"query": query, "products": [
+        {"name": p["item_name"], "brand": p["brand"], "unit": p["packing"], "mrp": p["price"] + 5,
+         "offer_price": p["price"]} for p in products]}, ensure_ascii=False)
+
+
+def render(store, query, products, has_location=True):
+    def cards(template):
+        return "\n".join(template.format(**{k: html.escape(str(v)) for k, v in p.items() if k != "prices"})
+                         for p in products)
+
+    q = html.escape(query)
+    if store == "Bigbasket":
+        body = BIGBASKET_SEARCH.format(query=q)
+        if query:
+            body += BIGBASKET_HEADER.format(count=len(products), query=q) + f"\n<ul>\n{cards(BIGBASKET_CARD)}\n</ul>"
+            body += f'\n<script id="__NEXT_DATA__" type="application/json">{next_data(query, products)}</script>'
+    elif store == "Blinkit":
+        if not has_location:
+            body = BLINKIT_LOCATION
+        else:
+            body = BLINKIT_SEARCH.format(query=q) + (f"\n<div>\n{cards(BLINKIT_CARD)}\n</div>" if query else "")
+    else:
+        body = SWIGGY_SEARCH.format(query=q) + (f"\n<div>\n{cards(SWIGGY_CARD)}\n</div>" if query else "")
+    return PAGE.format(title=f"Mock {store}", body=body)
+
+
+# ---------------- Server ----------------
+class MockStoreHandler(BaseHTTPRequestHandler):
+    """
+    Serves the three mock stores; behaviour (latency, error rate) comes from the server object.
+    """
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        store = next((s for s, (path, _) in STORE_PATHS.items() if parts.path.rstrip("/") == path.rstrip("/")), None)
+        api = next((s for s, (path, _) in SEARCH_API_PATHS.items() if parts.path.rstrip("/") == path.rstrip("/")), None)
+        store = store or api
+        if store is None:
+            self.send_error(404)
+            return
+
+        server = self.server
+        with server.stats_lock:
+            server.stats[store] = server.stats.get(store, 0) + 1
+        if server.latency_ms:
+            time.sleep(random.uniform(server.latency_ms * 0.5, server.latency_ms * 1.5) / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_error(503, "Mock store overloaded")
+            return
+
+        query = parse_qs(parts.query).get("q", [""])[0]
+        products = matching_products(server.products, store, query) if query else []
+        has_location = "mock_location=1" in (self.headers.get("Cookie") or "")
+        if api and store != "Bigbasket":
+            body, content_type = search_json(query, products).encode("utf-8"), "application/json"
+        else:
+            body, content_type = render(store, query, products, has_location=has_location).encode("utf-8"), "text/html"
+
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.debug(f"mockstores {self.address_string()} {fmt % args}")
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency_ms=0, error_rate=0.0, fixtures=FIXTURES_PATH):
+    """
+    Start the mock stores on a background thread. Returns (server, base_url); stop with server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), MockStoreHandler)
+    server.daemon_threads = True
+    server.products = load_fixtures(fixtures)
+    server.latency_ms = latency_ms
+    server.error_rate = error_rate
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    logging.info(f"Mock stores serving {len(server.products)} fixture products at {base_url}")
+    return server, base_url
+
+
+def store_env(base_url, fast_path=False):
+    """
+    Env vars that point stores.py at the mock stores. The HTTP fast path is off unless fast_path is set
+    (then httpfetch.py's search endpoints point at the mocks too), so every search drives a browser.
+    """
+    env = {var: base_url + path for path, var in STORE_PATHS.values()}
+    if fast_path:
+        env.update({var: base_url + path + "?q={query}" for path, var in SEARCH_API_PATHS.values()})
+    env["HTTPFETCH"] = "1" if fast_path else "0"
+    return env
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Local mock store sites for scraper load tests")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0, help="Mean simulated page latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of page loads answered with 503")
+    parser.add_argument("--fixtures", type=str, default=FIXTURES_PATH, help="Product fixture JSON")
+    parser.add_argument("--fast-path", action="store_true", help="Also export the HTTP fast-path search URLs")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args.host, args.port, args.latency_ms, args.error_rate, args.fixtures)
+    for var, url in store_env(base_url, fast_path=args.fast_path).items():
+        print(f"export {var}='{url}'")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,171 @@
+import re
+import html
+import math
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# ---------------- Units ----------------
+# Every unit maps to a canonical base unit and a multiplier into it.
+UNIT_ALIASES = {
+    "mg": ("g", Decimal("0.001")),
+    "g": ("g", Decimal(1)),
+    "gm": ("g", Decimal(1)),
+    "gms": ("g", Decimal(1)),
+    "gram": ("g", Decimal(1)),
+    "grams": ("g", Decimal(1)),
+    "kg": ("g", Decimal(1000)),
+    "kgs": ("g", Decimal(1000)),
+    "ml": ("ml", Decimal(1)),
+    "l": ("ml", Decimal(1000)),
+    "ltr": ("ml", Decimal(1000)),
+    "litre": ("ml", Decimal(1000)),
+    "liter": ("ml", Decimal(1000)),
+    "pc": ("pc", Decimal(1)),
+    "pcs": ("pc", Decimal(1)),
+    "piece": ("pc", Decimal(1)),
+    "pieces": ("pc", Decimal(1)),
+    "unit": ("pc", Decimal(1)),
+    "units": ("pc", Decimal(1)),
+}
+
+# Unit prices are quoted per 100 g / 100 ml and per single piece
+UNIT_BASIS = {"g": 100, "ml": 100, "pc": 1}
+
+_UNIT_PATTERN = "|".join(sorted(UNIT_ALIASES, key=len, reverse=True))
+_NUMBER = r"\d+(?:\.\d+)?"
+_TAG_RE = re.compile(r"<[^>]+>")
+_MULTI_RE = re.compile(rf"(\d+)\s*[x×*]\s*({_NUMBER})\s*({_UNIT_PATTERN})\b")
+_MULTI_SUFFIX_RE = re.compile(rf"({_NUMBER})\s*({_UNIT_PATTERN})\s*[x×*]\s*(\d+)\b")
+_SINGLE_RE = re.compile(rf"({_NUMBER})\s*({_UNIT_PATTERN})\b")
+_PACK_OF_RE = re.compile(r"pack\s+of\s+(\d+)")
+_PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def clean_text(text):
+    """
+    Strip markup and entities left over from innerHTML reads (Zepto/BigBasket variants).
+    """
+    if text is None:
+        return ""
+    text = html.unescape(_TAG_RE.sub(" ", str(text)))
+    return " ".join(text.split())
+
+
+# ---------------- Parsers ----------------
+@lru_cache(maxsize=8192)
+def parse_packing(packing):
+    """
+    Parse a packing string into (quantity, unit) in canonical units (g, ml, pc).
+    Returns (None, None) when no quantity can be recognised.
+    """
+    text = clean_text(packing).lower()
+    if not text:
+        return None, None
+
+    count = 1
+    match = _MULTI_RE.search(text)
+    if match:
+        count, amount, unit = int(match.group(1)), match.group(2), match.group(3)
+    else:
+        match = _MULTI_SUFFIX_RE.search(text)
+        if match:
+            amount, unit, count = match.group(1), match.group(2), int(match.group(3))
+        else:
+            match = _SINGLE_RE.search(text)
+            if match:
+                amount, unit = match.group(1), match.group(2)
+            else:
+                pack_of = _PACK_OF_RE.search(text)
+                if pack_of:
+                    return float(pack_of.group(1)), "pc"
+                return None, None
+
+    base_unit, multiplier = UNIT_ALIASES[unit]
+    try:
+        quantity = Decimal(amount) * multiplier * count
+    except InvalidOperation:
+        return None, None
+    if quantity <= 0:
+        return None, None
+    return float(quantity), base_unit
+
+
+@lru_cache(maxsize=8192)
+def parse_price(price):
+    """
+    Parse a price ("₹138.75", "134", "Rs. 1,299", or a number such as 0) into integer paise.
+    Returns None for missing or unparseable prices such as "N/A".
+    """
+    text = clean_text(price)
+    match = _PRICE_RE.search(text)
+    if not match:
+        return None
+    try:
+        paise = Decimal(match.group().replace(",", "")) * 100
+    except InvalidOperation:
+        return None
+    return int(paise.to_integral_value())
+
+
+# ---------------- Batch Normalization ----------------
+def unit_prices(products):
+    """
+    Compute price per basis unit (paise per 100 g / 100 ml / 1 pc) for a batch of products.
+    Returns (unit_price_array, unit_list); entries without a usable price or packing are NaN.
+    """
+    import numpy as np
+
+    parsed = [parse_packing(str(p.get("packing") or "")) for p in products]
+    prices = [parse_price(p.get("price")) for p in products]
+    # A real zero price is kept; only prices that did not parse are NaN
+    paise = np.array([np.nan if v is None else v for v in prices], dtype=float)
+    quantity = np.array([q if q else np.nan for q, _ in parsed], dtype=float)
+    units = [u for _, u in parsed]
+    basis = np.array([UNIT_BASIS.get(u, np.nan) for u in units], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_unit = paise / quantity * basis
+    return per_unit, units
+
+
+def normalize_products(products):
+    """
+    Annotate products in place with price_paise, quantity, unit and unit_price_paise.
+    """
+    if not products:
+        return products
+
+    per_unit, units = unit_prices(products)
+    for product, value, unit in zip(products, per_unit, units):
+        quantity, _ = parse_packing(str(product.get("packing") or ""))
+        product["price_paise"] = parse_price(product.get("price"))
+        product["quantity"] = quantity
+        product["unit"] = unit
+        product["unit_price_paise"] = None if math.isnan(value) else int(round(value))
+    return products
+
+
+def unit_price_order(products, relevance_key="original_relevance"):
+    """
+    Indices ordering products by ascending unit price, ties broken by relevance.
+    Products without a unit price sort last.
+    """
+    if not products:
+        return []
+
+    import numpy as np
+
+    per_unit, _ = unit_prices(products)
+    relevance = np.array([float(p.get(relevance_key, 0) or 0) for p in products], dtype=float)
+    missing = np.isnan(per_unit)
+    # np.lexsort sorts by the last key first
+    order = np.lexsort((-relevance, np.where(missing, 0, per_unit), missing))
+    return order.tolist()
+
+
+def format_unit_price(unit_price_paise, unit):
+    if unit_price_paise is None or unit not in UNIT_BASIS:
+        return ""
+    basis = UNIT_BASIS[unit]
+    label = f"{basis} {unit}" if basis != 1 else unit
+    return f"₹{unit_price_paise / 100:.2f}/{label}"
@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import glob
+import math
+import time
+import signal
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import psutil
+from catalog import Catalog, DEFAULT_MAX_AGE, BASE_DIR, STORES
+from scutils import canonical_query
+from logsetup import setup_logging
+from profiles import refresh_expired
+
+# ---------------- Logging Setup ----------------
+setup_logging()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_LOG_GLOB = os.path.join(BASE_DIR, "logs", "server-*.log")
+SCRAPER_SCRIPT = os.path.join(SCRIPT_DIR, "combined-scrapper.py")
+
+# Matches winston lines: "2025-01-01 10:00:00.000 INFO req_1_1 Search input is : milk"
+SEARCH_LINE_RE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)? \w+ \S+ Search input is : (.+)$"
+)
+
+# Processes that mean a live search needs the browsers
+LIVE_MARKERS = ("main-pro.py", "batch-search.py")
+
+current_child = None
+stop_requested = False
+
+
+# ---------------- Query Mining ----------------
+def read_search_log(log_glob=SERVER_LOG_GLOB, lookback_days=7):
+    """
+    Yield (timestamp, query) for every search logged by server.js within the lookback window.
+    """
+    cutoff = time.time() - lookback_days * 24 * 60 * 60
+    for path in sorted(glob.glob(log_glob)):
+        if os.path.getmtime(path) < cutoff:
+            continue
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if "Search input is" not in line:
+                        continue
+                    match = SEARCH_LINE_RE.match(line.strip())
+                    if not match:
+                        continue
+                    ts = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+                    if ts >= cutoff:
+                        yield ts, match.group(2)
+        except OSError as e:
+            logging.warning(f"Could not read {path}: {e}")
+
+
+def rank_queries(entries, half_life_hours=24, now=None):
+    """
+    Score queries by frequency with exponential recency decay.
+    Returns [(query, score, last_seen)] best first.
+    """
+    now = now or time.time()
+    decay = math.log(2) / (half_life_hours * 60 * 60)
+    scores = {}
+    for ts, raw_query in entries:
+        query = canonical_query(raw_query)
+        if not query:
+            continue
+        score, last_seen = scores.get(query, (0.0, 0.0))
+        scores[query] = (score + math.exp(-decay * max(now - ts, 0)), max(last_seen, ts))
+    ranked = [(q, score, last_seen) for q, (score, last_seen) in scores.items()]
+    ranked.sort(key=lambda x: (-x[1], -x[2]))
+    return ranked
+
+
+# ---------------- Capacity ----------------
+def live_searches():
+    """
+    Count running searches started by server.js (anything other than prefetch's own children).
+    """
+    own = {os.getpid()}
+    if current_child:
+        try:
+            own.update(p.pid for p in psutil.Process(current_child.pid).children(recursive=True))
+            own.add(current_child.pid)
+        except psutil.Error:
+            pass
+
+    count = 0
+    for proc in psutil.process_iter(["pid", "cmdline"]):
+        try:
+            if proc.info["pid"] in own:
+                continue
+            cmdline = " ".join(proc.info["cmdline"] or [])
+            if any(marker in cmdline for marker in LIVE_MARKERS):
+                count += 1
+        except psutil.Error:
+            continue
+    return count
+
+
+def kill_tree(proc):
+    try:
+        parent = psutil.Process(proc.pid)
+        for child in parent.children(recursive=True):
+            child.kill()
+        parent.kill()
+    except psutil.Error:
+        pass
+
+
+def wait_for_idle(max_live, backoff, max_wait):
+    waited = 0
+    while live_searches() > max_live:
+        if waited >= max_wait or stop_requested:
+            return False
+        logging.info(f"Live traffic detected. Backing off for {backoff}s...")
+        time.sleep(backoff)
+        waited += backoff
+    return True
+
+
+# ---------------- Prefetch ----------------
+def prefetch_query(query, stores, timeout, max_live):
+    """
+    Scrape the stale stores for one query in a scratch directory so live results files are untouched.
+    Returns True when the scrape finished, False when it was pre-empted or failed.
+    """
+    global current_child
+    workdir = tempfile.mkdtemp(prefix="smartcart-prefetch-")
+    cmd = [sys.executable, SCRAPER_SCRIPT, "--headless", "--product", query, "--stores", ",".join(stores)]
+
+    logging.info(f"Prefetching '{query}' for {stores}")
+    started = time.time()
+    try:
+        current_child = subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while current_child.poll() is None:
+            if stop_requested or live_searches() > max_live:
+                logging.info(f"Pre-empted by live traffic while prefetching '{query}'")
+                kill_tree(current_child)
+                return False
+            if time.time() - started > timeout:
+                logging.warning(f"Prefetch of '{query}' exceeded {timeout}s. Killing it.")
+                kill_tree(current_child)
+                return False
+            time.sleep(1)
+        return current_child.returncode == 0
+    finally:
+        current_child = None
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_once(args):
+    entries = read_search_log(lookback_days=args.lookback_days)
+    ranked = rank_queries(entries, half_life_hours=args.half_life_hours)[:args.top]
+    if not ranked:
+        logging.info("No searches found in server logs.")
+        return 0
+
+    # Expired profile snapshots are re-warmed here rather than on a live search
+    if wait_for_idle(args.max_live, args.backoff, args.backoff):
+        refresh_expired(STORES)
+
+    # Refresh before rows expire so peak traffic never sees a stale catalog
+    horizon = max(args.max_age - args.refresh_margin, 0)
+    deadline = time.time() + args.max_runtime
+    done = 0
+
+    for query, score, _ in ranked:
+        if done >= args.max_queries or time.time() >= deadline or stop_requested:
+            break
+        with Catalog() as catalog:
+            stale = catalog.stale_stores(query, max_age=horizon)
+        if not stale:
+            continue
+        if not wait_for_idle(args.max_live, args.backoff, max(deadline - time.time(), 0)):
+            logging.info("No idle capacity. Stopping this prefetch run.")
+            break
+        remaining = max(deadline - time.time(), 1)
+        if prefetch_query(query, stale, min(args.query_timeout, remaining), args.max_live):
+            done += 1
+            logging.info(f"Prefetched '{query}' (score={score:.2f})")
+
+    logging.info(f"Prefetch run finished: {done} queries refreshed")
+    return done
+
+
+def handle_stop(sig=None, frame=None):
+    global stop_requested
+    stop_requested = True
+    if current_child:
+        kill_tree(current_child)
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep popular queries warm in the catalog")
+    parser.add_argument("--top", type=int, default=int(os.getenv("PREFETCH_TOP", 20)),
+                        help="Candidate queries considered per run")
+    parser.add_argument("--max-queries", type=int, default=int(os.getenv("PREFETCH_MAX_QUERIES", 5)),
+                        help="Maximum queries scraped per run")
+    parser.add_argument("--max-runtime", type=int, default=int(os.getenv("PREFETCH_MAX_RUNTIME", 15 * 60)),
+                        help="Wall-clock budget per run in seconds")
+    parser.add_argument("--query-timeout", type=int, default=5 * 60, help="Timeout per prefetched query")
+    parser.add_argument("--lookback-days", type=float, default=7, help="How much search history to mine")
+    parser.add_argument("--half-life-hours", type=float, default=24, help="Recency decay of query scores")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE, help="Catalog freshness window in seconds")
+    parser.add_argument("--refresh-margin", type=int, default=int(os.getenv("PREFETCH_REFRESH_MARGIN", 60 * 60)),
+                        help="Refresh rows this many seconds before they expire")
+    parser.add_argument("--max-live", type=int, default=0, help="Live searches tolerated while prefetching")
+    parser.add_argument("--backoff", type=int, default=30, help="Seconds to wait when live traffic is present")
+    parser.add_argument("--loop", action="store_true", help="Keep running every --interval seconds")
+    parser.add_argument("--interval", type=int, default=30 * 60, help="Seconds between runs with --loop")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    run_once(args)
+    while args.loop and not stop_requested:
+        next_run = time.time() + args.interval
+        while time.time() < next_run and not stop_requested:
+            time.sleep(1)
+        if not stop_requested:
+            run_once(args)
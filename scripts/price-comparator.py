@@ -5,6 +5,10 @@ import logging
 import textwrap
 import os
 import argparse
+from catalog import Catalog, DEFAULT_MAX_AGE
+from ranking import build_comparison
+from locations import location_key
+from logsetup import setup_logging
 
 # ---------------- Logger ----------------
 def setup_logger(name="product_comparator", parent_logger=None, log_file=None, log_level=logging.DEBUG):
@@ -12,7 +16,8 @@ def setup_logger(name="product_comparator", parent_logger=None, log_file=None, l
         logger = parent_logger.getChild(name)
     else:
         logger = logging.getLogger(name)
-        if not logger.handlers:
+        # Only fall back to a private handler when nothing has configured the root logger
+        if not logger.handlers and not logging.getLogger().handlers:
             console_handler = logging.StreamHandler(sys.stderr)
             console_handler.setFormatter(logging.Formatter('[%(levelname)s] %(name)s: %(message)s'))
             console_handler.setLevel(log_level)
@@ -113,50 +118,36 @@ def create_formatted_table(user_input, products, filename="comparison.txt"):
 
 # ---------------- Process Comparison ----------------
 def process_product_comparison(user_input, min_relevance=50, save_formatted_table=False,
-                               parent_logger=None, log_file=None, log_level=logging.DEBUG):
+                               parent_logger=None, log_file=None, log_level=logging.DEBUG,
+                               sort_by="relevance", from_catalog=False, max_age=DEFAULT_MAX_AGE, location=None):
     """
-    Process product comparison: load, combine, sort by relevance, return top 5.
+    Process product comparison: load, combine, sort by relevance (or unit price), return top 5
+    plus the full ranking for paging.
     """
     global logger
     logger = setup_logger(parent_logger=parent_logger, log_file=log_file, log_level=log_level)
 
     logger.info(f"Starting product comparison for: '{user_input}'")
-    json_files = glob.glob("results_*.json")
 
-    if not json_files:
-        return {"error": "No JSON files found", "user_input": user_input, "total_matches": 0, "headers": [], "rows": []}
-
-    all_products = load_json_files(json_files, min_relevance=min_relevance)
-
-    if not all_products:
-        return {"message": "No products found above relevance threshold", "user_input": user_input,
-                "total_matches": 0, "headers": [], "rows": []}
-
-    # Sort by original relevance descending
-    all_products.sort(key=lambda x: -x.get("original_relevance", 0))
+    if from_catalog:
+        with Catalog(logger=logger) as catalog:
+            all_products = catalog.lookup(user_input, max_age=max_age, min_relevance=min_relevance,
+                                          location=location)
+    else:
+        json_files = glob.glob("results_*.json")
 
-    # Keep top 5
-    top_products = all_products[:5]
+        if not json_files:
+            return {"error": "No JSON files found", "user_input": user_input, "total_matches": 0, "headers": [], "rows": []}
 
-    table_data = {
-        "user_input": user_input,
-        "total_matches": len(top_products),
-        "headers": ["Store", "Brand", "Packing", "Item Name", "Price", "Original Relevance"],
-        "rows": []
-    }
+        all_products = load_json_files(json_files, min_relevance=min_relevance)
 
-    for prod in top_products:
-        table_data["rows"].append({
-            "store": prod.get("store", ""),
-            "brand": prod.get("brand", ""),
-            "packing": prod.get("packing", ""),
-            "item_name": prod.get("item_name", ""),
-            "price": prod.get("price", ""),
-            "original_relevance": prod.get("original_relevance", 0)
-        })
+    # The full ranking goes along so the server can page and re-sort it without another run
+    table_data = build_comparison(user_input, all_products, sort_by=sort_by,
+                                  source="catalog" if from_catalog else "scrape", location=location_key(location),
+                                  full=True)
 
-    if save_formatted_table:
-        create_formatted_table(user_input, top_products)
+    if save_formatted_table and table_data["rows"]:
+        create_formatted_table(user_input, table_data["rows"])
 
     return table_data
 
@@ -166,6 +157,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Product Comparator Script")
     parser.add_argument("--product", type=str, required=True, help="Product name to search/compare")
     parser.add_argument("--headless", action="store_true", help="Run in headless mode (default: False)")
+    parser.add_argument("--sort-by", choices=["relevance", "unit_price"], default="relevance",
+                        help="Rank by relevance (default) or by price per 100 g / 100 ml / piece")
+    parser.add_argument("--from-catalog", action="store_true",
+                        help="Compare fresh catalog rows instead of results_*.json files")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help="Maximum catalog row age in seconds when using --from-catalog")
+    parser.add_argument("--location", type=str, default=None,
+                        help="Delivery pincode or 'lat,lon' the results were scraped for")
     args = parser.parse_args()
 
     user_input = args.product
@@ -176,6 +175,8 @@ if __name__ == "__main__":
     if os.path.exists(log_file):
         open(log_file, 'w').close()
 
+    # stdout carries the JSON result; logs go to stderr
+    setup_logging()
     logger = setup_logger(log_file=log_file)
     logger.info("=== Product Comparator Script Started ===")
     logger.info(f"Product input: {user_input}")
@@ -185,7 +186,11 @@ if __name__ == "__main__":
         user_input,
         min_relevance=20,
         save_formatted_table=True,
-        log_file=log_file
+        log_file=log_file,
+        sort_by=args.sort_by,
+        from_catalog=args.from_catalog,
+        max_age=args.max_age,
+        location=args.location
     )
 
     logger.info(f"Comparison completed. Found {result.get('total_matches', 0)} matches")
@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import logging
+import argparse
+from array import array
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", os.path.join(BASE_DIR, "price-history"))
+
+# PRICE_HISTORY=0 stops recording (reads keep working)
+HISTORY_ENABLED = os.getenv("PRICE_HISTORY", "1") != "0"
+
+# One file per column, 13 bytes per observation: (name, array typecode, numpy dtype)
+COLUMNS = (
+    ("ts", "I", "<u4"),       # unix seconds
+    ("product", "I", "<u4"),  # catalog product id
+    ("store", "B", "u1"),     # index into stores.json
+    ("price", "i", "<i4"),    # paise
+)
+# Per-product offsets into the compacted segment
+INDEX_COLUMNS = (("products", "<u4"), ("starts", "<u8"))
+
+# Generations kept after a compaction, so readers that opened the previous one can finish
+KEEP_GENERATIONS = 2
+# Daily buckets follow IST by default
+DAY_OFFSET_SECONDS = int(os.getenv("PRICE_HISTORY_UTC_OFFSET_MINUTES", 330)) * 60
+DAY_SECONDS = 24 * 60 * 60
+# Observations older than this are dropped on compaction (the price-history API reads up to 3650 days back)
+RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", 3650))
+
+
+class PriceHistory:
+    """
+    Append-only columnar price log. Each generation directory holds a compacted segment sorted by
+    (product, ts) with per-product offsets, plus an append-only tail log; compaction folds the tail
+    into a new generation and switches CURRENT atomically. Reads memory-map both.
+
+        price-history/CURRENT        "3"
+        price-history/stores.json    ["Bigbasket", ...]
+        price-history/gen-3/log.<column>, seg.<column>, seg.products, seg.starts
+    """
+    def __init__(self, path=None, logger=None):
+        self.path = path or HISTORY_DIR
+        self.logger = logger or logging.getLogger(__name__)
+        os.makedirs(self.path, exist_ok=True)
+
+    # ---------------- Layout ----------------
+    def _lock(self):
+        lock = open(os.path.join(self.path, "lock"), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _generation(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT"), "r") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _gen_dir(self, gen):
+        return os.path.join(self.path, f"gen-{gen}")
+
+    def _stores(self):
+        try:
+            with open(os.path.join(self.path, "stores.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _store_code(self, store):
+        """
+        Code of a store, assigning the next one on first sight. Caller holds the lock.
+        """
+        stores = self._stores()
+        if store not in stores:
+            stores.append(store)
+            tmp = os.path.join(self.path, "stores.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stores, f)
+            os.replace(tmp, os.path.join(self.path, "stores.json"))
+        return stores.index(store)
+
+    @staticmethod
+    def _rows(gen_dir, prefix):
+        """
+        Complete rows in a column set; a crash mid-append can leave columns of different lengths.
+        """
+        counts = []
+        for name, typecode, _ in COLUMNS:
+            try:
+                size = os.path.getsize(os.path.join(gen_dir, f"{prefix}.{name}"))
+            except FileNotFoundError:
+                size = 0
+            counts.append(size // array(typecode).itemsize)
+        return min(counts)
+
+    # ---------------- Writes ----------------
+    def append(self, store, observations, ts=None):
+        """
+        Append (product_id, price_paise) observations of one store scrape. Prices that did not parse are skipped.
+        """
+        observations = [(pid, paise) for pid, paise in observations if pid is not None and paise is not None]
+        if not observations:
+            return 0
+        ts = int(ts or time.time())
+
+        with self._lock():
+            gen_dir = self._gen_dir(self._generation())
+            os.makedirs(gen_dir, exist_ok=True)
+            rows = self._rows(gen_dir, "log")
+            code = self._store_code(store)
+            values = {
+                "ts": [ts] * len(observations),
+                "product": [pid for pid, _ in observations],
+                "store": [code] * len(observations),
+                "price": [paise for _, paise in observations],
+            }
+            for name, typecode, _ in COLUMNS:
+                column = array(typecode, values[name])
+                if sys.byteorder == "big":
+                    column.byteswap()
+                with open(os.path.join(gen_dir, f"log.{name}"), "ab") as f:
+                    # Drop a torn row left by an interrupted append before adding new ones
+                    f.truncate(rows * column.itemsize)
+                    column.tofile(f)
+        return len(observations)
+
+    # ---------------- Reads ----------------
+    def _open(self):
+        """
+        Memory-mapped columns of the current generation: (segment, index, tail log).
+        """
+        import numpy as np
+
+        gen_dir = self._gen_dir(self._generation())
+
+        def load(prefix, name, dtype, rows=None):
+            file = os.path.join(gen_dir, f"{prefix}.{name}")
+            count = rows if rows is not None else (os.path.getsize(file) // np.dtype(dtype).itemsize
+                                                   if os.path.exists(file) else 0)
+            if not count:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(file, dtype=dtype, mode="r", shape=(count,))
+
+        seg_rows, log_rows = self._rows(gen_dir, "seg"), self._rows(gen_dir, "log")
+        segment = {name: load("seg", name, dtype, seg_rows) for name, _, dtype in COLUMNS}
+        index = {name: load("seg", name, dtype) for name, dtype in INDEX_COLUMNS}
+        log = {name: load("log", name, dtype, log_rows) for name, _, dtype in COLUMNS}
+        return segment, index, log
+
+    def series(self, product_ids, start=None, end=None):
+        """
+        Raw observations of these products between start and end (unix seconds), oldest first:
+        {"ts", "product", "store", "price"} numpy arrays.
+        """
+        import numpy as np
+
+        product_ids = sorted({int(pid) for pid in product_ids})
+        segment, index, log = self._open()
+        parts = []
+
+        if product_ids and len(index["products"]):
+            positions = np.searchsorted(index["products"], product_ids)
+            for pid, i in zip(product_ids, positions):
+                if i < len(index["products"]) and index["products"][i] == pid:
+                    lo, hi = int(index["starts"][i]), int(index["starts"][i + 1])
+                    parts.append({name: np.asarray(segment[name][lo:hi]) for name, _, _ in COLUMNS})
+
+        if product_ids and len(log["product"]):
+            mask = np.isin(log["product"], product_ids)
+            parts.append({name: np.asarray(log[name][mask]) for name, _, _ in COLUMNS})
+
+        if not parts:
+            return {name: np.empty(0, dtype=dtype) for name, _, dtype in COLUMNS}
+        merged = {name: np.concatenate([p[name] for p in parts]) for name, _, _ in COLUMNS}
+        keep = np.ones(len(merged["ts"]), dtype=bool)
+        if start is not None:
+            keep &= merged["ts"] >= start
+        if end is not None:
+            keep &= merged["ts"] <= end
+        order = np.argsort(merged["ts"][keep], kind="stable")
+        return {name: values[keep][order] for name, values in merged.items()}
+
+    def daily(self, product_ids, start=None, end=None):
+        """
+        One point per product, store and day: min, max and last price (paise) plus the observation count.
+        """
+        import numpy as np
+
+        raw = self.series(product_ids, start=start, end=end)
+        if not len(raw["ts"]):
+            return []
+        days = (raw["ts"].astype(np.int64) + DAY_OFFSET_SECONDS) // DAY_SECONDS
+        order = np.lexsort((raw["ts"], days, raw["store"], raw["product"]))
+        product, store, day = raw["product"][order], raw["store"][order], days[order]
+        price = raw["price"][order]
+
+        boundary = np.ones(len(order), dtype=bool)
+        boundary[1:] = (product[1:] != product[:-1]) | (store[1:] != store[:-1]) | (day[1:] != day[:-1])
+        starts = np.flatnonzero(boundary)
+        lasts = np.append(starts[1:], len(order)) - 1
+
+        names = self._stores()
+        return [{
+            "product_id": int(product[s]),
+            "store": names[store[s]] if store[s] < len(names) else str(store[s]),
+            "day": time.strftime("%Y-%m-%d", time.gmtime(int(day[s]) * DAY_SECONDS)),
+            "min_paise": int(lo),
+            "max_paise": int(hi),
+            "last_paise": int(price[last]),
+            "count": int(last - s + 1),
+        } for s, last, lo, hi in zip(starts, lasts, np.minimum.reduceat(price, starts),
+                                     np.maximum.reduceat(price, starts))]
+
+    def points(self, product_ids, start=None, end=None):
+        """
+        Raw observations as JSON-friendly dicts.
+        """
+        raw = self.series(product_ids, start=start, end=end)
+        names = self._stores()
+        return [{"product_id": int(p), "store": names[s] if s < len(names) else str(s), "ts": int(t),
+                 "price_paise": int(v)}
+                for t, p, s, v in zip(raw["ts"], raw["product"], raw["store"], raw["price"])]
+
+    def stats(self):
+        gen = self._generation()
+        gen_dir = self._gen_dir(gen)
+        products = os.path.join(gen_dir, "seg.products")
+        return {
+            "generation": gen,
+            "segment_rows": self._rows(gen_dir, "seg"),
+            "log_rows": self._rows(gen_dir, "log"),
+            "segment_products": os.path.getsize(products) // 4 if os.path.exists(products) else 0,
+            "stores": self._stores(),
+        }
+
+    # ---------------- Maintenance ----------------
+    def compact(self, retention_days=None):
+        """
+        Fold the tail log into a new sorted segment (dropping rows older than retention_days, if given)
+        and switch CURRENT to it. Appends wait on the lock meanwhile; readers keep their generation.
+        """
+        import numpy as np
+
+        with self._lock():
+            gen = self._generation()
+            old_dir = self._gen_dir(gen)
+            seg_rows, log_rows = self._rows(old_dir, "seg"), self._rows(old_dir, "log")
+            if not log_rows and retention_days is None:
+                return 0
+
+            merged = {}
+            for name, _, dtype in COLUMNS:
+                parts = []
+                for prefix, rows in (("seg", seg_rows), ("log", log_rows)):
+                    if rows:
+                        parts.append(np.fromfile(os.path.join(old_dir, f"{prefix}.{name}"), dtype=dtype, count=rows))
+                merged[name] = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+            if retention_days is not None:
+                keep = merged["ts"] >= time.time() - retention_days * DAY_SECONDS
+                if not log_rows and keep.all():
+                    return 0
+                merged = {name: values[keep] for name, values in merged.items()}
+            order = np.lexsort((merged["ts"], merged["product"]))
+            merged = {name: values[order] for name, values in merged.items()}
+            products, first = np.unique(merged["product"], return_index=True)
+            index = {"products": products, "starts": np.append(first, len(order))}
+
+            new_dir = self._gen_dir(gen + 1)
+            shutil.rmtree(new_dir, ignore_errors=True)
+            os.makedirs(new_dir)
+            for name, _, dtype in COLUMNS:
+                merged[name].astype(dtype).tofile(os.path.join(new_dir, f"seg.{name}"))
+            for name, dtype in INDEX_COLUMNS:
+                index[name].astype(dtype).tofile(os.path.join(new_dir, f"seg.{name}"))
+
+            tmp = os.path.join(self.path, "CURRENT.tmp")
+            with open(tmp, "w") as f:
+                f.write(str(gen + 1))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+            for old in range(gen + 1 - KEEP_GENERATIONS, -1, -1):
+                if not os.path.isdir(self._gen_dir(old)):
+                    break
+                shutil.rmtree(self._gen_dir(old), ignore_errors=True)
+
+        self.logger.info(f"Price history compacted into generation {gen + 1}: {len(order)} rows, "
+                         f"{len(products)} products ({seg_rows + log_rows - len(order)} dropped)")
+        return len(order)
+
+
+def record_prices(store, observations, scraped_at=None, logger=None):
+    """
+    Best-effort history write of (product_id, price_paise) pairs used by the catalog; never fails a scrape.
+    """
+    if not HISTORY_ENABLED:
+        return 0
+    try:
+        return PriceHistory(logger=logger).append(store, observations, ts=scraped_at)
+    except OSError as e:
+        (logger or logging.getLogger(__name__)).error(f"Price history write failed for {store}: {e}")
+        return 0
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="SmartCart price history")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query_parser = sub.add_parser("query", help="Print the price history of products as JSON")
+    query_parser.add_argument("--product-id", type=int, action="append", default=[],
+                              help="Catalog product id (repeatable)")
+    query_parser.add_argument("--store", type=str, help="With --brand/--item-name/--packing: look the id up")
+    query_parser.add_argument("--brand", type=str, default="")
+    query_parser.add_argument("--item-name", type=str, default="")
+    query_parser.add_argument("--packing", type=str, default="")
+    query_parser.add_argument("--location", type=str, default=None, help="Delivery location key")
+    query_parser.add_argument("--days", type=int, default=30, help="How far back to look")
+    query_parser.add_argument("--resolution", choices=["daily", "raw"], default="daily")
+    compact_parser = sub.add_parser("compact", help="Fold the append log into a new sorted segment")
+    compact_parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    sub.add_parser("stats", help="Print history statistics")
+    args = parser.parse_args()
+
+    history = PriceHistory()
+    if args.command == "query":
+        product_ids = list(args.product_id)
+        if args.store:
+            from catalog import Catalog
+            with Catalog() as catalog:
+                pid = catalog.find_product(args.store, args.brand, args.item_name, args.packing,
+                                           location=args.location)
+            if pid is not None:
+                product_ids.append(pid)
+        start = time.time() - args.days * DAY_SECONDS
+        read = history.daily if args.resolution == "daily" else history.points
+        print(json.dumps({"product_ids": product_ids, "resolution": args.resolution, "days": args.days,
+                          "points": read(product_ids, start=start) if product_ids else []}))
+    else:
+        if args.command == "compact":
+            history.compact(retention_days=args.retention_days)
+        print(json.dumps(history.stats()))
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import shutil
+import fcntl
+import subprocess
+import logging
+import argparse
+from catalog import BASE_DIR
+
+# ---------------- Snapshot Settings ----------------
+SNAPSHOT_DIR = os.getenv("PROFILE_SNAPSHOT_DIR", os.path.join(BASE_DIR, ".browser-profiles"))
+# Snapshots older than this are re-warmed (cookies and location tokens go stale)
+SNAPSHOT_TTL = int(os.getenv("PROFILE_SNAPSHOT_TTL", 12 * 60 * 60))
+SNAPSHOTS_ENABLED = os.getenv("PROFILE_SNAPSHOTS", "1") != "0"
+DEFAULT_LOCATION = "default"
+# Older versions are kept briefly so browsers cloning them mid-refresh still find their files
+KEEP_VERSIONS = 2
+
+
+def _key(store, location):
+    return f"{store.lower()}-{location or DEFAULT_LOCATION}"
+
+
+def _meta_path(store, location):
+    return os.path.join(SNAPSHOT_DIR, _key(store, location), "current.json")
+
+
+def read_meta(store, location=DEFAULT_LOCATION):
+    try:
+        with open(_meta_path(store, location), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.isdir(meta.get("path", "")) else None
+
+
+def is_expired(meta, ttl=SNAPSHOT_TTL):
+    return meta is None or time.time() - meta.get("created_at", 0) > ttl
+
+
+# ---------------- Warming ----------------
+def warm_snapshot(store, location=DEFAULT_LOCATION, headless=True, logger=None):
+    """
+    Open the store once (location prompt, popups, landing page) and publish the flushed profile as a snapshot.
+    Returns the new snapshot metadata, or None when the store could not be opened.
+    """
+    from drivers import create_driver, close_driver, snapshot_profile
+    from stores import StoreSession
+
+    logger = logger or logging.getLogger(__name__)
+    key_dir = os.path.join(SNAPSHOT_DIR, _key(store, location))
+    os.makedirs(key_dir, exist_ok=True)
+
+    started = time.time()
+    driver = create_driver(headless=headless)
+    session = StoreSession(store, headless=headless, logger=logger, driver=driver,
+                           location=None if location == DEFAULT_LOCATION else location)
+    opened = False
+    try:
+        opened = session.open()
+    finally:
+        # The driver is only handed on (to snapshot_profile) once the store opened
+        if not opened:
+            close_driver(driver)
+        session.breaker.close()
+    if not opened:
+        logger.warning(f"Could not warm a {store} profile; fresh profiles will be used")
+        return None
+
+    created_at = time.time()
+    version_dir = os.path.join(key_dir, str(int(created_at * 1000)))
+    snapshot_profile(driver, version_dir)
+
+    meta = {"store": store, "location": location or DEFAULT_LOCATION, "path": version_dir,
+            "created_at": created_at, "warm_seconds": round(created_at - started, 2)}
+    tmp_path = _meta_path(store, location) + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _meta_path(store, location))
+
+    _prune_versions(key_dir, keep=version_dir)
+    logger.info(f"Warmed {store} profile snapshot in {meta['warm_seconds']}s -> {version_dir}")
+    return meta
+
+
+def _prune_versions(key_dir, keep):
+    versions = sorted(
+        (os.path.join(key_dir, name) for name in os.listdir(key_dir) if name.isdigit()),
+        reverse=True,
+    )
+    for path in versions[KEEP_VERSIONS:]:
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _lock_path(store, location):
+    return os.path.join(SNAPSHOT_DIR, _key(store, location) + ".lock")
+
+
+def _warm_if_expired(store, location=DEFAULT_LOCATION, headless=True, logger=None, ttl=SNAPSHOT_TTL):
+    """
+    Re-warm an expired snapshot now, unless another process is already warming it. Returns the current meta.
+    """
+    logger = logger or logging.getLogger(__name__)
+    meta = read_meta(store, location)
+    if not is_expired(meta, ttl):
+        return meta
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(_lock_path(store, location), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.debug(f"{store} snapshot is being warmed by another process")
+            return meta
+        try:
+            # Another process may have finished warming while we waited for the lock
+            meta = read_meta(store, location)
+            if is_expired(meta, ttl):
+                meta = warm_snapshot(store, location, headless=headless, logger=logger) or meta
+        except Exception as e:
+            logger.error(f"Warming {store} snapshot failed: {e}")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return meta
+
+
+def _warm_in_background(store, location, logger):
+    """
+    Start a detached "profiles.py warm" for one snapshot unless one is already warming it.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(_lock_path(store, location), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        except BlockingIOError:
+            return
+    try:
+        # Own session and no shared stdio, so the search (and whoever waits on its pipes) never waits for it
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "warm", "--stores", store, "--location", location],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        logger.info(f"{store} snapshot expired; re-warming it in the background")
+    except OSError as e:
+        logger.warning(f"Could not start {store} snapshot warming: {e}")
+
+
+def checkout(store, location=DEFAULT_LOCATION, headless=True, logger=None, ttl=SNAPSHOT_TTL):
+    """
+    Path of a usable snapshot for create_driver(template=...), or None for a fresh profile.
+    An expired (or missing) snapshot is re-warmed in the background; the search meanwhile uses the stale one.
+    """
+    if not SNAPSHOTS_ENABLED:
+        return None
+    logger = logger or logging.getLogger(__name__)
+    meta = read_meta(store, location)
+    if is_expired(meta, ttl):
+        _warm_in_background(store, location or DEFAULT_LOCATION, logger)
+    return meta["path"] if meta else None
+
+
+def refresh_expired(stores, location=DEFAULT_LOCATION, headless=True, ttl=SNAPSHOT_TTL):
+    """
+    Re-warm every expired snapshot now; used by the prefetcher and "warm" so live searches never pay for warming.
+    """
+    refreshed = 0
+    for store in stores:
+        before = read_meta(store, location)
+        if is_expired(before, ttl):
+            meta = _warm_if_expired(store, location, headless=headless, ttl=ttl)
+            if meta and meta != before:
+                refreshed += 1
+    return refreshed
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    from catalog import STORES
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Warmed browser profile snapshots per store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm_parser = sub.add_parser("warm", help="Warm snapshots now (all stores by default)")
+    warm_parser.add_argument("--stores", type=str, default=",".join(STORES))
+    warm_parser.add_argument("--location", type=str, default=DEFAULT_LOCATION)
+    warm_parser.add_argument("--force", action="store_true", help="Re-warm even if the snapshot is fresh")
+    sub.add_parser("list", help="Show current snapshots")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in sorted(os.listdir(SNAPSHOT_DIR)) if os.path.isdir(SNAPSHOT_DIR) else []:
+            meta_file = os.path.join(SNAPSHOT_DIR, name, "current.json")
+            if os.path.exists(meta_file):
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["age_seconds"] = round(time.time() - meta["created_at"])
+                meta["expired"] = meta["age_seconds"] > SNAPSHOT_TTL
+                print(json.dumps(meta))
+        sys.exit(0)
+
+    stores = [s.strip() for s in args.stores.split(",") if s.strip()]
+    ttl = 0 if args.force else SNAPSHOT_TTL
+    refreshed = refresh_expired(stores, location=args.location, ttl=ttl)
+    logging.info(f"Warmed {refreshed} of {len(stores)} snapshots")
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+from catalog import STORES
+from logsetup import setup_logging
+from workqueue import WorkQueue, DEFAULT_VISIBILITY, worker_id
+
+# ---------------- Logging Setup ----------------
+setup_logging()
+
+# Browsers idle longer than this are closed until their store gets work again
+SESSION_IDLE_SECONDS = int(os.getenv("QUEUE_SESSION_IDLE", 5 * 60))
+# Finished and failed jobs older than QUEUE_RETENTION are purged this often (0 = never)
+PURGE_INTERVAL_SECONDS = int(os.getenv("QUEUE_PURGE_INTERVAL", 60 * 60))
+RETENTION_SECONDS = int(os.getenv("QUEUE_RETENTION", 24 * 60 * 60))
+
+stop_requested = False
+
+
+def handle_stop(sig=None, frame=None):
+    global stop_requested
+    logging.info("Stop requested. Finishing the current job...")
+    stop_requested = True
+
+
+# ---------------- Heartbeat ----------------
+class Heartbeat(threading.Thread):
+    """
+    Keep a job's lease alive while a slow scrape runs. Uses its own connection (sqlite3 objects are per-thread).
+    """
+    def __init__(self, job_id, owner, visibility):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.owner = owner
+        self.visibility = visibility
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        with WorkQueue() as wq:
+            while not self.stopped.wait(self.visibility / 3):
+                if not wq.heartbeat(self.job_id, self.owner, self.visibility):
+                    logging.warning(f"Lost lease on job {self.job_id}")
+                    self.lost = True
+                    return
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=5)
+
+
+# ---------------- Worker ----------------
+def run_job(wq, job, sessions, owner, headless, visibility):
+    from stores import StoreSession
+
+    store = job["store"]
+    session = sessions.get(store)
+    if session is None:
+        session = sessions[store] = StoreSession(store, headless=headless, logger=logging.getLogger(),
+                                                 location=job["location"])
+    else:
+        # One browser per store; it moves between locations instead of starting another Chrome
+        session.set_location(job["location"])
+
+    heartbeat = Heartbeat(job["id"], owner, visibility)
+    heartbeat.start()
+    try:
+        products = session.search(job["query"])
+        if not session.last_search_ran:
+            wq.fail(job["id"], owner, f"{store} did not open, extraction failed or its circuit is open")
+            return False
+        wq.complete(job["id"], owner, {"products": products, "worker": owner, "scraped_at": time.time(),
+                                       "resources": session.last_resources})
+        logging.info(f"Job {job['id']} done: {store} '{job['query']}' "
+                     f"{job['location'] or 'default location'} -> {len(products)} products")
+        return True
+    except Exception as e:
+        logging.exception(f"Job {job['id']} failed")
+        wq.fail(job["id"], owner, e)
+        # A broken browser is not reused for the next job
+        session.close()
+        sessions.pop(store, None)
+        return False
+    finally:
+        heartbeat.stop()
+
+
+def run_worker(stores, headless=True, visibility=DEFAULT_VISIBILITY, poll=1.0, idle_exit=0, once=False):
+    owner = worker_id()
+    sessions, last_used = {}, {}
+    idle_since = time.time()
+    last_purge = 0
+    logging.info(f"Queue worker {owner} serving {stores}")
+
+    with WorkQueue() as wq:
+        try:
+            while not stop_requested:
+                job = wq.lease(owner, stores=stores, visibility=visibility)
+                if job is None:
+                    if PURGE_INTERVAL_SECONDS and time.time() - last_purge > PURGE_INTERVAL_SECONDS:
+                        last_purge = time.time()
+                        purged = wq.purge(RETENTION_SECONDS)
+                        if purged:
+                            logging.info(f"Purged {purged} finished jobs")
+                    for store in [s for s, t in last_used.items() if time.time() - t > SESSION_IDLE_SECONDS]:
+                        session = sessions.pop(store, None)
+                        if session:
+                            session.close()
+                        last_used.pop(store)
+                    if once or (idle_exit and time.time() - idle_since > idle_exit):
+                        break
+                    time.sleep(poll)
+                    continue
+
+                run_job(wq, job, sessions, owner, headless, visibility)
+                last_used[job["store"]] = idle_since = time.time()
+        finally:
+            for session in sessions.values():
+                session.close()
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lease scrape jobs from the work queue and run them")
+    parser.add_argument("--stores", type=str, default=",".join(STORES), help="Comma-separated stores to serve")
+    parser.add_argument("--headless", action="store_true", help="Run Chrome in headless mode")
+    parser.add_argument("--visibility", type=int, default=DEFAULT_VISIBILITY,
+                        help="Lease length in seconds; renewed by a heartbeat while a job runs")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls when the queue is empty")
+    parser.add_argument("--idle-exit", type=int, default=0, help="Exit after this many idle seconds (0 = never)")
+    parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    from drivers import reap_orphans
+    reap_orphans()
+
+    # Scrapers write results_*.json into the cwd; keep them out of the caller's directory
+    workdir = tempfile.mkdtemp(prefix="smartcart-worker-")
+    os.chdir(workdir)
+    try:
+        run_worker([s.strip() for s in args.stores.split(",") if s.strip()], headless=args.headless,
+                   visibility=args.visibility, poll=args.poll, idle_exit=args.idle_exit, once=args.once)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
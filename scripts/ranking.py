@@ -0,0 +1,100 @@
+from normalizer import normalize_products, unit_price_order, format_unit_price
+from entities import group_products
+
+HEADERS = ["Store", "Brand", "Packing", "Item Name", "Price", "Original Relevance", "Unit Price"]
+# Orders a full ranked result can be re-sorted by after the comparison ran (see sort_orders)
+SORT_ORDERS = ("relevance", "price", "unit_price", "store")
+
+
+# ---------------- Ranking ----------------
+def tag_products(store, products, min_relevance=50):
+    """
+    Attach store/original_relevance to one store's scraped products and drop low-relevance ones.
+    """
+    tagged = []
+    for product in products or []:
+        try:
+            relevance = float(product.get("relevance", product.get("relevance_score", 0)) or 0)
+        except (ValueError, TypeError):
+            relevance = 0
+        if relevance >= min_relevance:
+            tagged.append(dict(product, store=store, original_relevance=relevance))
+    return tagged
+
+
+def rank_products(all_products, sort_by="relevance"):
+    """
+    Normalize packing/price for the whole batch and order it by relevance or unit price.
+    """
+    # Parse packing/price once for the whole batch
+    normalize_products(all_products)
+
+    if sort_by == "unit_price":
+        return [all_products[i] for i in unit_price_order(all_products)]
+    # Sort by original relevance descending
+    return sorted(all_products, key=lambda x: -x.get("original_relevance", 0))
+
+
+def sort_orders(ranked):
+    """
+    Indices of ranked (already normalized) for every SORT_ORDERS key; ties go to the more relevant product.
+    """
+    relevance = [-(p.get("original_relevance", 0) or 0) for p in ranked]
+    indices = range(len(ranked))
+    return {
+        "relevance": sorted(indices, key=lambda i: relevance[i]),
+        "price": sorted(indices, key=lambda i: (ranked[i].get("price_paise") is None,
+                                                ranked[i].get("price_paise") or 0, relevance[i])),
+        "unit_price": unit_price_order(ranked),
+        "store": sorted(indices, key=lambda i: (ranked[i].get("store", ""), relevance[i])),
+    }
+
+
+def to_row(prod):
+    return {
+        "store": prod.get("store", ""),
+        "brand": prod.get("brand", ""),
+        "packing": prod.get("packing", ""),
+        "item_name": prod.get("item_name", ""),
+        "price": prod.get("price", ""),
+        "original_relevance": prod.get("original_relevance", 0),
+        "price_paise": prod.get("price_paise"),
+        "unit": prod.get("unit"),
+        "unit_price_paise": prod.get("unit_price_paise"),
+        "unit_price": format_unit_price(prod.get("unit_price_paise"), prod.get("unit")),
+        # Catalog id (rows served from the catalog) for /api/history
+        "product_id": prod.get("id")
+    }
+
+
+def build_comparison(user_input, all_products, sort_by="relevance", source="scrape", top_n=5, location=None,
+                     full=False):
+    """
+    Build the comparison table (same shape as price-comparator output) from combined products.
+    location is the delivery location key the prices were scraped for ("" = store default).
+    full adds every ranked row ("all_rows") and its re-sort orders ("orders") for paging.
+    """
+    if not all_products:
+        return {"message": "No products found above relevance threshold", "user_input": user_input,
+                "location": location or "", "total_matches": 0, "headers": [], "rows": []}
+
+    ranked = rank_products(all_products, sort_by=sort_by)
+    # Keep top 5
+    top_products = ranked[:top_n]
+
+    result = {
+        "user_input": user_input,
+        "location": location or "",
+        "total_matches": len(top_products),
+        "total_ranked": len(ranked),
+        "sort_by": sort_by,
+        "source": source,
+        "headers": HEADERS,
+        "rows": [to_row(prod) for prod in top_products],
+        # Same SKU across stores, grouped over every ranked product (not just the top 5)
+        "groups": group_products(ranked)
+    }
+    if full:
+        result["all_rows"] = [to_row(prod) for prod in ranked]
+        result["orders"] = sort_orders(ranked)
+    return result
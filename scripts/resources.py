@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+import threading
+import psutil
+
+# RESOURCE_MONITOR=0 turns sampling off
+RESOURCES_ENABLED = os.getenv("RESOURCE_MONITOR", "1") != "0"
+SAMPLE_SECONDS = float(os.getenv("RESOURCE_SAMPLE_SECONDS", 1.0))
+
+# Optional per-job ceilings (0 = no limit); a browser tree over any of them is killed
+MAX_CPU_SECONDS = float(os.getenv("RESOURCE_MAX_CPU_SECONDS", 0))
+MAX_RSS_MB = float(os.getenv("RESOURCE_MAX_RSS_MB", 0))
+MAX_FDS = int(os.getenv("RESOURCE_MAX_FDS", 0))
+
+# Bytes the current page and its subresources transferred, from the Resource Timing API
+PAGE_BYTES_JS = """
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return entries.reduce((total, e) => total + (e.transferSize || 0), 0);
+"""
+
+
+def _tree(root_pid):
+    root = psutil.Process(root_pid)
+    return [root] + root.children(recursive=True)
+
+
+class ResourceMonitor:
+    """
+    Samples one browser's process tree (chromedriver, Chrome and its renderers) on a background thread
+    while a scrape job runs: CPU seconds used during the job, peak RSS, peak open fds and processes.
+    root_pid is a callable, since the browser may only be launched once the job is under way.
+    """
+    def __init__(self, label, root_pid, interval=SAMPLE_SECONDS, max_cpu_seconds=MAX_CPU_SECONDS,
+                 max_rss_mb=MAX_RSS_MB, max_fds=MAX_FDS, logger=None):
+        self.label = label
+        self.root_pid = root_pid
+        self.interval = interval
+        self.limits = {"cpu_seconds": max_cpu_seconds, "peak_rss_mb": max_rss_mb, "peak_fds": max_fds}
+        self.logger = logger or logging.getLogger(__name__)
+        # CPU time per (pid, create_time): (at first sight, latest); processes that exit keep their last reading
+        self.cpu = {}
+        self.peak_rss = 0
+        self.peak_fds = 0
+        self.peak_processes = 0
+        self.samples = 0
+        self.preexisting = False
+        self.killed = None
+        self.started = None
+        self.finished = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # ---------------- Sampling ----------------
+    def sample(self):
+        pid = self.root_pid()
+        if not pid:
+            return
+        try:
+            procs = _tree(pid)
+        except psutil.Error:
+            return
+
+        rss = fds = 0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    key = (proc.pid, proc.create_time())
+                    times = proc.cpu_times()
+                    used = times.user + times.system
+                    rss += proc.memory_info().rss
+                    fds += proc.num_fds()
+            except psutil.Error:
+                continue
+            # A browser already running when the job started only counts from then on
+            first = self.cpu.get(key, (used if self.samples == 0 and self.preexisting else 0.0, None))[0]
+            self.cpu[key] = (first, used)
+
+        self.samples += 1
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_fds = max(self.peak_fds, fds)
+        self.peak_processes = max(self.peak_processes, len(procs))
+        self.enforce(pid)
+
+    def enforce(self, pid):
+        """
+        Kill the tree once it goes over a ceiling, so one runaway page cannot starve the host.
+        """
+        if self.killed:
+            return
+        usage = self.usage()
+        for name, limit in self.limits.items():
+            if limit and usage[name] > limit:
+                from drivers import kill_tree
+
+                self.killed = f"{name} {usage[name]} > {limit}"
+                self.logger.error(f"{self.label} browser over its ceiling ({self.killed}); killing its process tree")
+                kill_tree(pid)
+                return
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.debug(f"{self.label} resource sample failed: {e}")
+
+    # ---------------- Lifecycle ----------------
+    def start(self):
+        self.started = time.time()
+        self.preexisting = bool(self.root_pid())
+        self.sample()
+        self.thread = threading.Thread(target=self.run, name=f"resources-{self.label}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread:
+            self.stopped.set()
+            self.thread.join(timeout=5)
+            self.thread = None
+        # One last reading so short jobs are still counted
+        self.sample()
+        self.finished = time.time()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------- Results ----------------
+    def usage(self):
+        return {
+            "cpu_seconds": round(sum(last - first for first, last in self.cpu.values()), 2),
+            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 1),
+            "peak_fds": self.peak_fds,
+        }
+
+    def summary(self, page_bytes=None):
+        """
+        What the job used, for its result and metrics.
+        """
+        return dict(self.usage(), **{
+            "peak_processes": self.peak_processes,
+            "page_bytes": page_bytes,
+            "wall_seconds": round((self.finished or time.time()) - (self.started or time.time()), 2),
+            "samples": self.samples,
+            "killed": self.killed,
+        })
+
+
+def page_bytes(driver):
+    """
+    Transfer size of the page the driver is on (None when the browser cannot say, e.g. after a kill).
+    """
+    try:
+        return int(driver.execute_script(PAGE_BYTES_JS) or 0)
+    except Exception:
+        return None
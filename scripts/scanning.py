@@ -0,0 +1,137 @@
+import os
+import time
+import heapq
+import logging
+
+# ---------------- Scan Settings ----------------
+# SCAN_EARLY_STOP=0 scores every card like before (still no scrolling past what is on the page)
+EARLY_STOP = os.getenv("SCAN_EARLY_STOP", "1") != "0"
+# Stop once TOP_K cards score >= min_relevance and PATIENCE further cards did not improve them
+TOP_K = int(os.getenv("SCAN_TOP_K", 5))
+PATIENCE = int(os.getenv("SCAN_PATIENCE", 4))
+# ... or once PATIENCE cards in a row score below the floor (results ranked by relevance have tailed off)
+FLOOR = 30
+# Scrolls that load nothing new before the page counts as fully loaded
+MAX_IDLE_SCROLLS = int(os.getenv("SCAN_MAX_IDLE_SCROLLS", 2))
+SCROLL_WAIT_SECONDS = 1.5
+
+SCROLL_JS = "arguments[0].scrollIntoView({block: 'end'}); window.scrollBy(0, window.innerHeight);"
+
+
+class CardScanner:
+    """
+    Hands out result cards as they appear (scrolling for lazy-loaded ones) and stops the scan as soon as
+    the running top-k is good enough or relevance drops off. Callers report each card's score().
+    """
+    def __init__(self, driver, find_cards, top_k=TOP_K, min_relevance=50, patience=PATIENCE, floor=FLOOR,
+                 max_cards=None, scroll=True, logger=None):
+        self.driver = driver
+        self.find_cards = find_cards
+        self.top_k = top_k
+        self.min_relevance = min_relevance
+        self.patience = patience
+        self.floor = floor
+        self.max_cards = max_cards
+        self.scroll = scroll and EARLY_STOP
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.best = []  # min-heap of the top_k relevances
+        self.seen = 0
+        self.scanned = 0
+        self.scrolls = 0
+        self.since_improvement = 0
+        self.below_floor = 0
+        self.reason = None
+
+    @property
+    def done(self):
+        return self.reason is not None
+
+    @property
+    def complete(self):
+        """
+        True when every card the store lists was handed out: scrolling stopped loading new ones.
+        """
+        return self.reason == "end_of_results" and self.scroll
+
+    # ---------------- Cards ----------------
+    def cards(self):
+        """
+        Yield each card once, in page order. New cards found after scrolling are picked up too;
+        card identity is the element id, so re-rendered (virtualized) lists are not scanned twice.
+        """
+        yielded = set()
+        idle = 0
+        while not self.done:
+            fresh = [card for card in self._current_cards() if card.id not in yielded]
+            if fresh:
+                idle = 0
+                for card in fresh:
+                    yielded.add(card.id)
+                    self.seen += 1
+                    yield card
+                    if self.done:
+                        return
+                    if self.max_cards and self.seen >= self.max_cards:
+                        self.reason = "max_cards"
+                        return
+                continue
+
+            if not self.scroll or idle >= MAX_IDLE_SCROLLS:
+                self.reason = "end_of_results"
+                return
+            idle += 1
+            self._scroll_for_more(len(yielded))
+
+    def _current_cards(self):
+        try:
+            return self.find_cards()
+        except Exception as e:
+            self.logger.debug(f"Card lookup failed: {e}")
+            return []
+
+    def _scroll_for_more(self, known):
+        cards = self._current_cards()
+        if not cards:
+            return False
+        self.scrolls += 1
+        try:
+            self.driver.execute_script(SCROLL_JS, cards[-1])
+        except Exception as e:
+            self.logger.debug(f"Scroll failed: {e}")
+            return False
+        deadline = time.time() + SCROLL_WAIT_SECONDS
+        while time.time() < deadline:
+            if len(self._current_cards()) > known:
+                return True
+            time.sleep(0.25)
+        return False
+
+    # ---------------- Scoring ----------------
+    def score(self, relevance):
+        """
+        Record one scored card and decide whether scanning further can still change the result.
+        """
+        self.scanned += 1
+        improved = False
+        if len(self.best) < self.top_k:
+            heapq.heappush(self.best, relevance)
+            improved = relevance >= self.min_relevance
+        elif relevance > self.best[0]:
+            heapq.heapreplace(self.best, relevance)
+            improved = relevance >= self.min_relevance
+
+        self.since_improvement = 0 if improved else self.since_improvement + 1
+        self.below_floor = 0 if relevance >= self.floor else self.below_floor + 1
+        if not EARLY_STOP:
+            return
+
+        full = len(self.best) >= self.top_k and self.best[0] >= self.min_relevance
+        if full and self.since_improvement >= self.patience:
+            self.reason = "top_k_stable"
+        elif self.scanned >= self.top_k and self.below_floor >= self.patience:
+            self.reason = "relevance_drop_off"
+
+    def summary(self):
+        return (f"scanned {self.scanned} of {self.seen} cards, {self.scrolls} scrolls, "
+                f"stopped: {self.reason or 'caller'}")
@@ -1,11 +1,15 @@
-from polyfuzz import PolyFuzz
+import re
+import math
+import logging
+from collections import Counter
 
 def compute_relevance(search_input, brand, item_name, packing, logger=None):
-    logger.info(f"input - '{search_input}', brand - '{brand}', item_name -  {item_name}, packing - {packing}")
+    # polyfuzz pulls in pandas and scikit-learn; only pay for it when something is actually scored
+    from polyfuzz import PolyFuzz
+
+    logger = logger or logging.getLogger(__name__)
     # Combine brand, item name, and packing into one product description
     product_description = f"{brand} {item_name} {packing}".strip()
-    logger.info(f"calculating Relevance score between '{search_input}' and '{product_description}'")
-    
 
     # Wrap both as lists for PolyFuzz
     search_input_list = [search_input]
@@ -20,7 +24,83 @@ def compute_relevance(search_input, brand, item_name, packing, logger=None):
     percentage = round(score * 100, 2)
 
 
-    logger.info(f"Relevance score between '{search_input}' and '{product_description}': {percentage}%")
+    # Called once per product card: sampled so it stays off the scraping critical path
+    logger.debug(
+        "Relevance score between '%s' and '%s': %s%%", search_input, product_description, percentage,
+        extra={"sampled": True}
+    )
 
     return percentage
 
+
+def _trigrams(text):
+    # PolyFuzz's TF-IDF analyzer: lowercase alphanumerics, character 3-grams that contain no space
+    text = re.sub(r"\s+", " ", re.sub(r"[^A-Za-z0-9 ]+", "", text.lower())).strip()
+    return Counter(g for g in (text[i:i + 3] for i in range(len(text) - 2)) if " " not in g)
+
+
+def compute_relevances(search_input, descriptions, logger=None):
+    """
+    compute_relevance for many product descriptions at once, on the same scale: each pair is weighted as if
+    the TF-IDF model were fitted on just that pair (shared 3-grams idf 1, the rest 1 + ln 1.5), but without
+    building a PolyFuzz model per row.
+    """
+    logger = logger or logging.getLogger(__name__)
+    query = _trigrams(search_input)
+    unshared = 1 + math.log(1.5)
+    scores = []
+    for description in descriptions:
+        grams = _trigrams(description)
+        shared = query.keys() & grams.keys()
+        dot = sum(query[g] * grams[g] for g in shared)
+        norm_q = math.sqrt(sum((n if g in shared else n * unshared) ** 2 for g, n in query.items()))
+        norm_d = math.sqrt(sum((n if g in shared else n * unshared) ** 2 for g, n in grams.items()))
+        # PolyFuzz reports similarity to 3 decimals
+        scores.append(round(round(dot / (norm_q * norm_d), 3) * 100, 2) if dot else 0.0)
+    logger.debug("Scored %d descriptions against '%s'", len(scores), search_input, extra={"sampled": True})
+    return scores
+
+
+def canonical_query(search_input):
+    """
+    Normalise a search string so repeated queries share cache/catalog keys.
+    """
+    text = re.sub(r"[^\w\s]", " ", (search_input or "").lower())
+    return " ".join(text.split())
+
+
+def keep_relevant(search_input, products, score_packing=True, min_relevance=0, logger=None):
+    """
+    Score scraped rows and filter them the way the store scrapers do: rows >= 50% relevant, else the top 5.
+    Rows under min_relevance are dropped first (Bigbasket uses 30 and scores brand + name only).
+    """
+    scored = []
+    for p in products:
+        relevance = compute_relevance(search_input, p["brand"], p["item_name"],
+                                      p["packing"] if score_packing else "", logger=logger)
+        if relevance >= min_relevance and p.get("price"):
+            scored.append(dict(p, relevance=relevance))
+    scored.sort(key=lambda p: p["relevance"], reverse=True)
+    return [p for p in scored if p["relevance"] >= 50] or scored[:5]
+
+
+class StoreScrapper:
+    """
+    What every store scraper exposes to StoreSession besides its open/search/extract methods:
+    last_attempts is how many attempts the last open or extract call used (retry budgets are learned from it),
+    last_failed is True when the last extract call gave up rather than finding nothing, last_complete is True
+    when it returned every result the store listed (the scan reached the end and no row was filtered out),
+    and selectors holds the store's selector fallbacks and hit rates (StoreSession passes one in).
+    """
+    store = None
+
+    def __init__(self, logger, driver, selectors=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.driver = driver
+        self.last_attempts = 0
+        self.last_failed = False
+        self.last_complete = False
+        if selectors is None and self.store:
+            from selectorhealth import SelectorHealth
+            selectors = SelectorHealth(self.store, logger=self.logger)
+        self.selectors = selectors
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from catalog import BASE_DIR
+
+# Shared by every search, batch worker and queue worker on the host
+SELECTOR_HEALTH_PATH = os.getenv("SELECTOR_HEALTH_PATH", os.path.join(BASE_DIR, "selector-health.db"))
+
+# Lookups older than this no longer count
+WINDOW_SECONDS = int(os.getenv("SELECTOR_WINDOW", 6 * 60 * 60))
+# A selector with this many recent lookups and no hits is tried after the others
+MIN_LOOKUPS = int(os.getenv("SELECTOR_MIN_LOOKUPS", 3))
+# A core role whose selectors all missed in this many recent searches marks the store broken
+BROKEN_MIN_REQUESTS = int(os.getenv("SELECTOR_BROKEN_MIN_REQUESTS", 3))
+# A broken store gets one search through once its last recorded search is this old, to notice a fix
+RECHECK_SECONDS = int(os.getenv("SELECTOR_RECHECK", 15 * 60))
+# Long-lived sessions re-read other processes' outcomes this often
+RELOAD_SECONDS = 60
+# Waits on a role known broken give up after this long instead of the scraper's timeout
+BROKEN_WAIT_SECONDS = 1
+
+# Selectors per store and role, primary first. Fallbacks match on the stable prefix of hashed
+# styled-components classes (or on attributes), so a rebuild of the store's CSS rarely breaks all of them.
+# Core roles are the ones a scrape cannot produce prices without.
+SELECTORS = {
+    "Bigbasket": {
+        "search_box": ["input[placeholder='Search for Products...']", "input[placeholder*='Search']"],
+        "card": ["li[class*='PaginateItems']"],
+        "brand": ["span[class*='BrandName___StyledLabel2']", "span[class*='BrandName']"],
+        "title": ["h3.block.m-0.line-clamp-2", "h3[class*='line-clamp']"],
+        "pack_label": ["span.PackChanger___StyledLabel-sc-newjpv-1", "span[class*='PackChanger___StyledLabel']",
+                       "span.PackSelector___StyledLabel-sc-1lmu4hv-0 span.Label-sc-15v1nk5-0.gJxZPQ",
+                       "span[class*='PackSelector___StyledLabel'] span[class*='Label-sc']"],
+        "price": ["div.Pricing___StyledDiv-sc-pldi2d-0", "div[class*='Pricing___StyledDiv']"],
+    },
+    "Blinkit": {
+        "location_button": ["button.btn.location-box.mask-button", "button[class*='location-box']"],
+        "search_box": ["input.SearchBarContainer__Input-sc-hl8pft-3", "input[class*='SearchBarContainer__Input']",
+                       "input[placeholder*='Search']"],
+        "card": ["div[role='button'][tabindex='0']"],
+        "title": ["div.tw-text-300.tw-font-semibold.tw-line-clamp-2", "div[class*='tw-line-clamp-2']"],
+        "packing": ["div.tw-text-200.tw-font-medium.tw-line-clamp-1", "div[class*='tw-line-clamp-1']"],
+        "price": ["div.tw-text-200.tw-font-semibold", "div[class*='tw-font-semibold']"],
+    },
+    "Swiggyinsta": {
+        "search_box": ["input[type='search'][data-testid='search-page-header-search-bar-input']",
+                       "input[data-testid*='search-bar-input']", "input[type='search']"],
+        "card": ["div[data-testid='default_container_ux4']", "div[data-testid*='default_container']"],
+        "title": ["div.sc-aXZVg.kyEzVU._1sPB0", "div[class*='_1sPB0']", "div.sc-aXZVg"],
+        "packing": ["div._3eIPt, div._1HYm8, div.entQHA", "div[class*='_3eIPt'], div[class*='_1HYm8']"],
+        "price": ["div[data-testid='item-offer-price']", "[data-testid*='offer-price']"],
+    },
+}
+CORE_ROLES = {
+    "Bigbasket": ["search_box", "title", "price"],
+    "Blinkit": ["search_box", "title", "price"],
+    "Swiggyinsta": ["search_box", "title", "price"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS selector_outcomes (
+    store TEXT NOT NULL,
+    role TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_selector_outcomes ON selector_outcomes(store, ts);
+"""
+
+
+def _connect(path=None):
+    conn = sqlite3.connect(path or SELECTOR_HEALTH_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _window_stats(conn, store, now):
+    """
+    {(role, selector): (lookups, hits)} and {role: (searches, hits, last search ts)} over the window.
+    """
+    selectors, roles = {}, {}
+    for row in conn.execute(
+        "SELECT role, selector, SUM(hits) AS hits, SUM(hits + misses) AS lookups FROM selector_outcomes "
+        "WHERE store = ? AND ts >= ? GROUP BY role, selector", (store, now - WINDOW_SECONDS)
+    ):
+        selectors[(row["role"], row["selector"])] = (row["lookups"], row["hits"])
+    for row in conn.execute(
+        "SELECT role, COUNT(DISTINCT ts) AS searches, SUM(hits) AS hits, MAX(ts) AS last FROM selector_outcomes "
+        "WHERE store = ? AND ts >= ? GROUP BY role", (store, now - WINDOW_SECONDS)
+    ):
+        roles[row["role"]] = (row["searches"], row["hits"], row["last"])
+    return selectors, roles
+
+
+class SelectorHealth:
+    """
+    One store's selectors for one session: lookups try the registry's fallbacks in order of recent success,
+    hits and misses are counted in memory and written once per search by flush().
+    """
+    def __init__(self, store, path=None, logger=None):
+        self.store = store
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self.registry = SELECTORS.get(store, {})
+        self.counts = {}
+        self.preferred = {}
+        self.selector_stats, self.role_stats = {}, {}
+        self.loaded_at = 0
+        self.load()
+
+    def load(self):
+        try:
+            conn = _connect(self.path)
+            self.selector_stats, self.role_stats = _window_stats(conn, self.store, time.time())
+            conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not read selector health for {self.store}: {e}")
+        self.loaded_at = time.time()
+
+    # ---------------- Health ----------------
+    def known_broken(self, role, selector):
+        lookups, hits = self.selector_stats.get((role, selector), (0, 0))
+        return lookups >= MIN_LOOKUPS and not hits
+
+    def role_broken(self, role):
+        searches, hits, _ = self.role_stats.get(role, (0, 0, 0))
+        return searches >= BROKEN_MIN_REQUESTS and not hits
+
+    def broken_core(self):
+        """
+        Core roles none of whose selectors matched anything in recent searches. Empty once the last
+        search is RECHECK_SECONDS old, so that the next search re-checks the store.
+        """
+        if time.time() - self.loaded_at > RELOAD_SECONDS:
+            self.load()
+        now = time.time()
+        return [role for role in CORE_ROLES.get(self.store, [])
+                if self.role_broken(role) and now - self.role_stats[role][2] < RECHECK_SECONDS]
+
+    # ---------------- Lookups ----------------
+    def candidates(self, role):
+        """
+        Selectors for role: the one that last matched in this session, then working ones, then known-broken ones.
+        """
+        return sorted(self.registry[role], key=lambda s: (s != self.preferred.get(role), self.known_broken(role, s)))
+
+    def _record(self, role, tried, matched):
+        for selector in tried:
+            counts = self.counts.setdefault((role, selector), [0, 0])
+            counts[1 if selector != matched else 0] += 1
+        if matched is not None and matched != self.registry[role][0] and self.preferred.get(role) != matched:
+            self.logger.warning(f"{self.store} '{role}' primary selector missed; using fallback {matched!r}")
+        if matched is not None:
+            self.preferred[role] = matched
+
+    def find_all(self, context, role):
+        """
+        Elements under context (driver or element) matched by the first selector of role that matches anything.
+        """
+        from selenium.webdriver.common.by import By
+
+        tried = []
+        for selector in self.candidates(role):
+            tried.append(selector)
+            found = context.find_elements(By.CSS_SELECTOR, selector)
+            if found:
+                self._record(role, tried, selector)
+                return found
+        self._record(role, tried, None)
+        return []
+
+    def find(self, context, role):
+        """
+        First element for role; raises NoSuchElementException like find_element when no selector matches.
+        """
+        from selenium.common.exceptions import NoSuchElementException
+
+        found = self.find_all(context, role)
+        if not found:
+            raise NoSuchElementException(f"No {self.store} '{role}' selector matched")
+        return found[0]
+
+    def wait(self, driver, role, timeout, condition=None):
+        """
+        Wait up to timeout for any selector of role (condition: an expected_conditions factory taking a
+        locator, default presence). Roles known broken get BROKEN_WAIT_SECONDS. Raises TimeoutException.
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException
+
+        condition = condition or EC.presence_of_element_located
+        candidates = self.candidates(role)
+        if self.role_broken(role):
+            timeout = min(timeout, BROKEN_WAIT_SECONDS)
+        try:
+            element = WebDriverWait(driver, timeout).until(condition((By.CSS_SELECTOR, ", ".join(candidates))))
+        except TimeoutException:
+            self._record(role, candidates, None)
+            raise
+        # Credit the first selector in order that matches what the wait found
+        first = element[0] if isinstance(element, list) else element
+        for index, selector in enumerate(candidates):
+            try:
+                if driver.execute_script("return arguments[0].matches(arguments[1]);", first, selector):
+                    self._record(role, candidates[:index + 1], selector)
+                    break
+            except Exception:
+                break
+        return element
+
+    def css(self, role):
+        """
+        All selectors of role as one selector group, best first (for callers that build their own waits).
+        """
+        return ", ".join(self.candidates(role))
+
+    # ---------------- Persistence ----------------
+    def flush(self):
+        """
+        Write this search's counts (one row per selector used) and fold them into the session's view.
+        """
+        if not self.counts:
+            return
+        now = time.time()
+        rows = [(self.store, role, selector, hits, misses, now)
+                for (role, selector), (hits, misses) in self.counts.items()]
+        for (role, selector), (hits, misses) in self.counts.items():
+            lookups, total = self.selector_stats.get((role, selector), (0, 0))
+            self.selector_stats[(role, selector)] = (lookups + hits + misses, total + hits)
+        for role in {role for role, _ in self.counts}:
+            searches, total, _ = self.role_stats.get(role, (0, 0, 0))
+            hits = sum(h for (r, _), (h, _) in self.counts.items() if r == role)
+            self.role_stats[role] = (searches + 1, total + hits, now)
+        self.counts = {}
+        try:
+            conn = _connect(self.path)
+            conn.executemany(
+                "INSERT INTO selector_outcomes (store, role, selector, hits, misses, ts) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+            conn.execute("DELETE FROM selector_outcomes WHERE ts < ?", (now - WINDOW_SECONDS,))
+            conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not record selector health for {self.store}: {e}")
+
+
+def selector_health(path=None):
+    """
+    Per-store extraction health: "broken" (a core role matches nothing), "degraded" (a role only matches
+    through fallbacks) or "ok", with each selector's recent hit rate.
+    """
+    conn = _connect(path)
+    now = time.time()
+    report = []
+    for store, registry in SELECTORS.items():
+        selector_stats, role_stats = _window_stats(conn, store, now)
+        roles, degraded = {}, []
+        for role, selectors in registry.items():
+            searches, hits, _ = role_stats.get(role, (0, 0, 0))
+            entries = []
+            for selector in selectors:
+                lookups, selector_hits = selector_stats.get((role, selector), (0, 0))
+                entries.append({"selector": selector, "lookups": lookups, "hits": selector_hits,
+                                "hit_rate": round(selector_hits / lookups, 3) if lookups else None})
+            primary = entries[0]
+            if primary["lookups"] >= MIN_LOOKUPS and not primary["hits"] and hits:
+                degraded.append(role)
+            roles[role] = {"searches": searches, "hits": hits, "selectors": entries}
+        broken = [role for role in CORE_ROLES.get(store, [])
+                  if role_stats.get(role, (0, 0, 0))[0] >= BROKEN_MIN_REQUESTS and not role_stats[role][1]]
+        report.append({
+            "store": store,
+            "status": "broken" if broken else "degraded" if degraded else "ok",
+            "broken_roles": broken,
+            "degraded_roles": degraded,
+            "roles": roles,
+        })
+    conn.close()
+    return report
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-store selector hit rates and extraction health")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Print every store's selector health")
+    reset_parser = sub.add_parser("reset", help="Forget a store's selector history (e.g. after fixing selectors)")
+    reset_parser.add_argument("store")
+    args = parser.parse_args()
+
+    if args.command == "reset":
+        conn = _connect()
+        conn.execute("DELETE FROM selector_outcomes WHERE store = ?", (args.store,))
+        conn.close()
+    print(json.dumps(selector_health()))
+    sys.exit(0)
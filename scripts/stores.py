@@ -0,0 +1,277 @@
+import os
+import json
+import logging
+from urllib.parse import urlsplit
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from bigbasket import BBScrapper
+from blinkit import BlinkItScrapper
+from swiggy import SwiggyScrapper
+from drivers import create_driver, close_driver
+from profiles import checkout, DEFAULT_LOCATION
+from locations import resolve_location, location_key, apply_location, clear_store_state
+from breakers import CircuitBreaker
+from selectorhealth import SelectorHealth
+from resources import ResourceMonitor, RESOURCES_ENABLED, page_bytes
+from tabs import TabDriver
+from diagnostics import Diagnostics
+from httpfetch import fetch_products
+
+# ---------------- Store URLs ----------------
+# Overridable so scrapers can be pointed at mockstores.py (load tests) instead of the live sites
+BIGBASKET_URL = os.getenv("BIGBASKET_URL", "https://www.bigbasket.com/")
+BLINKIT_URL = os.getenv("BLINKIT_URL", "https://blinkit.com/s/")
+SWIGGY_URL = os.getenv("SWIGGY_URL", "https://www.swiggy.com/instamart/search?custom_back=true")
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+# ---------------- Store Registry ----------------
+# Store names match the comparator/catalog names (results_<store>.json)
+STORE_SPECS = {
+    "Bigbasket": {
+        "scrapper": BBScrapper,
+        "open": "open_bigbasket",
+        "url": BIGBASKET_URL,
+        "origin": _origin(BIGBASKET_URL),
+        "search_box": "input[placeholder='Search for Products...']",
+        "print_results": True,
+        # Fixed retry ladders; the circuit breaker only ever shrinks them
+        "open_retries": 3,
+        "extract_retries": None,
+    },
+    "Blinkit": {
+        "scrapper": BlinkItScrapper,
+        "open": "open_blinkit",
+        "url": BLINKIT_URL,
+        "origin": _origin(BLINKIT_URL),
+        "search_box": "input.SearchBarContainer__Input-sc-hl8pft-3",
+        "print_results": False,
+        "open_retries": 3,
+        "extract_retries": 3,
+    },
+    "Swiggyinsta": {
+        "scrapper": SwiggyScrapper,
+        "open": "open_swiggy",
+        "url": SWIGGY_URL,
+        "origin": _origin(SWIGGY_URL),
+        "search_box": "input[type='search'][data-testid='search-page-header-search-bar-input']",
+        "print_results": False,
+        "open_retries": 5,
+        "extract_retries": 3,
+    },
+}
+
+
+class StoreSession:
+    """
+    One browser per store, opened once and reused for many searches.
+    location is a pincode or "lat,lon" (None = whatever the store detects); set_location() moves the session.
+    """
+    def __init__(self, store, headless=True, logger=None, driver=None, location=None):
+        self.store = store
+        self.location = resolve_location(location)
+        self.spec = STORE_SPECS[store]
+        self.logger = logger or logging.getLogger(__name__)
+        self.headless = headless
+        self.driver = driver
+        self.scrapper = None
+        self.is_open = False
+        # False when the last search was skipped (open circuit), the store never opened or extraction failed;
+        # callers only record searches that ran in the catalog, so failures are not cached as "no products"
+        self.last_search_ran = False
+        # True when the last browser search failed (store did not open, search raised, extraction gave up),
+        # as opposed to a search that ran and found nothing
+        self.last_search_failed = False
+        # True when the last search returned every result the store listed (see StoreScrapper)
+        self.last_search_complete = False
+        self.breaker = CircuitBreaker(store, logger=self.logger)
+        self.selectors = SelectorHealth(store, logger=self.logger)
+        # CPU/RSS/fds/page bytes of the last browser search (None for HTTP fast-path or shared-browser searches)
+        self.last_resources = None
+        # Recent events, written out with a screenshot and the DOM only when a search fails
+        self.diagnostics = Diagnostics(store, logger=self.logger)
+
+    # ---------------- Lifecycle ----------------
+    def open(self):
+        if self.driver is None:
+            # Start from the warmed snapshot so location prompts and landing pages are already done
+            template = checkout(self.store, location=location_key(self.location) or DEFAULT_LOCATION,
+                                headless=self.headless, logger=self.logger)
+            self.driver = create_driver(headless=self.headless, template=template)
+        apply_location(self.driver, self.location, [self.spec["origin"]])
+        self.scrapper = self.spec["scrapper"](self.logger, self.driver, selectors=self.selectors)
+        budget = self.breaker.retry_budget("open", self.spec["open_retries"])
+        self.is_open = bool(getattr(self.scrapper, self.spec["open"])(url=self.spec["url"], max_retries=budget))
+        self.breaker.record_attempts("open", self.scrapper.last_attempts, self.is_open)
+        if not self.is_open:
+            self.logger.error(f"Failed to open {self.store}.")
+        return self.is_open
+
+    def set_location(self, location):
+        """
+        Point this browser at another delivery location: forget the store's saved address and reopen on next search.
+        """
+        location = resolve_location(location)
+        if location_key(location) == location_key(self.location):
+            return
+        self.location = location
+        if self.driver:
+            try:
+                clear_store_state(self.driver, self.spec["origin"])
+            except Exception as e:
+                self.logger.warning(f"Could not clear {self.store} saved location: {e}")
+        self.is_open = False
+
+    def close_browser(self):
+        """
+        Close the browser but keep the session usable; the next search starts a new one.
+        """
+        if self.driver:
+            try:
+                close_driver(self.driver)
+            except Exception as e:
+                self.logger.error(f"Error closing {self.store} browser: {e}")
+        self.driver = None
+        self.is_open = False
+
+    def close(self):
+        self.close_browser()
+        self.breaker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- Search ----------------
+    def has_search_box(self):
+        try:
+            return bool(self.driver.find_elements(By.CSS_SELECTOR, self.spec["search_box"]))
+        except Exception:
+            return False
+
+    def _run_search(self, query):
+        self.scrapper.search_product(query)
+        if self.spec["print_results"]:
+            self.scrapper.print_search_results()
+        if self.spec["extract_retries"] is None:
+            return self.scrapper.extract_products() or []
+        budget = self.breaker.retry_budget("extract", self.spec["extract_retries"])
+        products = self.scrapper.extract_products(max_retries=budget) or []
+        self.breaker.record_attempts("extract", self.scrapper.last_attempts, not self.scrapper.last_failed)
+        return products
+
+    def search(self, query):
+        """
+        Search over plain HTTP when the store allows it, else in the browser unless the store's circuit
+        is open; every browser search that runs feeds the breaker.
+        """
+        self.last_search_ran = False
+        self.last_search_failed = False
+        self.last_search_complete = False
+        self.last_resources = None
+        # The fast path has no delivery address, so only default-location searches can use it
+        products = fetch_products(self.store, query, logger=self.logger) if self.location is None else None
+        if products is not None:
+            self.last_search_ran = True
+            # Same results file the store's scraper would have written for the comparator
+            with open(f"results_{self.store.lower()}.json", "w", encoding="utf-8") as f:
+                json.dump(products, f, indent=4, ensure_ascii=False)
+            return products
+        # Markup changed under a core selector: fail now instead of waiting out every timeout and retry
+        broken = self.selectors.broken_core()
+        if broken:
+            self.logger.error(f"{self.store} selectors for {', '.join(broken)} matched nothing in recent searches; "
+                              f"skipping store (see selectorhealth.py status)")
+            return []
+        if not self.breaker.allow():
+            return []
+        # Tabs of a shared browser share one process tree, so only a browser of our own is accounted
+        monitor = None
+        if RESOURCES_ENABLED and not isinstance(self.driver, TabDriver):
+            monitor = ResourceMonitor(self.store, self._browser_pid, logger=self.logger).start()
+        context = {"query": query, "location": location_key(self.location)}
+        with self.diagnostics.recording(lambda: self.driver, context) as recording:
+            try:
+                products = self._search(query)
+            except Exception as e:
+                self.last_search_failed = True
+                # Killed over a ceiling: the search fails like any other instead of taking the job down
+                if not (monitor and monitor.killed):
+                    self.diagnostics.capture(f"exception: {e}", self.driver, context)
+                    self.breaker.record(False)
+                    raise
+                products = []
+            finally:
+                self.selectors.flush()
+                if monitor:
+                    self._finish_monitor(monitor)
+            if monitor and monitor.killed:
+                products = []
+                self.last_search_failed = True
+                self.diagnostics.capture(f"killed: {monitor.killed}", None, dict(context, resources=self.last_resources))
+                self.close_browser()
+            elif self.last_search_failed and not recording.timed_out:
+                # A query with no results is not a failure and is not worth a screenshot and DOM dump
+                self.diagnostics.capture("search failed", self.driver if self.is_open else None,
+                                         dict(context, resources=self.last_resources))
+        self.last_search_ran = self.is_open and not self.last_search_failed
+        # A query with no results is a working store; only failures count against the breaker
+        self.breaker.record(not self.last_search_failed)
+        return products
+
+    def _browser_pid(self):
+        try:
+            return self.driver.service.process.pid if self.driver is not None else None
+        except AttributeError:
+            return None
+
+    def _finish_monitor(self, monitor):
+        monitor.stop()
+        if not monitor.samples:
+            return
+        pid = self._browser_pid()
+        self.last_resources = monitor.summary(page_bytes(self.driver) if pid and not monitor.killed else None)
+        self.logger.info(f"{self.store} browser used {self.last_resources['cpu_seconds']} CPU s, "
+                         f"peak {self.last_resources['peak_rss_mb']} MB RSS, {self.last_resources['peak_fds']} fds",
+                         extra={"resources": dict(self.last_resources, store=self.store)})
+
+    def _search(self, query):
+        """
+        Search from the page's own search box; reopen the store only when the box is gone.
+        Sets last_search_failed unless the scraper got through extraction.
+        """
+        self.last_search_failed = True
+        if not self.is_open and not self.open():
+            return []
+
+        # Dismiss pack/variant popups left over from the previous extraction
+        try:
+            self.driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
+        except Exception:
+            pass
+
+        if not self.has_search_box():
+            self.logger.info(f"{self.store} search box not found. Reopening store page.")
+            if not self.open():
+                return []
+
+        try:
+            products = self._run_search(query)
+        except Exception as e:
+            self.logger.error(f"{self.store} search for '{query}' failed: {e}. Reopening and retrying once.")
+            if not self.open():
+                return []
+            try:
+                products = self._run_search(query)
+            except Exception as e:
+                self.logger.error(f"{self.store} retry for '{query}' failed: {e}")
+                return []
+        self.last_search_failed = self.scrapper.last_failed
+        self.last_search_complete = self.scrapper.last_complete and not self.last_search_failed
+        return products
@@ -10,16 +10,14 @@ from selenium.common.exceptions import (
 )
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from scutils import compute_relevance
+from scutils import compute_relevance, StoreScrapper
+from scanning import CardScanner
 import time
 import json
 
 
-class SwiggyScrapper:
-    def __init__(self, logger, driver):
-        self.logger = logger or logging.getLogger(__name__)
-        self.driver = driver
+class SwiggyScrapper(StoreScrapper):
+    store = "Swiggyinsta"
         
 
     # ---------------- Close any popup ----------------
@@ -38,17 +36,13 @@ class SwiggyScrapper:
             logging.debug(f"No popup detected: {e}")
 
     # ---------------- Open Swiggy Instamart ----------------
-    def open_swiggy(self, url="https://www.swiggy.com/instamart/search?custom_back=true"):
-        max_retries = 5
+    def open_swiggy(self, url="https://www.swiggy.com/instamart/search?custom_back=true", max_retries=5):
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 logging.debug(f"Attempt {attempt}: Opening {url}")
                 self.driver.get(url)
-                WebDriverWait(self.driver, 5).until(
-                    EC.presence_of_element_located(
-                        (By.CSS_SELECTOR, "input[type='search'][data-testid='search-page-header-search-bar-input']")
-                    )
-                )
+                self.selectors.wait(self.driver, "search_box", 5)
                 logging.info("Page loaded successfully.")
                 self.close_popup()
                 return True
@@ -69,11 +63,7 @@ class SwiggyScrapper:
         self.user_input = product_name
         try:
             logging.debug(f"Searching for product: {product_name}")
-            search_box = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, "input[type='search'][data-testid='search-page-header-search-bar-input']")
-                )
-            )
+            search_box = self.selectors.wait(self.driver, "search_box", 5)
             search_box.clear()
             search_box.send_keys(product_name)
             time.sleep(5)
@@ -86,25 +76,30 @@ class SwiggyScrapper:
 
 
     # ---------------- Extract Product Details with retry ----------------
-    def extract_products(self):
-        max_retries = 3
+    def extract_products(self, max_retries=3):
+        self.last_failed = False
+        self.last_complete = False
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 all_products = []
                 filtered_products = []
 
-                wait = WebDriverWait(self.driver, 5)
-                products = wait.until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div[data-testid='default_container_ux4']"))
-                )
+                products = self.selectors.wait(self.driver, "card", 5, condition=EC.presence_of_all_elements_located)
                 logging.info(f"Total products found: {len(products)}")
 
                 missing_price = False
 
-                for idx, prod in enumerate(products, start=1):
+                # Score cards as they load and stop once the top results are settled
+                scanner = CardScanner(
+                    self.driver,
+                    lambda: self.driver.find_elements(By.CSS_SELECTOR, self.selectors.css("card")),
+                    logger=self.logger
+                )
+                for idx, prod in enumerate(scanner.cards(), start=1):
                     # --- Brand & Item Name ---
                     try:
-                        title_elem = prod.find_element(By.CSS_SELECTOR, "div.sc-aXZVg.kyEzVU._1sPB0")
+                        title_elem = self.selectors.find(prod, "title")
                         title_text = title_elem.text.strip()
                         if title_text:
                             parts = title_text.split()
@@ -119,14 +114,14 @@ class SwiggyScrapper:
 
                     # --- Packing ---
                     try:
-                        packing_elem = prod.find_element(By.CSS_SELECTOR, "div._3eIPt, div._1HYm8, div.entQHA")
+                        packing_elem = self.selectors.find(prod, "packing")
                         packing = packing_elem.text.strip()
                     except:
                         packing = "N/A"
 
                     # --- Price ---
                     try:
-                        price_elem = prod.find_element(By.CSS_SELECTOR, "div[data-testid='item-offer-price']")
+                        price_elem = self.selectors.find(prod, "price")
                         price = price_elem.text.strip()
                         if price.lower() == "n/a" or not price:
                             missing_price = True
@@ -136,7 +131,8 @@ class SwiggyScrapper:
 
                     # --- Relevance (brand + packing) ---
                     relevance = compute_relevance(self.user_input, brand,item_name, packing,logger=self.logger)
-                    logging.debug(f"Product {idx} relevance: {relevance}% (brand + packing)")
+                    logging.debug("Product %d relevance: %s%% (brand + packing)", idx, relevance, extra={"sampled": True})
+                    scanner.score(relevance)
 
                     product_data = {
                         "brand": brand,
@@ -149,12 +145,14 @@ class SwiggyScrapper:
                     if relevance >= 50:
                         filtered_products.append(product_data)
 
+                logging.info(f"Swiggy {scanner.summary()}")
+
                 # If any product missing price, refresh and retry
                 if missing_price and attempt < max_retries:
                     logging.warning(f"Missing price detected. Refreshing search and retrying attempt {attempt}/{max_retries}...")
                     self.driver.refresh()
                     time.sleep(2)
-                    self.search_product(self, self.user_input)
+                    self.search_product(self.user_input)
                     continue
 
                 # If no product has relevance >=50, take top 5
@@ -164,14 +162,16 @@ class SwiggyScrapper:
                 else:
                     filtered_products.sort(key=lambda x: x["relevance"], reverse=True)
 
+                # Nothing trimmed by relevance: a product missing from these results is not listed at all
+                self.last_complete = scanner.complete and len(filtered_products) == len(all_products)
+
                 # Save JSON to file
                 with open("results_swiggyinsta.json", "w", encoding="utf-8") as f:
                     json.dump(filtered_products, f, indent=4, ensure_ascii=False)
 
                 logging.info("Filtered products saved to results_swiggyinsta.json")
-                print("\nFiltered products JSON array (sorted by relevance):")
-                print(json.dumps(filtered_products, indent=4, ensure_ascii=False))
-                break  # success, exit retry loop
+                self.logger.debug(f"Filtered products (sorted by relevance): {len(filtered_products)}")
+                return filtered_products  # success, exit retry loop
 
             except TimeoutException:
                 logging.error(f"Timed out waiting for product containers. Attempt {attempt} of {max_retries}.")
@@ -179,7 +179,8 @@ class SwiggyScrapper:
                     logging.info("Refreshing page and retrying...")
                     self.driver.refresh()
                     time.sleep(2)
-                    self.search_product(self.driver, self.user_input)
+                    self.search_product(self.user_input)
                 else:
                     logging.critical("Max retries reached. Could not load products.")
-                    break
\ No newline at end of file
+                    self.last_failed = True
+                    return []
\ No newline at end of file
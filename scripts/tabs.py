@@ -0,0 +1,125 @@
+import logging
+import threading
+from drivers import create_driver, close_driver, apply_stealth
+
+
+class SharedBrowser:
+    """
+    One Chrome hosting a tab per store. WebDriver talks to one tab at a time, so every command
+    takes the lock and switches to its tab first; pages keep loading and rendering in parallel.
+    """
+    def __init__(self, headless=True, logger=None):
+        self.headless = headless
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = threading.RLock()
+        self.driver = None
+        self.active = None
+        self.tabs = {}
+        self.switches = 0
+
+    def tab(self, name):
+        """
+        A driver for a new tab, usable wherever a selenium driver is (StoreSession(driver=...)).
+        """
+        with self.lock:
+            if self.driver is None:
+                self.driver = create_driver(headless=self.headless, shared=True)
+                handle = self.driver.current_window_handle
+            else:
+                self.driver.switch_to.new_window("tab")
+                handle = self.driver.current_window_handle
+                if self.headless:
+                    apply_stealth(self.driver)
+            self.active = handle
+            self.tabs[name] = handle
+        self.logger.info(f"Opened {name} tab ({len(self.tabs)} tabs in the shared browser)")
+        return TabDriver(self, name, handle)
+
+    def activate(self, handle):
+        """
+        Make handle the tab WebDriver commands go to. Caller holds the lock.
+        """
+        if self.active != handle:
+            self.driver.switch_to.window(handle)
+            self.active = handle
+            self.switches += 1
+
+    def close_tab(self, name):
+        with self.lock:
+            handle = self.tabs.pop(name, None)
+            if handle is None or self.driver is None:
+                return
+            # The last tab stays open; closing it would end the browser before close()
+            if not self.tabs:
+                return
+            try:
+                self.activate(handle)
+                self.driver.close()
+            except Exception as e:
+                self.logger.warning(f"Could not close {name} tab: {e}")
+            self.active = None
+
+    def close(self):
+        with self.lock:
+            if self.driver:
+                self.logger.info(f"Closing shared browser ({self.switches} tab switches)")
+                close_driver(self.driver)
+            self.driver = None
+            self.tabs.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TabDriver:
+    """
+    Driver proxy bound to one tab. Methods and properties of the real driver run under the browser
+    lock after switching to this tab; elements it returns route their commands back through it.
+    """
+    def __init__(self, browser, name, handle):
+        self._browser = browser
+        self._name = name
+        self._handle = handle
+
+    def _adopt(self, value):
+        from selenium.webdriver.remote.webelement import WebElement
+
+        if isinstance(value, WebElement):
+            # WebElement commands go through its parent's execute(); make that this tab
+            value._parent = self
+        elif isinstance(value, list):
+            for item in value:
+                self._adopt(item)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._adopt(item)
+        return value
+
+    def __getattr__(self, name):
+        browser = self._browser
+        if isinstance(getattr(type(browser.driver), name, None), property):
+            with browser.lock:
+                browser.activate(self._handle)
+                return self._adopt(getattr(browser.driver, name))
+
+        attr = getattr(browser.driver, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with browser.lock:
+                browser.activate(self._handle)
+                return self._adopt(attr(*args, **kwargs))
+        return call
+
+    def quit(self):
+        """
+        Closing a store session closes its tab; the browser is closed by SharedBrowser.close().
+        """
+        self._browser.close_tab(self._name)
+
+    def close(self):
+        self.quit()
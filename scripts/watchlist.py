@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import signal
+import sqlite3
+import logging
+import argparse
+import tempfile
+import shutil
+from catalog import BASE_DIR, STORES, Catalog, record_scrape
+from normalizer import clean_text, parse_price
+from scutils import canonical_query
+from locations import location_key
+
+WATCHLIST_PATH = os.getenv("WATCHLIST_PATH", os.path.join(BASE_DIR, "watchlist.db"))
+
+# Base re-check interval; a watch with priority p is re-checked every interval / p seconds
+DEFAULT_INTERVAL = int(os.getenv("WATCHLIST_INTERVAL", 3 * 60 * 60))
+MAX_PRIORITY = 10
+# A store that did not answer is retried after this many seconds instead of the full interval
+RETRY_SECONDS = int(os.getenv("WATCHLIST_RETRY", 15 * 60))
+# Catalog rows scraped this recently (by a live search or prefetch) answer a re-check without a browser
+CATALOG_REUSE_SECONDS = int(os.getenv("WATCHLIST_CATALOG_REUSE", 15 * 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL,
+    store TEXT NOT NULL,
+    -- Delivery location key ('' = store default), see locations.location_key
+    location TEXT NOT NULL DEFAULT '',
+    brand TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    packing TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 1,
+    interval REAL NOT NULL,
+    next_check REAL NOT NULL,
+    last_checked REAL,
+    price TEXT,
+    price_paise INTEGER,
+    -- NULL until the first check
+    available INTEGER,
+    product_id INTEGER,
+    created_at REAL NOT NULL,
+    UNIQUE (store, location, brand, item_name, packing)
+);
+CREATE INDEX IF NOT EXISTS idx_watches_due ON watches(next_check);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    watch_id INTEGER NOT NULL REFERENCES watches(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,  -- 'price' or 'availability'
+    old_price TEXT,
+    new_price TEXT,
+    old_price_paise INTEGER,
+    new_price_paise INTEGER,
+    available INTEGER,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_watch ON events(watch_id, id);
+"""
+
+stop_requested = False
+
+
+def identity(product):
+    """
+    What makes a result row the watched product: brand, name and pack, compared case-insensitively.
+    """
+    return tuple(clean_text(product.get(key)).lower() for key in ("brand", "item_name", "packing"))
+
+
+class WatchList:
+    """
+    Watched (query, store, product) entries, their last known price and availability, and change events.
+    """
+    def __init__(self, path=None, logger=None):
+        self.path = path or WATCHLIST_PATH
+        self.logger = logger or logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- Entries ----------------
+    def add(self, query, store, brand, item_name, packing, location=None, priority=1, interval=DEFAULT_INTERVAL,
+            price=None):
+        """
+        Watch one store's product. Watching it again updates query, priority and interval. Returns the watch id.
+        price (as shown in the result the user picked) is the baseline for the first price event.
+        """
+        if store not in STORES:
+            raise ValueError(f"Unknown store '{store}'")
+        priority = min(max(int(priority), 1), MAX_PRIORITY)
+        price = clean_text(price) or None
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute(
+                """INSERT INTO watches (query, store, location, brand, item_name, packing, priority, interval,
+                                        next_check, price, price_paise, available, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (store, location, brand, item_name, packing) DO UPDATE SET
+                       query = excluded.query,
+                       priority = excluded.priority,
+                       interval = excluded.interval,
+                       next_check = MIN(next_check, excluded.next_check)
+                   RETURNING id""",
+                (canonical_query(query), store, location_key(location), clean_text(brand), clean_text(item_name),
+                 clean_text(packing), priority, float(interval), now, price, parse_price(price),
+                 1 if price else None, now)
+            ).fetchone()
+        return row["id"]
+
+    def remove(self, watch_id):
+        with self.conn:
+            return self.conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,)).rowcount == 1
+
+    def list(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM watches ORDER BY priority DESC, id")]
+
+    def events(self, since_id=0, limit=100):
+        return [dict(row) for row in self.conn.execute(
+            """SELECT e.*, w.store, w.location, w.brand, w.item_name, w.packing, w.query
+               FROM events e JOIN watches w ON w.id = e.watch_id
+               WHERE e.id > ? ORDER BY e.id LIMIT ?""",
+            (since_id, limit)
+        )]
+
+    # ---------------- Scheduling ----------------
+    def due(self, limit=50, now=None):
+        """
+        Watches whose re-check is due: highest priority first, then the longest overdue.
+        """
+        return [dict(row) for row in self.conn.execute(
+            "SELECT * FROM watches WHERE next_check <= ? ORDER BY priority DESC, next_check LIMIT ?",
+            (now or time.time(), limit)
+        )]
+
+    def postpone(self, watches, seconds=RETRY_SECONDS):
+        with self.conn:
+            self.conn.executemany("UPDATE watches SET next_check = ? WHERE id = ?",
+                                  [(time.time() + seconds, w["id"]) for w in watches])
+
+    def record_results(self, watches, products, complete=False, checked_at=None):
+        """
+        Update watches from one store's results for their query and return the change events.
+        Only the watched rows are read. Results are usually trimmed (relevance filter, early-stopped scans,
+        catalog rows), so a watched product missing from them keeps its last availability; it only becomes
+        unavailable when complete says the results list everything the store showed.
+        """
+        checked_at = checked_at or time.time()
+        found = {}
+        for product in products:
+            found.setdefault(identity(product), product)
+
+        events = []
+        with self.conn:
+            for watch in watches:
+                product = found.get(identity(watch))
+                available = 1 if product else (0 if complete else watch["available"])
+                # Unparseable prices ("N/A") keep the last known one
+                price, price_paise = watch["price"], watch["price_paise"]
+                if product and parse_price(product.get("price")) is not None:
+                    price = clean_text(product.get("price"))
+                    price_paise = parse_price(price)
+
+                changes = []
+                if watch["available"] is not None and available != watch["available"]:
+                    changes.append("availability")
+                if watch["price_paise"] is not None and price_paise != watch["price_paise"]:
+                    changes.append("price")
+                for kind in changes:
+                    event_id = self.conn.execute(
+                        "INSERT INTO events (watch_id, kind, old_price, new_price, old_price_paise, new_price_paise, "
+                        "available, at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (watch["id"], kind, watch["price"], price, watch["price_paise"], price_paise, available,
+                         checked_at)
+                    ).lastrowid
+                    events.append({"id": event_id, "watch_id": watch["id"], "kind": kind, "store": watch["store"],
+                                   "location": watch["location"], "brand": watch["brand"],
+                                   "item_name": watch["item_name"], "packing": watch["packing"],
+                                   "old_price": watch["price"], "new_price": price, "available": bool(available),
+                                   "at": checked_at})
+
+                self.conn.execute(
+                    "UPDATE watches SET price = ?, price_paise = ?, available = ?, product_id = COALESCE(?, product_id), "
+                    "last_checked = ?, next_check = ? WHERE id = ?",
+                    (price, price_paise, available, product.get("id") if product else None, checked_at,
+                     checked_at + watch["interval"] / watch["priority"], watch["id"])
+                )
+        return events
+
+
+# ---------------- Re-checks ----------------
+def group_by_session(watches):
+    """
+    {store: {(location, query): [watches]}}: one browser per store, one search per location and query.
+    """
+    groups = {}
+    for watch in watches:
+        groups.setdefault(watch["store"], {}).setdefault((watch["location"], watch["query"]), []).append(watch)
+    return groups
+
+
+def catalog_results(store, query, location):
+    """
+    The rows of the store's last scrape of this query when it is recent enough, else None.
+    """
+    with Catalog() as catalog:
+        scraped_at = catalog.last_scrape(query, store, location=location)
+        if scraped_at is None or time.time() - scraped_at > CATALOG_REUSE_SECONDS:
+            return None
+        # Full-text matches from other queries do not say whether this search still shows the product
+        return [p for p in catalog.lookup(query, max_age=CATALOG_REUSE_SECONDS, location=location)
+                if p["store"] == store and p["last_seen"] >= scraped_at]
+
+
+def check_store(watchlist, store, groups, headless=True, deadline=None):
+    """
+    Re-check every due watch of one store with a single browser, moving it between locations.
+    """
+    from stores import StoreSession
+
+    logger = logging.getLogger()
+    session, events, checked = None, [], 0
+    try:
+        # Group by location first so the browser moves as little as possible
+        for (location, query), watches in sorted(groups.items()):
+            if stop_requested or (deadline and time.time() >= deadline):
+                break
+            products = catalog_results(store, query, location)
+            # Catalog rows are the filtered results of an earlier scrape, never the full listing
+            complete = False
+            if products is not None:
+                logger.info(f"{store} '{query}' answered from the catalog for {len(watches)} watches")
+            else:
+                if session is None:
+                    session = StoreSession(store, headless=headless, logger=logger, location=location)
+                else:
+                    session.set_location(location)
+                products = session.search(query)
+                if not session.last_search_ran:
+                    logger.warning(f"{store} did not answer '{query}'; retrying in {RETRY_SECONDS}s")
+                    watchlist.postpone(watches)
+                    continue
+                ids = record_scrape(store, query, products, logger=logger, location=location)
+                products = [dict(p, id=pid) for p, pid in zip(products, ids)] if ids else products
+                complete = session.last_search_complete
+            events += watchlist.record_results(watches, products, complete=complete)
+            checked += len(watches)
+    finally:
+        if session:
+            session.close()
+    return checked, events
+
+
+def run_checks(limit=50, headless=True, max_runtime=15 * 60, stores=STORES):
+    deadline = time.time() + max_runtime
+    checked, events = 0, []
+    with WatchList() as watchlist:
+        due = [w for w in watchlist.due(limit) if w["store"] in stores]
+        for store, groups in group_by_session(due).items():
+            store_checked, store_events = check_store(watchlist, store, groups, headless=headless,
+                                                      deadline=deadline)
+            checked += store_checked
+            events += store_events
+    for event in events:
+        logging.info(f"Watch {event['watch_id']} {event['kind']} change: {event['store']} {event['brand']} "
+                     f"{event['item_name']} {event['packing']} {event['old_price']} -> {event['new_price']}"
+                     + ("" if event["available"] else " (unavailable)"))
+    logging.info(f"Watchlist run finished: {checked} of {len(due)} due watches checked, {len(events)} changes")
+    return {"due": len(due), "checked": checked, "events": events}
+
+
+def handle_stop(sig=None, frame=None):
+    global stop_requested
+    stop_requested = True
+    # Unwinds the running search; check_store's finally closes the browser
+    raise SystemExit(0)
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Watched products and their incremental re-checks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("add", help="Watch a product (JSON on stdin)")
+    remove_parser = sub.add_parser("remove", help="Stop watching")
+    remove_parser.add_argument("--id", type=int, required=True)
+    sub.add_parser("list", help="Print all watches")
+    events_parser = sub.add_parser("events", help="Print change events")
+    events_parser.add_argument("--since", type=int, default=0, help="Only events with a larger id")
+    events_parser.add_argument("--limit", type=int, default=100)
+    check_parser = sub.add_parser("check", help="Re-check the watches that are due")
+    check_parser.add_argument("--limit", type=int, default=50, help="Most watches re-checked per run")
+    check_parser.add_argument("--max-runtime", type=int, default=15 * 60, help="Wall-clock budget in seconds")
+    check_parser.add_argument("--stores", type=str, default=",".join(STORES), help="Comma-separated stores")
+    check_parser.add_argument("--headless", action="store_true", help="Run Chrome in headless mode")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        signal.signal(signal.SIGINT, handle_stop)
+        signal.signal(signal.SIGTERM, handle_stop)
+        # Scrapers write results_*.json into the cwd; keep them out of the caller's directory
+        workdir = tempfile.mkdtemp(prefix="smartcart-watchlist-")
+        os.chdir(workdir)
+        try:
+            result = run_checks(limit=args.limit, headless=args.headless, max_runtime=args.max_runtime,
+                                stores=[s.strip() for s in args.stores.split(",") if s.strip()])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(result, ensure_ascii=False))
+        sys.exit(0)
+
+    with WatchList() as watchlist:
+        if args.command == "add":
+            entry = json.load(sys.stdin)
+            try:
+                watch_id = watchlist.add(
+                    entry.get("query") or f"{entry.get('brand', '')} {entry.get('item_name', '')}",
+                    entry.get("store"), entry.get("brand", ""), entry.get("item_name", ""),
+                    entry.get("packing", ""), location=entry.get("location"), priority=entry.get("priority", 1),
+                    interval=entry.get("interval", DEFAULT_INTERVAL), price=entry.get("price"))
+            except (TypeError, ValueError) as e:
+                print(json.dumps({"error": str(e)}))
+                sys.exit(0)
+            print(json.dumps({"id": watch_id}))
+        elif args.command == "remove":
+            print(json.dumps({"removed": watchlist.remove(args.id)}))
+        elif args.command == "list":
+            print(json.dumps({"watches": watchlist.list()}, ensure_ascii=False))
+        elif args.command == "events":
+            print(json.dumps({"events": watchlist.events(args.since, args.limit)}, ensure_ascii=False))
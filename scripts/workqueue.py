@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+from catalog import BASE_DIR
+from scutils import canonical_query
+from locations import location_key
+
+# Any host that can open this file can lease work. On a network share use QUEUE_JOURNAL_MODE=DELETE (WAL needs one host).
+QUEUE_PATH = os.getenv("QUEUE_PATH", os.path.join(BASE_DIR, "queue.db"))
+QUEUE_JOURNAL_MODE = os.getenv("QUEUE_JOURNAL_MODE", "WAL")
+
+# A leased job not completed or heartbeated within this many seconds goes back to the queue
+DEFAULT_VISIBILITY = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT", 180))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+RETRY_BASE_SECONDS = 5
+FINISHED = ("done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    store TEXT NOT NULL,
+    query TEXT NOT NULL,
+    -- Delivery location key ('' = store default), see locations.location_key
+    location TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, store, not_before);
+CREATE INDEX IF NOT EXISTS idx_jobs_query ON jobs(query, store, status);
+"""
+SCHEMA_VERSION = 1
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Durable per-store scrape jobs with leases, visibility timeouts, retries and stored results.
+    """
+    def __init__(self, path=None, logger=None):
+        self.path = path or QUEUE_PATH
+        self.logger = logger or logging.getLogger(__name__)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA journal_mode={QUEUE_JOURNAL_MODE}")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+
+    def migrate(self):
+        """
+        Upgrade queue files created before jobs carried a location (PRAGMA user_version 0).
+        """
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "location" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN location TEXT NOT NULL DEFAULT ''")
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same job
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    # ---------------- Producers ----------------
+    def enqueue(self, store, search_input, max_attempts=DEFAULT_MAX_ATTEMPTS, location=None):
+        """
+        Queue a scrape of one store for one query (at one delivery location).
+        An identical job already waiting or running is reused. Returns the job id.
+        """
+        query = canonical_query(search_input)
+        loc = location_key(location)
+        now = time.time()
+        self._transaction()
+        try:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE query = ? AND store = ? AND location = ? AND status IN ('queued', 'leased')",
+                (query, store, loc)
+            ).fetchone()
+            if row:
+                job_id = row["id"]
+            else:
+                job_id = self.conn.execute(
+                    "INSERT INTO jobs (store, query, location, max_attempts, not_before, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (store, query, loc, max_attempts, now, now, now)
+                ).lastrowid
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def get(self, job_ids):
+        if not job_ids:
+            return {}
+        marks = ",".join("?" * len(job_ids))
+        rows = self.conn.execute(f"SELECT * FROM jobs WHERE id IN ({marks})", list(job_ids)).fetchall()
+        return {row["id"]: self._to_job(row) for row in rows}
+
+    def wait(self, job_ids, timeout, poll=0.5):
+        """
+        Block until every job is done or failed, or until timeout. Returns the latest state of each job.
+        """
+        deadline = time.time() + timeout
+        while True:
+            jobs = self.get(job_ids)
+            if all(job["status"] in FINISHED for job in jobs.values()) or time.time() >= deadline:
+                return jobs
+            time.sleep(poll)
+
+    # ---------------- Workers ----------------
+    def lease(self, owner, stores=None, visibility=DEFAULT_VISIBILITY):
+        """
+        Claim the oldest ready job (optionally only for some stores). Expired leases count as failed attempts.
+        Returns the job or None.
+        """
+        now = time.time()
+        store_filter, params = "", []
+        if stores:
+            store_filter = f"AND store IN ({','.join('?' * len(stores))})"
+            params = list(stores)
+
+        self._transaction()
+        try:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired', lease_owner = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = self.conn.execute(
+                f"""
+                UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?,
+                                lease_expires = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE ((status = 'queued' AND not_before <= ?) OR (status = 'leased' AND lease_expires < ?))
+                    {store_filter}
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING *
+                """,
+                [owner, now + visibility, now, now, now] + params
+            ).fetchone()
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self._to_job(row) if row else None
+
+    def heartbeat(self, job_id, owner, visibility=DEFAULT_VISIBILITY):
+        """
+        Extend a lease. Returns False when the lease was lost (expired and taken by another worker).
+        """
+        cur = self.conn.execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+            (time.time() + visibility, time.time(), job_id, owner)
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id, owner, result):
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_owner = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, owner)
+        )
+        if cur.rowcount != 1:
+            self.logger.warning(f"Job {job_id} result dropped: lease no longer held by {owner}")
+        return cur.rowcount == 1
+
+    def fail(self, job_id, owner, error):
+        """
+        Release a job after an error: requeue with exponential backoff, or fail it for good after max_attempts.
+        Guarded like complete(), so a worker whose lease expired cannot touch a job another worker now holds.
+        """
+        now = time.time()
+        cur = self.conn.execute(
+            """
+            UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                            error = ?, lease_owner = NULL, lease_expires = NULL,
+                            not_before = CASE WHEN attempts >= max_attempts THEN not_before
+                                              ELSE ? + ? * (1 << (attempts - 1)) END,
+                            updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            """,
+            (str(error), now, RETRY_BASE_SECONDS, now, job_id, owner)
+        )
+        if cur.rowcount != 1:
+            self.logger.warning(f"Job {job_id} failure dropped: lease no longer held by {owner}")
+        return cur.rowcount == 1
+
+    # ---------------- Maintenance ----------------
+    def purge(self, older_than=24 * 60 * 60):
+        cur = self.conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - older_than,)
+        )
+        return cur.rowcount
+
+    def stats(self):
+        counts = {row["status"]: row["n"] for row in
+                  self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        oldest = self.conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "leased": counts.get("leased", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="SmartCart scrape work queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Print job counts by status")
+    purge_parser = sub.add_parser("purge", help="Delete finished jobs")
+    purge_parser.add_argument("--older-than", type=int, default=24 * 60 * 60, help="Seconds")
+    args = parser.parse_args()
+
+    with WorkQueue() as wq:
+        if args.command == "stats":
+            print(json.dumps(wq.stats()))
+        elif args.command == "purge":
+            logging.info(f"Purged {wq.purge(args.older_than)} finished jobs")
+    sys.exit(0)
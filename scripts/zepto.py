@@ -8,24 +8,24 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException, NoSuchElementException, TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from scutils import compute_relevance
+from scutils import compute_relevance, StoreScrapper
+from hydration import hydrated_products
+from scanning import CardScanner
 import time
 import json
 import random
 
 
-class ZeptoScrapper:
+class ZeptoScrapper(StoreScrapper):
     def __init__(self, logger, driver):
-        self.logger = logger or logging.getLogger(__name__)
-        self.driver = driver
+        super().__init__(logger, driver)
         
 
     # ---------------- Open BigBasket ----------------
     # ---------------- Open BigBasket with Enhanced Anti-Detection ----------------
-    def open_zepto(self, url="https://www.zeptonow.com/search"):
-        max_retries = 3
+    def open_zepto(self, url="https://www.zeptonow.com/search", max_retries=3):
         for attempt in range(1, max_retries + 1):
+            self.last_attempts = attempt
             try:
                 self.logger.debug(f"Attempt {attempt}: Opening {url}")
                 
@@ -68,7 +68,6 @@ class ZeptoScrapper:
         self.search_inp = search_inp
         try:
             self.logger.debug(f"Searching for product: {search_inp}")
-            self.driver.save_screenshot("zeptonow-ss.png")
             search_box = WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located(
                     (By.CSS_SELECTOR, "input[placeholder='Search for over 5000 products']")
@@ -109,7 +108,6 @@ class ZeptoScrapper:
             result_text = result_text_elem.text.strip()
 
             self.logger.info(f"Search Results: {count_text} {result_text}")
-            print(f"\nTotal Products Found: {count_text} {result_text}\n")
 
         except TimeoutException:
             self.logger.error("Timed out waiting for search results.")
@@ -120,144 +118,148 @@ class ZeptoScrapper:
         try:
             self.logger.debug("Extracting product details...")
 
-            first_card = WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "li[class*='PaginateItems']"))
-            )
-
-            container = first_card.find_element(By.XPATH, "..")
-            children = container.find_elements(By.XPATH, "./*")
-
-            for child in children:
-                child_class = child.get_attribute("class") or ""
+            # Embedded page state has every pack variant and price without clicking PackChangers
+            hydrated = hydrated_products(self.driver, self.search_inp, price_divisor=100, logger=self.logger)
+            if hydrated is not None:
+                products = [dict(p, relevance=compute_relevance(self.search_inp, p["brand"], p["item_name"], '', logger=self.logger))
+                            for p in hydrated]
+                products = [p for p in products if p["relevance"] >= 30]
+                if not products:
+                    self.logger.debug("No hydrated product is relevant; using DOM extraction")
+            if not products:
+                first_card = WebDriverWait(self.driver, 15).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "li[class*='PaginateItems']"))
+                )
 
-                if "PaginateItems" in child_class:
-                    card = child
-                    spans = card.find_elements(By.TAG_NAME, "span")
-                    unavailable = any(
-                        sp.text.strip() == "Currently unavailable" and "Tags___StyledLabel2" in (sp.get_attribute("outerHTML") or "")
-                        for sp in spans
-                    )
-                    if unavailable:
-                        continue
+                container = first_card.find_element(By.XPATH, "..")
+                # Cards are scored as they load (scrolling for more); scanning stops once the top results settle
+                scanner = CardScanner(self.driver, lambda: container.find_elements(By.XPATH, "./*"),
+                                      logger=self.logger)
+
+                for child in scanner.cards():
+                    child_class = child.get_attribute("class") or ""
+
+                    if "PaginateItems" in child_class:
+                        card = child
+                        spans = card.find_elements(By.TAG_NAME, "span")
+                        unavailable = any(
+                            sp.text.strip() == "Currently unavailable" and "Tags___StyledLabel2" in (sp.get_attribute("outerHTML") or "")
+                            for sp in spans
+                        )
+                        if unavailable:
+                            continue
 
-                    try:
-                        brand = card.find_element(By.CSS_SELECTOR, "span[class*='BrandName___StyledLabel2']").text.strip()
-                    except:
-                        brand = ""
-                    try:
-                        item_name = card.find_element(By.CSS_SELECTOR, "h3.block.m-0.line-clamp-2").text.strip()
-                    except:
-                        item_name = ""
+                        try:
+                            brand = card.find_element(By.CSS_SELECTOR, "span[class*='BrandName___StyledLabel2']").text.strip()
+                        except:
+                            brand = ""
+                        try:
+                            item_name = card.find_element(By.CSS_SELECTOR, "h3.block.m-0.line-clamp-2").text.strip()
+                        except:
+                            item_name = ""
 
 
-                    # Calculate relevance (brand + item only)
-                    relevance = compute_relevance(self.search_inp, brand, item_name, '',logger=self.logger)
+                        # Calculate relevance (brand + item only)
+                        relevance = compute_relevance(self.search_inp, brand, item_name, '',logger=self.logger)
+                        scanner.score(relevance)
 
-                    if relevance >= 30:
+                        if relevance >= 30:
 
-                        # --- Updated Packing Logic ---
+                            # --- Updated Packing Logic ---
 
-                        # --- If PackSelector dropdown exists, click and fetch PackChanger options ---
+                            # --- If PackSelector dropdown exists, click and fetch PackChanger options ---
                         
-                        try:
-                            pack_button = card.find_element(By.CSS_SELECTOR, "button[class*='Button'][class*='PackChanger']")
-                            self.driver.execute_script("arguments[0].click();", pack_button)  # safer than .click()
-                            time.sleep(1)  # wait for popup to appear
-                            print(f"PackChanger button found for {item_name} and clicked.")
                             try:
-                                popup_ul = self.driver.find_element(By.CSS_SELECTOR, '[id*="headlessui-listbox-options"]')
-                                print("Popup UL found ✅")
-                                # Get all LI children havinf div as child of that UL 
-                                li_elements = popup_ul.find_elements(By.CSS_SELECTOR, 'li > div')
-                            except NoSuchElementException:
-                                print("Popup UL not found ❌")
+                                pack_button = card.find_element(By.CSS_SELECTOR, "button[class*='Button'][class*='PackChanger']")
+                                self.driver.execute_script("arguments[0].click();", pack_button)  # safer than .click()
+                                time.sleep(1)  # wait for popup to appear
+                                self.logger.debug("PackChanger button found for %s and clicked.", item_name, extra={"sampled": True})
+                                try:
+                                    popup_ul = self.driver.find_element(By.CSS_SELECTOR, '[id*="headlessui-listbox-options"]')
+                                    # Get all LI children havinf div as child of that UL 
+                                    li_elements = popup_ul.find_elements(By.CSS_SELECTOR, 'li > div')
+                                except NoSuchElementException:
+                                    self.logger.debug("Popup UL not found", extra={"sampled": True})
                             
 
-                            print(f"Found {len(li_elements)} li children (packing) for {item_name}")
-                            for li in li_elements:
-                                try:
-                                    # Find first div child with class 'packChanger' inside li
-                                    parent_div = li.find_element(By.CSS_SELECTOR, "div:first-child")
+                                self.logger.debug("Found %d li children (packing) for %s", len(li_elements), item_name, extra={"sampled": True})
+                                for li in li_elements:
+                                    try:
+                                        # Find first div child with class 'packChanger' inside li
+                                        parent_div = li.find_element(By.CSS_SELECTOR, "div:first-child")
                                 
-                                    packing_div = parent_div.find_element(By.CSS_SELECTOR, "div:first-child")
+                                        packing_div = parent_div.find_element(By.CSS_SELECTOR, "div:first-child")
                                     
-                                    print("Packing : ", packing_div.get_attribute("innerHTML"))
-                                    packing = packing_div.get_attribute("innerHTML")
-
-                                    price_div = li.find_element(By.CSS_SELECTOR, "div:nth-child(2)")
-                                    '''print("Tag:", price_div.tag_name)
-                                    print("Class:", price_div.get_attribute('class'))
-                                    print("Outer HTML:", price_div.get_attribute('outerHTML'))
-                                    print("Inner HTML:", price_div.get_attribute('innerHTML'))
-                                    print("Text:", price_div.text)'''
-
+                                        packing = packing_div.get_attribute("innerHTML")
 
-                                    price_span = price_div.find_element(By.CSS_SELECTOR, "div span:nth-of-type(2)")
+                                        price_div = li.find_element(By.CSS_SELECTOR, "div:nth-child(2)")
+                                        price_span = price_div.find_element(By.CSS_SELECTOR, "div span:nth-of-type(2)")
                                     
-                                    print("Price : ", price_span.get_attribute("innerHTML"))
-                                    price = price_span.get_attribute("innerHTML")
+                                        price = price_span.get_attribute("innerHTML")
+                                        self.logger.debug("Variant packing=%s price=%s", packing, price, extra={"sampled": True})
 
-                                    products.append({
-                                        "brand": brand,
-                                        "item_name": item_name,
-                                        "packing": packing,
-                                        "price": price,
-                                        "relevance": relevance
-                                    })
+                                        products.append({
+                                            "brand": brand,
+                                            "item_name": item_name,
+                                            "packing": packing,
+                                            "price": price,
+                                            "relevance": relevance
+                                        })
 
                                     
-                                except:
-                                    print("packing/price details div not found ❌")
-                                    # skip if structure not found
-                                    continue
-                        except NoSuchElementException:
-                            print("PackChanger button not found")
-                            try:
-                                # Try PackChanger first
-                                packing = card.find_element(
-                                    By.CSS_SELECTOR,
-                                    "span.PackChanger___StyledLabel-sc-newjpv-1"
-                                ).text.strip()
+                                    except:
+                                        self.logger.debug("packing/price details div not found", extra={"sampled": True})
+                                        # skip if structure not found
+                                        continue
                             except NoSuchElementException:
-                                # Fallback to PackSelector
-                                packing = card.find_element(
-                                    By.CSS_SELECTOR,
-                                    "span.PackSelector___StyledLabel-sc-1lmu4hv-0 span.Label-sc-15v1nk5-0.gJxZPQ"
-                                ).text.strip()
-                                print("Packing from PackSelector could not be extracted: ")
+                                self.logger.debug("PackChanger button not found", extra={"sampled": True})
+                                try:
+                                    # Try PackChanger first
+                                    packing = card.find_element(
+                                        By.CSS_SELECTOR,
+                                        "span.PackChanger___StyledLabel-sc-newjpv-1"
+                                    ).text.strip()
+                                except NoSuchElementException:
+                                    # Fallback to PackSelector
+                                    packing = card.find_element(
+                                        By.CSS_SELECTOR,
+                                        "span.PackSelector___StyledLabel-sc-1lmu4hv-0 span.Label-sc-15v1nk5-0.gJxZPQ"
+                                    ).text.strip()
+                                    self.logger.debug("Packing taken from PackSelector", extra={"sampled": True})
                                 
 
-                        try:
-                            price_container = card.find_element(By.CSS_SELECTOR, "div.Pricing___StyledDiv-sc-pldi2d-0")
-                            price = price_container.find_element(By.CSS_SELECTOR, "span:first-child").text.strip()
-                        except:
-                            price = ""
+                            try:
+                                price_container = card.find_element(By.CSS_SELECTOR, "div.Pricing___StyledDiv-sc-pldi2d-0")
+                                price = price_container.find_element(By.CSS_SELECTOR, "span:first-child").text.strip()
+                            except:
+                                price = ""
 
-                        if not price or price.lower() in ["null", "undefined"]:
-                            self.logger.info(f"Skipping '{item_name}' because price is missing or invalid.")
-                            continue
+                            if not price or price.lower() in ["null", "undefined"]:
+                                self.logger.info(f"Skipping '{item_name}' because price is missing or invalid.")
+                                continue
 
                         
 
-                        products.append({
-                            "brand": brand,
-                            "item_name": item_name,
-                            "packing": packing,
-                            "price": price,
-                            "relevance": relevance
-                        })
-                    else:
-                        self.logger.info(f"Skipping '{item_name}' due to low relevance ({relevance}%)")
+                            products.append({
+                                "brand": brand,
+                                "item_name": item_name,
+                                "packing": packing,
+                                "price": price,
+                                "relevance": relevance
+                            })
+                        else:
+                            self.logger.debug("Skipping '%s' due to low relevance (%s%%)", item_name, relevance, extra={"sampled": True})
 
 
 
                     
 
-                else:
-                    p_elements = child.find_elements(By.TAG_NAME, "p")
-                    if any("more items from" in (p.text or "").lower() or "more items from" in (p.get_attribute("outerHTML") or "").lower() for p in p_elements):
-                        self.logger.info("Encountered 'More items from' separator. Stopping scraping further items.")
-                        break
+                    else:
+                        p_elements = child.find_elements(By.TAG_NAME, "p")
+                        if any("more items from" in (p.text or "").lower() or "more items from" in (p.get_attribute("outerHTML") or "").lower() for p in p_elements):
+                            self.logger.info("Encountered 'More items from' separator. Stopping scraping further items.")
+                            break
+                self.logger.info(f"Zepto {scanner.summary()}")
 
             # --- Relevance filtering ---
             filtered_products = [p for p in products if p["relevance"] >= 50]
@@ -283,13 +285,13 @@ class ZeptoScrapper:
                     seen_tuples.add(item_tuple)
 
 
-            with open("results_bigbasket.json", "w", encoding="utf-8") as f:
+            with open("results_zepto.json", "w", encoding="utf-8") as f:
                 json.dump(unique_products, f, indent=4, ensure_ascii=False)
-            self.logger.info(f"Saved {len(unique_products)} unique products to 'results_bigbasket.json'")
+            self.logger.info(f"Saved {len(unique_products)} unique products to 'results_zepto.json'")
 
         except TimeoutException:
             self.logger.error("Timed out waiting for product cards.")
         except Exception:
-            self.logger.exception("exception in extracting bigbasket for product cards." )
-        logging.info(f"Scraped {len(products)} products on bigbasket.")
+            self.logger.exception("exception in extracting zepto for product cards." )
+        logging.info(f"Scraped {len(products)} products on zepto.")
         return products
\ No newline at end of file
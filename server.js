@@ -1,11 +1,12 @@
 const express = require('express');
-const { spawn } = require('child_process');
+const { spawn, execFileSync } = require('child_process');
 const path = require('path');
 const cors = require('cors');
 const winston = require('winston');
 const DailyRotateFile = require('winston-daily-rotate-file');
 const morgan = require('morgan');
 const fs = require('fs');
+const crypto = require('crypto');
 
 // Create logs directory if it doesn't exist
 const logsDir = path.join(__dirname, 'logs');
@@ -77,6 +78,9 @@ app.use(morgan(':id :method :url :status :res[content-length] - :response-time m
 app.use(express.json({ limit: '10mb' }));
 app.use(cors({ origin: process.env.CORS_ORIGIN || true, credentials: true }));
 
+// Live searches in flight; the prefetcher only runs when this is zero
+let activeSearches = 0;
+
 // ----------------- Routes -----------------
 app.get('/', (req, res) => {
     const htmlPath = path.join(__dirname, 'public', 'index.html');
@@ -89,9 +93,11 @@ app.get('/', (req, res) => {
 app.post('/api/search', async (req, res) => {
     const requestId = req.id;
     deleteJsonFiles('./');
+    activeSearches += 1;
+    stopPrefetch();
     try {
 
-        const { query } = req.body;
+        const { query, sortBy, refresh, location } = req.body;
          logger.info(`Search input is : ${query}`, { requestId });
 
         if (!query || typeof query !== 'string' || query.trim().length === 0) {
@@ -101,7 +107,19 @@ app.post('/api/search', async (req, res) => {
             });
         }
 
-        const parsedData = await callPythonScript(query, requestId);
+        if (sortBy !== undefined && !['relevance', 'unit_price'].includes(sortBy)) {
+            return res.status(400).json({
+                error: "sortBy must be either 'relevance' or 'unit_price'",
+                requestId
+            });
+        }
+
+        if (location !== undefined && !isValidLocation(location)) {
+            return res.status(400).json({ error: LOCATION_ERROR, requestId });
+        }
+
+        const parsedData = await callPythonScript(query, requestId, sortBy, refresh === true, location);
+        keepRankedResult(query, parsedData, sortBy || 'relevance');
 
         res.json({
             success: true,
@@ -120,6 +138,440 @@ app.post('/api/search', async (req, res) => {
             requestId,
             timestamp: new Date().toISOString()
         });
+    } finally {
+        activeSearches -= 1;
+    }
+});
+
+// Delivery location: a 6-digit pincode known to scripts/locations.py, or "lat,lon"
+const LOCATION_ERROR = "location must be a pincode known to scripts/locations.py (or LOCATIONS_FILE) or 'lat,lon'";
+
+// Read once at startup so an unknown pincode is a 400 here instead of a failed scrape
+const KNOWN_PINCODES = loadKnownPincodes();
+
+function loadKnownPincodes() {
+    try {
+        const output = execFileSync('python3', [path.join(__dirname, 'scripts', 'locations.py'), '--list'],
+            { timeout: 30 * 1000 });
+        return new Set(Object.keys(JSON.parse(output.toString())));
+    } catch (err) {
+        logger.error(`Could not load known pincodes, accepting any 6-digit pincode: ${err.message}`);
+        return null;
+    }
+}
+
+function isValidLocation(location) {
+    if (typeof location !== 'string') {
+        return false;
+    }
+    if (/^\d{6}$/.test(location)) {
+        return KNOWN_PINCODES === null || KNOWN_PINCODES.has(location);
+    }
+    const match = location.match(/^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$/);
+    return match !== null && Math.abs(Number(match[1])) <= 90 && Math.abs(Number(match[2])) <= 180;
+}
+
+// ----------------- Ranked Results -----------------
+// The comparator returns every ranked row; /api/search answers with the top rows plus a cursor, and the rest
+// is paged (or re-sorted) from memory for as long as the catalog would serve the search without a scrape
+const RESULT_TTL_MS = Number(process.env.SEARCH_RESULT_TTL_SECONDS || process.env.CATALOG_MAX_AGE || 6 * 60 * 60) * 1000;
+const RESULT_CACHE_SIZE = Number(process.env.SEARCH_RESULT_CACHE_SIZE || 200);
+const RESULT_SORTS = ['relevance', 'price', 'unit_price', 'store'];
+const RESULT_PAGE_SIZE = 20;
+const RESULT_MAX_PAGE_SIZE = 100;
+// Insertion-ordered, so the first key is always the least recently used
+const rankedResults = new Map();
+
+function encodeCursor(state) {
+    return Buffer.from(JSON.stringify(state)).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+    try {
+        const state = JSON.parse(Buffer.from(String(cursor), 'base64url').toString('utf-8'));
+        const valid = typeof state.id === 'string' && RESULT_SORTS.includes(state.sort) &&
+            Number.isInteger(state.offset) && state.offset >= 0 &&
+            Number.isInteger(state.limit) && state.limit >= 1 && state.limit <= RESULT_MAX_PAGE_SIZE;
+        return valid ? state : null;
+    } catch (err) {
+        return null;
+    }
+}
+
+// Move the full ranking out of the search response into the cache; the response keeps its top rows
+function keepRankedResult(query, data, sortBy) {
+    if (!data || !Array.isArray(data.all_rows)) {
+        return;
+    }
+    const { all_rows: rows, orders } = data;
+    delete data.all_rows;
+    delete data.orders;
+    if (!orders || !rows.length) {
+        return;
+    }
+
+    const id = crypto.randomUUID();
+    rankedResults.set(id, { query, location: data.location, rows, orders, expires: Date.now() + RESULT_TTL_MS });
+    while (rankedResults.size > RESULT_CACHE_SIZE) {
+        rankedResults.delete(rankedResults.keys().next().value);
+    }
+
+    const shown = (data.rows || []).length;
+    data.resultId = id;
+    data.nextCursor = shown < rows.length ?
+        encodeCursor({ id, sort: sortBy, offset: shown, limit: RESULT_PAGE_SIZE }) : null;
+}
+
+function getRankedResult(id) {
+    const entry = rankedResults.get(id);
+    if (!entry) {
+        return null;
+    }
+    rankedResults.delete(id);
+    if (entry.expires <= Date.now()) {
+        return null;
+    }
+    rankedResults.set(id, entry);
+    return entry;
+}
+
+// Next page of a search: ?cursor=<nextCursor>, or ?resultId=...&sortBy=...&limit=... to start over in another order
+app.get('/api/search/results', (req, res) => {
+    const requestId = req.id;
+    const { cursor, resultId, sortBy, limit } = req.query;
+
+    let state;
+    if (cursor !== undefined) {
+        state = decodeCursor(cursor);
+        if (!state) {
+            return res.status(400).json({ error: 'Invalid cursor', requestId });
+        }
+    } else {
+        const pageSize = limit === undefined ? RESULT_PAGE_SIZE : Number(limit);
+        if (!resultId) {
+            return res.status(400).json({ error: 'Provide cursor, or resultId (plus sortBy and limit)', requestId });
+        }
+        if (sortBy !== undefined && !RESULT_SORTS.includes(sortBy)) {
+            return res.status(400).json({ error: `sortBy must be one of ${RESULT_SORTS.join(', ')}`, requestId });
+        }
+        if (!Number.isInteger(pageSize) || pageSize < 1 || pageSize > RESULT_MAX_PAGE_SIZE) {
+            return res.status(400).json({ error: `limit must be an integer between 1 and ${RESULT_MAX_PAGE_SIZE}`, requestId });
+        }
+        state = { id: String(resultId), sort: sortBy || 'relevance', offset: 0, limit: pageSize };
+    }
+
+    const entry = getRankedResult(state.id);
+    if (!entry) {
+        return res.status(404).json({ error: 'Search result expired or unknown; run the search again', requestId });
+    }
+
+    const order = entry.orders[state.sort] || [];
+    const end = Math.min(state.offset + state.limit, order.length);
+    res.json({
+        success: true,
+        query: entry.query,
+        location: entry.location,
+        resultId: state.id,
+        sortBy: state.sort,
+        offset: state.offset,
+        total: order.length,
+        rows: order.slice(state.offset, end).map((i) => entry.rows[i]),
+        nextCursor: end < order.length ? encodeCursor({ ...state, offset: end }) : null,
+        requestId
+    });
+});
+
+// Shopping lists: one browser session per store, results streamed as NDJSON
+const MAX_BATCH_QUERIES = Number(process.env.MAX_BATCH_QUERIES || 50);
+
+app.post('/api/search/batch', (req, res) => {
+    const requestId = req.id;
+    const { queries, sortBy, refresh, location } = req.body;
+
+    if (!Array.isArray(queries) || queries.length === 0 ||
+        !queries.every(q => typeof q === 'string' && q.trim().length > 0)) {
+        return res.status(400).json({
+            error: 'queries must be a non-empty array of non-empty strings',
+            requestId
+        });
+    }
+    if (queries.length > MAX_BATCH_QUERIES) {
+        return res.status(400).json({
+            error: `At most ${MAX_BATCH_QUERIES} queries are allowed per batch`,
+            requestId
+        });
+    }
+    if (sortBy !== undefined && !['relevance', 'unit_price'].includes(sortBy)) {
+        return res.status(400).json({
+            error: "sortBy must be either 'relevance' or 'unit_price'",
+            requestId
+        });
+    }
+    if (location !== undefined && !isValidLocation(location)) {
+        return res.status(400).json({ error: LOCATION_ERROR, requestId });
+    }
+
+    logger.info(`Batch search input is : ${JSON.stringify(queries)}`, { requestId });
+    activeSearches += 1;
+    stopPrefetch();
+
+    res.status(200);
+    res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.flushHeaders();
+
+    const finished = callBatchScript(queries, requestId, sortBy, refresh === true, (record) => {
+        res.write(JSON.stringify({ ...record, requestId }) + '\n');
+    }, location);
+
+    finished
+        .catch((error) => {
+            logger.error(`Batch search failed: ${error.message}`, { requestId });
+            res.write(JSON.stringify({ type: 'error', error: 'Batch search failed', requestId }) + '\n');
+        })
+        .finally(() => {
+            activeSearches -= 1;
+            res.end();
+        });
+});
+
+// Regional price monitoring: one query at many locations, one shared browser per store, NDJSON per location
+const MAX_FANOUT_LOCATIONS = Number(process.env.MAX_FANOUT_LOCATIONS || 20);
+
+app.post('/api/search/locations', (req, res) => {
+    const requestId = req.id;
+    const { query, locations, sortBy, refresh, browsersPerStore } = req.body;
+
+    if (!query || typeof query !== 'string' || query.trim().length === 0) {
+        return res.status(400).json({
+            error: 'Query parameter is required and must be a non-empty string',
+            requestId
+        });
+    }
+    if (!Array.isArray(locations) || locations.length === 0 || !locations.every(isValidLocation)) {
+        return res.status(400).json({
+            error: `locations must be a non-empty array; each ${LOCATION_ERROR.replace('location must be ', '')}`,
+            requestId
+        });
+    }
+    if (locations.length > MAX_FANOUT_LOCATIONS) {
+        return res.status(400).json({
+            error: `At most ${MAX_FANOUT_LOCATIONS} locations are allowed per search`,
+            requestId
+        });
+    }
+    if (sortBy !== undefined && !['relevance', 'unit_price'].includes(sortBy)) {
+        return res.status(400).json({
+            error: "sortBy must be either 'relevance' or 'unit_price'",
+            requestId
+        });
+    }
+    if (browsersPerStore !== undefined && !(Number.isInteger(browsersPerStore) && browsersPerStore >= 1)) {
+        return res.status(400).json({ error: 'browsersPerStore must be a positive integer', requestId });
+    }
+
+    logger.info(`Location fan-out for ${query}: ${JSON.stringify(locations)}`, { requestId });
+    activeSearches += 1;
+    stopPrefetch();
+
+    res.status(200);
+    res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.flushHeaders();
+
+    const args = ['--headless', '--product', query, '--locations', JSON.stringify(locations),
+        '--sort-by', sortBy || 'relevance', '--browsers-per-store', String(browsersPerStore || 1)];
+    if (refresh === true) {
+        args.push('--refresh');
+    }
+    const timeoutMs = (5 + locations.length) * 60 * 1000;
+
+    streamPythonNdjson('fanout.py', args, null, requestId, timeoutMs, (record) => {
+        res.write(JSON.stringify({ ...record, requestId }) + '\n');
+    })
+        .catch((error) => {
+            logger.error(`Location fan-out failed: ${error.message}`, { requestId });
+            res.write(JSON.stringify({ type: 'error', error: 'Location fan-out failed', requestId }) + '\n');
+        })
+        .finally(() => {
+            activeSearches -= 1;
+            res.end();
+        });
+});
+
+// Cheapest split of a basket across stores, from per-item comparison results
+app.post('/api/basket/optimize', async (req, res) => {
+    const requestId = req.id;
+    const { items, stores, deadlineMs } = req.body;
+
+    if (!Array.isArray(items) || items.length === 0) {
+        return res.status(400).json({
+            error: 'items must be a non-empty array of comparison results',
+            requestId
+        });
+    }
+    if (deadlineMs !== undefined && !(Number.isInteger(deadlineMs) && deadlineMs >= 1)) {
+        return res.status(400).json({ error: 'deadlineMs must be a positive integer', requestId });
+    }
+
+    try {
+        const result = await callPythonJson('basket.py', [], { items, stores, deadline_ms: deadlineMs }, requestId);
+        res.json({
+            success: !result.error,
+            data: result,
+            requestId,
+            timestamp: new Date().toISOString()
+        });
+    } catch (error) {
+        logger.error(`Basket optimization failed: ${error.message}`, { requestId });
+        res.status(500).json({
+            error: 'Internal server error occurred during basket optimization',
+            details: process.env.NODE_ENV === 'development' ? error.message : undefined,
+            requestId,
+            timestamp: new Date().toISOString()
+        });
+    }
+});
+
+app.get('/api/queue/stats', async (req, res) => {
+    const requestId = req.id;
+    try {
+        const stats = await callPythonJson('workqueue.py', ['stats'], undefined, requestId);
+        res.json({ enabled: SCRAPE_QUEUE, ...stats, requestId });
+    } catch (error) {
+        logger.error(`Queue stats failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not read queue stats', requestId });
+    }
+});
+
+// Per-store extraction health: selector hit rates, fallbacks in use and stores fast-failing on broken markup
+app.get('/api/health/selectors', async (req, res) => {
+    const requestId = req.id;
+    try {
+        const stores = await callPythonJson('selectorhealth.py', ['status'], undefined, requestId);
+        const status = stores.some((s) => s.status === 'broken') ? 'broken' :
+            stores.some((s) => s.status === 'degraded') ? 'degraded' : 'ok';
+        res.json({ status, stores, requestId });
+    } catch (error) {
+        logger.error(`Selector health failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not read selector health', requestId });
+    }
+});
+
+// Daily (or raw) price history of catalog products, by id or by store/brand/item/packing
+app.get('/api/history', async (req, res) => {
+    const requestId = req.id;
+    const { productId, store, brand, itemName, packing, location, days, resolution } = req.query;
+
+    const ids = String(productId || '').split(',').map((id) => id.trim()).filter(Boolean);
+    if (ids.some((id) => !/^\d+$/.test(id))) {
+        return res.status(400).json({ error: 'productId must be a comma-separated list of catalog ids', requestId });
+    }
+    if (!ids.length && !(store && itemName)) {
+        return res.status(400).json({ error: 'Provide productId, or store and itemName (plus brand and packing)', requestId });
+    }
+    if (location !== undefined && !isValidLocation(location)) {
+        return res.status(400).json({ error: LOCATION_ERROR, requestId });
+    }
+    const dayCount = days === undefined ? 30 : Number(days);
+    if (!Number.isInteger(dayCount) || dayCount < 1 || dayCount > 3650) {
+        return res.status(400).json({ error: 'days must be an integer between 1 and 3650', requestId });
+    }
+    if (resolution !== undefined && !['daily', 'raw'].includes(resolution)) {
+        return res.status(400).json({ error: "resolution must be 'daily' or 'raw'", requestId });
+    }
+
+    const args = ['query', '--days', String(dayCount), '--resolution', resolution || 'daily'];
+    ids.forEach((id) => args.push('--product-id', id));
+    if (store && itemName) {
+        args.push('--store', store, '--brand', brand || '', '--item-name', itemName, '--packing', packing || '');
+    }
+    if (location) {
+        args.push('--location', location);
+    }
+
+    try {
+        const history = await callPythonJson('pricehistory.py', args, undefined, requestId);
+        res.json({ success: true, data: history, requestId, timestamp: new Date().toISOString() });
+    } catch (error) {
+        logger.error(`Price history failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not read price history', requestId });
+    }
+});
+
+// ----------------- Watchlist -----------------
+app.get('/api/watchlist', async (req, res) => {
+    const requestId = req.id;
+    try {
+        const result = await callPythonJson('watchlist.py', ['list'], undefined, requestId);
+        res.json({ success: true, data: result.watches, requestId });
+    } catch (error) {
+        logger.error(`Watchlist read failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not read the watchlist', requestId });
+    }
+});
+
+// Watch one store's product, usually a row picked from search results
+app.post('/api/watchlist', async (req, res) => {
+    const requestId = req.id;
+    const { query, store, brand, itemName, packing, location, priority, intervalMinutes, price } = req.body;
+
+    if (!store || !itemName) {
+        return res.status(400).json({ error: 'store and itemName are required', requestId });
+    }
+    if (location !== undefined && !isValidLocation(location)) {
+        return res.status(400).json({ error: LOCATION_ERROR, requestId });
+    }
+    if (priority !== undefined && (!Number.isInteger(priority) || priority < 1 || priority > 10)) {
+        return res.status(400).json({ error: 'priority must be an integer between 1 and 10', requestId });
+    }
+    if (intervalMinutes !== undefined && !(Number(intervalMinutes) >= 5)) {
+        return res.status(400).json({ error: 'intervalMinutes must be at least 5', requestId });
+    }
+
+    const entry = { query, store, brand, item_name: itemName, packing, location, priority, price };
+    if (intervalMinutes !== undefined) {
+        entry.interval = Number(intervalMinutes) * 60;
+    }
+    try {
+        const result = await callPythonJson('watchlist.py', ['add'], entry, requestId);
+        if (result.error) {
+            return res.status(400).json({ error: result.error, requestId });
+        }
+        res.json({ success: true, data: result, requestId });
+    } catch (error) {
+        logger.error(`Watchlist add failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not add the watch', requestId });
+    }
+});
+
+app.delete('/api/watchlist/:id', async (req, res) => {
+    const requestId = req.id;
+    if (!/^\d+$/.test(req.params.id)) {
+        return res.status(400).json({ error: 'id must be a watch id', requestId });
+    }
+    try {
+        const result = await callPythonJson('watchlist.py', ['remove', '--id', req.params.id], undefined, requestId);
+        res.status(result.removed ? 200 : 404).json({ success: result.removed, requestId });
+    } catch (error) {
+        logger.error(`Watchlist remove failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not remove the watch', requestId });
+    }
+});
+
+// Price and availability changes; poll with ?since=<last event id>
+app.get('/api/watchlist/events', async (req, res) => {
+    const requestId = req.id;
+    const since = req.query.since === undefined ? '0' : String(req.query.since);
+    if (!/^\d+$/.test(since)) {
+        return res.status(400).json({ error: 'since must be an event id', requestId });
+    }
+    try {
+        const result = await callPythonJson('watchlist.py', ['events', '--since', since], undefined, requestId);
+        res.json({ success: true, data: result.events, requestId });
+    } catch (error) {
+        logger.error(`Watchlist events failed: ${error.message}`, { requestId });
+        res.status(500).json({ error: 'Could not read watchlist events', requestId });
     }
 });
 
@@ -150,8 +602,63 @@ app.use('*', (req, res) => {
     });
 });
 
+// ----------------- Scrape Queue -----------------
+// SCRAPE_QUEUE=1: searches enqueue per-store jobs for queue-worker.py hosts instead of launching Chrome here
+const SCRAPE_QUEUE = process.env.SCRAPE_QUEUE === '1';
+
+// ----------------- Python Log Forwarding -----------------
+const PYTHON_LEVELS = { DEBUG: 'debug', INFO: 'info', WARNING: 'warn', ERROR: 'error', CRITICAL: 'error' };
+
+// Python scripts log one JSON object per line (scripts/logsetup.py); re-emit each through winston
+function forwardPythonLogs(stream, requestId, source = 'python') {
+    let buffered = '';
+    const emit = (line) => {
+        if (!line.trim()) {
+            return;
+        }
+        try {
+            const record = JSON.parse(line);
+            const level = PYTHON_LEVELS[record.level] || 'info';
+            const exc = record.exc ? `\n${record.exc}` : '';
+            logger.log(level, `[${record.logger || source}] ${record.msg}${exc}`, {
+                requestId: record.request_id && record.request_id !== '-' ? record.request_id : requestId
+            });
+        } catch (err) {
+            logger.debug(`[${source}] ${line}`, { requestId });
+        }
+    };
+    stream.on('data', (data) => {
+        buffered += data.toString();
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.forEach(emit);
+    });
+    stream.on('end', () => emit(buffered));
+}
+
+// ----------------- Browser Lifecycle -----------------
+// Searches run in their own process group so a timeout kills the scraper, its pool and its browsers only
+function killPythonTree(child) {
+    try {
+        process.kill(-child.pid, 'SIGKILL');
+    } catch (err) {
+        child.kill('SIGKILL');
+    }
+    reapBrowsers();
+}
+
+// Remove browsers and profile dirs whose owning Python process is gone
+function reapBrowsers() {
+    const driversScript = path.join(__dirname, 'scripts', 'drivers.py');
+    const reapProcess = spawn('python3', [driversScript, '--reap']);
+    forwardPythonLogs(reapProcess.stderr, '-', 'drivers');
+    reapProcess.on('error', (err) => {
+        logger.error(`Failed to start browser reaper: ${err.message}`);
+    });
+}
+
 // ----------------- Python Script Handler -----------------
-function callPythonScript(query, requestId) {
+function callPythonScript(query, requestId, sortBy = 'relevance', refresh = false, location = undefined) {
     return new Promise((resolve, reject) => {
         const pythonScript = path.join(__dirname, 'scripts', 'main-pro.py');
         const outputFile = path.join(__dirname, 'output.json');
@@ -164,15 +671,25 @@ function callPythonScript(query, requestId) {
             fs.unlinkSync(outputFile);
         }
 
-        const pythonProcess = spawn('python3', [pythonScript, '--product', query], {
-            env: { ...process.env, REQUEST_ID: requestId }
+        const args = [pythonScript, '--product', query, '--sort-by', sortBy];
+        if (refresh) {
+            args.push('--refresh');
+        }
+        if (SCRAPE_QUEUE) {
+            args.push('--queue');
+        }
+        if (location) {
+            args.push('--location', location);
+        }
+
+        const pythonProcess = spawn('python3', args, {
+            env: { ...process.env, REQUEST_ID: requestId },
+            detached: true
         });
 
 
 
-        pythonProcess.stdout.on('data', (data) => {
-            logger.info(`PYTHON LOG: ${data.toString().trim()}`);
-        });
+        forwardPythonLogs(pythonProcess.stdout, requestId, 'main-pro');
 
         let errorString = '';
 
@@ -180,7 +697,13 @@ function callPythonScript(query, requestId) {
             errorString += data.toString();
         });
 
+        const timeout = setTimeout(() => {
+            killPythonTree(pythonProcess);
+            reject(new Error('Python script timeout after 5 minutes'));
+        }, 5 * 60 * 1000);
+
         pythonProcess.on('close', (code) => {
+            clearTimeout(timeout);
             if (code === 0) {
                 try {
                     if (!fs.existsSync(outputFile)) {
@@ -198,13 +721,122 @@ function callPythonScript(query, requestId) {
         });
 
         pythonProcess.on('error', (err) => {
+            clearTimeout(timeout);
             reject(new Error(`Failed to start Python script: ${err.message}`));
         });
+    });
+}
 
-        setTimeout(() => {
+// Run a short-lived Python helper: JSON request on stdin, JSON result on stdout
+function callPythonJson(scriptName, args, payload, requestId, timeoutMs = 30 * 1000) {
+    return new Promise((resolve, reject) => {
+        const script = path.join(__dirname, 'scripts', scriptName);
+        const pythonProcess = spawn('python3', [script, ...args], {
+            env: { ...process.env, REQUEST_ID: requestId }
+        });
+
+        let output = '';
+        let errorString = '';
+        pythonProcess.stdout.on('data', (data) => {
+            output += data.toString();
+        });
+        pythonProcess.stderr.on('data', (data) => {
+            errorString += data.toString();
+        });
+        forwardPythonLogs(pythonProcess.stderr, requestId, scriptName);
+
+        const timeout = setTimeout(() => {
             pythonProcess.kill('SIGKILL');
-            reject(new Error('Python script timeout after 5 minutes'));
-        }, 5 * 60 * 1000);
+            reject(new Error(`${scriptName} timeout after ${timeoutMs} ms`));
+        }, timeoutMs);
+
+        pythonProcess.on('close', (code) => {
+            clearTimeout(timeout);
+            if (code !== 0) {
+                return reject(new Error(`${scriptName} exited with code ${code}: ${errorString}`));
+            }
+            try {
+                resolve(JSON.parse(output));
+            } catch (err) {
+                reject(new Error(`Failed to parse ${scriptName} output: ${err.message}`));
+            }
+        });
+
+        pythonProcess.on('error', (err) => {
+            clearTimeout(timeout);
+            reject(new Error(`Failed to start ${scriptName}: ${err.message}`));
+        });
+
+        if (payload !== undefined) {
+            pythonProcess.stdin.write(JSON.stringify(payload));
+        }
+        pythonProcess.stdin.end();
+    });
+}
+
+function callBatchScript(queries, requestId, sortBy = 'relevance', refresh = false, onRecord, location = undefined) {
+    const args = ['--headless', '--sort-by', sortBy];
+    if (refresh) {
+        args.push('--refresh');
+    }
+    if (location) {
+        args.push('--location', location);
+    }
+    // Allow roughly one minute per query on top of the single-search budget
+    const timeoutMs = (5 + queries.length) * 60 * 1000;
+    return streamPythonNdjson('batch-search.py', args, JSON.stringify(queries), requestId, timeoutMs, onRecord);
+}
+
+// Run a script whose stdout is NDJSON records (logs on stderr), calling onRecord for each record
+function streamPythonNdjson(scriptName, args, stdinPayload, requestId, timeoutMs, onRecord) {
+    return new Promise((resolve, reject) => {
+        const script = path.join(__dirname, 'scripts', scriptName);
+        const source = scriptName.replace(/\.py$/, '');
+
+        const pythonProcess = spawn('python3', [script, ...args], {
+            env: { ...process.env, REQUEST_ID: requestId },
+            detached: true
+        });
+
+        let buffered = '';
+        pythonProcess.stdout.on('data', (data) => {
+            buffered += data.toString();
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach((line) => {
+                try {
+                    onRecord(JSON.parse(line));
+                } catch (err) {
+                    logger.warn(`Ignoring non-JSON ${source} output: ${line}`, { requestId });
+                }
+            });
+        });
+
+        forwardPythonLogs(pythonProcess.stderr, requestId, source);
+
+        const timeout = setTimeout(() => {
+            killPythonTree(pythonProcess);
+            reject(new Error(`${scriptName} timeout`));
+        }, timeoutMs);
+
+        pythonProcess.on('close', (code) => {
+            clearTimeout(timeout);
+            if (code === 0) {
+                resolve();
+            } else {
+                reject(new Error(`${scriptName} exited with code ${code}`));
+            }
+        });
+
+        pythonProcess.on('error', (err) => {
+            clearTimeout(timeout);
+            reject(new Error(`Failed to start ${scriptName}: ${err.message}`));
+        });
+
+        if (stdinPayload !== null) {
+            pythonProcess.stdin.write(stdinPayload);
+        }
+        pythonProcess.stdin.end();
     });
 }
 
@@ -224,16 +856,109 @@ function deleteJsonFiles(directory) {
   });
 }
 
+// ----------------- Catalog Compaction -----------------
+const CATALOG_COMPACT_HOURS = Number(process.env.CATALOG_COMPACT_HOURS || 24);
+
+function compactCatalog() {
+    const catalogScript = path.join(__dirname, 'scripts', 'catalog.py');
+    const compactProcess = spawn('python3', [catalogScript, 'compact']);
+
+    forwardPythonLogs(compactProcess.stderr, '-', 'catalog');
+    compactProcess.on('close', (code) => {
+        if (code === 0) {
+            logger.info('Catalog compaction finished');
+        } else {
+            logger.error(`Catalog compaction exited with code ${code}`);
+        }
+    });
+    compactProcess.on('error', (err) => {
+        logger.error(`Failed to start catalog compaction: ${err.message}`);
+    });
+}
+
+if (CATALOG_COMPACT_HOURS > 0) {
+    setInterval(compactCatalog, CATALOG_COMPACT_HOURS * 60 * 60 * 1000).unref();
+}
+
+// ----------------- Prefetcher -----------------
+const PREFETCH_INTERVAL_MINUTES = Number(process.env.PREFETCH_INTERVAL_MINUTES || 30);
+let prefetchProcess = null;
+
+function startPrefetch() {
+    if (prefetchProcess || watchlistProcess || activeSearches > 0) {
+        return;
+    }
+    const prefetchScript = path.join(__dirname, 'scripts', 'prefetch.py');
+    prefetchProcess = spawn('python3', [prefetchScript]);
+
+    forwardPythonLogs(prefetchProcess.stderr, '-', 'prefetch');
+    prefetchProcess.on('close', (code) => {
+        logger.info(`Prefetch run exited with code ${code}`);
+        prefetchProcess = null;
+    });
+    prefetchProcess.on('error', (err) => {
+        logger.error(`Failed to start prefetcher: ${err.message}`);
+        prefetchProcess = null;
+    });
+}
+
+// Live traffic always wins: the prefetcher and watchlist re-checks kill their browsers on SIGTERM
+function stopPrefetch() {
+    if (prefetchProcess) {
+        logger.info('Live search started, stopping prefetcher');
+        prefetchProcess.kill('SIGTERM');
+    }
+    if (watchlistProcess) {
+        logger.info('Live search started, stopping watchlist re-checks');
+        watchlistProcess.kill('SIGTERM');
+    }
+}
+
+if (PREFETCH_INTERVAL_MINUTES > 0) {
+    setInterval(startPrefetch, PREFETCH_INTERVAL_MINUTES * 60 * 1000).unref();
+}
+
+// ----------------- Watchlist Re-checks -----------------
+// How often due watches are looked for; each watch has its own interval and priority
+const WATCHLIST_CHECK_MINUTES = Number(process.env.WATCHLIST_CHECK_MINUTES || 5);
+let watchlistProcess = null;
+
+function startWatchlistCheck() {
+    if (watchlistProcess || prefetchProcess || activeSearches > 0) {
+        return;
+    }
+    const watchlistScript = path.join(__dirname, 'scripts', 'watchlist.py');
+    watchlistProcess = spawn('python3', [watchlistScript, 'check', '--headless']);
+
+    forwardPythonLogs(watchlistProcess.stderr, '-', 'watchlist');
+    watchlistProcess.on('close', (code) => {
+        if (code !== 0) {
+            logger.warn(`Watchlist re-check exited with code ${code}`);
+        }
+        watchlistProcess = null;
+    });
+    watchlistProcess.on('error', (err) => {
+        logger.error(`Failed to start watchlist re-check: ${err.message}`);
+        watchlistProcess = null;
+    });
+}
+
+if (WATCHLIST_CHECK_MINUTES > 0) {
+    setInterval(startWatchlistCheck, WATCHLIST_CHECK_MINUTES * 60 * 1000).unref();
+}
+
 // ----------------- Start Server -----------------
 const server = app.listen(PORT, '0.0.0.0',() => {
     console.log(`🚀 Server running on http://localhost:${PORT}`);
     deleteJsonFiles('./');
+    reapBrowsers();
 });
 
 
 // ----------------- Graceful Shutdown -----------------
 const gracefulShutdown = (signal) => {
     logger.info(`Received ${signal}, shutting down...`);
+    stopPrefetch();
     server.close(() => process.exit(0));
 };
 process.on('SIGTERM', () => gracefulShutdown('SIGTERM'));